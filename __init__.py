@@ -579,3 +579,50 @@ class UDFrame_Z_204:
         unmask = 0xFFFFFFFFFFFFFF00
         shift = 0
         description = "ZCL main circuit voltage input"
+
+
+# ---------- 按需加载的帧类 ----------
+# frames/ 目录（以及环境变量 ETH_FRAME_PATH 列出的目录）中的帧类只建立索引，
+# 第一次访问时才加载，`from __init__ import UDFrame_xxx` 的用法保持不变。
+# 本仓库自带的只有上面的 UDFrame_Z_204（各模块的默认帧），仍在 import 时定义；
+# 按需加载只对放进 frames/ 或 ETH_FRAME_PATH 的整车矩阵生效。
+import os as _os
+try:
+    from frame_registry import FrameRegistry as _FrameRegistry, default_search_dirs as _default_search_dirs
+except ImportError:
+    # 整个目录作为包导入时
+    from .frame_registry import FrameRegistry as _FrameRegistry, default_search_dirs as _default_search_dirs
+
+_registry = _FrameRegistry(module_name=__name__)
+_registry.register_class(UDFrame_Z_204)
+_registry_indexed = False
+
+
+def _ensure_indexed():
+    global _registry_indexed
+    if not _registry_indexed:
+        for _d in _default_search_dirs(_os.path.dirname(_os.path.abspath(__file__))):
+            _registry.index_dir(_d)
+        _registry_indexed = True
+
+
+def get_frame_class(name_or_msg_id):
+    """按类名或 msg_id 返回帧类（按需加载），找不到时抛 KeyError"""
+    _ensure_indexed()
+    if isinstance(name_or_msg_id, int):
+        return _registry.get_by_msg_id(name_or_msg_id)
+    return _registry.get(name_or_msg_id)
+
+
+def __getattr__(name):
+    if name.startswith('__'):
+        raise AttributeError(name)
+    try:
+        return get_frame_class(name)
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+
+
+def __dir__():
+    _ensure_indexed()
+    return sorted(set(globals()) | set(_registry.names()))
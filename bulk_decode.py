@@ -0,0 +1,362 @@
+# -*- coding: utf-8 -*-
+# @Time: 2025/12/24 22:10
+# @Author: JackyYin
+# @Email: jackhuan@icloud.com
+# @File: bulk_decode.py
+
+"""
+抓包批量解码（命令行）：把 pcap / pcapng / frames.txt 解码成按信号分列的列式文件。
+
+parser_sample.py 那样逐帧 dict 解析在整天的抓包上要跑几个小时。这里：
+- CaptureReader.split() 只扫描记录头，把文件切成按记录对齐的若干段，交给进程池并行处理；
+- 每个子进程只遍历自己那一段：按 msg_id 把 payload 原样拼进一块连续缓冲区、时间戳进 array('d')，
+  遍历结束后再整段解码——有 NumPy 时按 SignalOp 的逐字节片段对整列做移位 / 掩码（向量化），
+  否则逐行调用 frame_codec 生成的解码函数；
+- --where 给出过滤条件（见 predicate.py）时，在解码前按原始字节判断：向量化时对整段的 payload 矩阵
+  一次求出保留的行，否则逐个 PDU 判断，不满足条件的 PDU 不解码；
+- 主进程按段顺序拼接各列，每个帧类输出一个 <帧类名>.npz（timestamp + 各信号列），
+  加 --parquet 且安装了 pyarrow 时再输出同名 .parquet。
+
+没有 NumPy 时 .npz 由 zipfile 按 .npy 格式直接写出，np.load 可以正常读取。
+未指定 --frame 时解码所有能按 msg_id 找到帧类（见 __init__.get_frame_class）的 PDU。
+
+用法：
+    python bulk_decode.py day1.pcapng -o out/ -j 8
+    python bulk_decode.py frames.txt --period 0.01 -f UDFrame_Z_204 --raw --parquet -o out/
+    python bulk_decode.py day1.pcapng -f UDFrame_Z_204 --where 'LVPwrSplyErrStsSts != 0' -o out/
+
+    # 代码中调用
+    columns = bulk_decode(['day1.pcapng'], jobs=8)   # {帧类名: {'timestamp': ..., 信号名: ...}}
+"""
+import argparse
+import io
+import os
+import struct
+import sys
+import time
+import zipfile
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from framer import Framer
+from frame_codec import compile_frame, CompiledFrame, SignalOp
+from capture_reader import CaptureReader
+from predicate import compile_predicate, RawPredicate
+
+try:
+    import numpy as np
+except ImportError:  # 没有 NumPy 时逐行解码，npz 由 _write_npz_plain 写出
+    np = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# 一个分段任务：(path, start, end, first_index)
+_Task = Tuple[str, int, int, int]
+
+
+def _resolve_frame(name_or_msg_id):
+    """按类名或 msg_id 查找帧类（延迟导入，避免 import 本模块时就加载帧定义）"""
+    from __init__ import get_frame_class
+    return get_frame_class(name_or_msg_id)
+
+
+def _column_code(op: SignalOp, raw: bool) -> str:
+    """列的 array 类型码：整数列 'Q'，带 factor / offset 的物理值列 'd'"""
+    return 'Q' if raw or op.physical_is_raw else 'd'
+
+
+# ---------- 子进程：解码一段 ----------
+class _Collector:
+    """某个 msg_id 在一段内的数据：时间戳 + 连续拼接的 payload"""
+    __slots__ = ('compiled', 'ts', 'buf', 'rows', 'where', 'filtered')
+
+    def __init__(self, compiled: CompiledFrame, where: Optional[RawPredicate] = None):
+        self.compiled = compiled
+        self.ts = array('d')
+        self.buf = bytearray()
+        self.rows = 0
+        self.where = where
+        self.filtered = 0
+
+
+def _make_collector(cf: CompiledFrame, where: Optional[str]) -> Optional[_Collector]:
+    """where 引用了该帧没有的信号时返回 None（该帧没有满足条件的行）"""
+    if where is None:
+        return _Collector(cf)
+    try:
+        return _Collector(cf, compile_predicate(where, cf.frame_cls))
+    except KeyError:
+        return None
+
+
+def _decode_columns(col: _Collector, raw: bool, vectorize: bool) -> Dict[str, Any]:
+    cf = col.compiled
+    ops = cf.signals
+    if vectorize and np is not None:
+        mat = np.frombuffer(bytes(col.buf), dtype=np.uint8).reshape(col.rows, cf.msg_length)
+        ts = np.frombuffer(col.ts, dtype=np.float64).copy()
+        if col.where is not None:
+            keep = col.where.mask_matrix(mat)
+            mat, ts = mat[keep], ts[keep]
+            col.filtered += col.rows - len(ts)
+            col.rows = len(ts)
+        out: Dict[str, Any] = {'timestamp': ts}
+        for op in ops:
+            val = op.raw_column(mat)
+            if _column_code(op, raw) == 'd':
+                val = val.astype(np.float64) * op.factor + op.offset
+            out[op.name] = val
+        return out
+    decode = cf.make_decoder(None, physical=not raw)
+    columns = [(op.name, array(_column_code(op, raw))) for op in ops]
+    appends = [(name, column.append) for name, column in columns]
+    length = cf.msg_length
+    view = memoryview(col.buf)
+    for i in range(0, col.rows * length, length):
+        values = decode(view[i:i + length])
+        for name, append in appends:
+            append(values[name])
+    view.release()
+    out = {'timestamp': col.ts}
+    out.update(columns)
+    return out
+
+
+def _decode_chunk(args) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, int]]:
+    """进程池任务：解码一段，返回 ({帧类名: 列}, 统计)"""
+    task, frames, framer_kwargs, reader_kwargs, raw, vectorize, where = args
+    path, start, end, first_index = task
+    framer = Framer(**framer_kwargs)
+    wanted: Optional[Dict[int, Optional[_Collector]]] = None
+    if frames:
+        wanted = {}
+        for f in frames:
+            cf = compile_frame(_resolve_frame(f))
+            wanted[cf.msg_id] = _make_collector(cf, where)
+    collectors: Dict[int, Optional[_Collector]] = dict(wanted or {})
+    # 向量化时过滤条件在 _decode_columns 中对整段一次求值，否则在收集时逐个 PDU 判断
+    early = where is not None and not (vectorize and np is not None)
+    short = filtered = 0
+    with CaptureReader(path, framer=framer, **reader_kwargs) as reader:
+        for ts, msg_id, payload in reader.iter_pdus(start, end, first_index):
+            col = collectors.get(msg_id, False)
+            if col is False:
+                # 未指定 --frame：第一次见到的 msg_id 按注册表查找帧类，找不到则以后都跳过
+                col = None
+                if wanted is None:
+                    try:
+                        cf = compile_frame(_resolve_frame(msg_id))
+                    except (KeyError, ValueError):
+                        cf = None
+                    if cf is not None:
+                        col = _make_collector(cf, where)
+                collectors[msg_id] = col
+            if col is None:
+                continue
+            length = col.compiled.msg_length
+            if len(payload) < length:
+                short += 1
+                continue
+            if early and not col.where(payload):
+                filtered += 1
+                continue
+            col.ts.append(ts)
+            col.buf += payload[:length]
+            col.rows += 1
+        stats = {'records': reader.records, 'pdus': reader.pdus, 'skipped': reader.skipped,
+                 'truncated': reader.truncated, 'short': short}
+    result = {}
+    for col in collectors.values():
+        if col is not None and col.rows:
+            result[col.compiled.frame_cls.__name__] = _decode_columns(col, raw, vectorize)
+    stats['rows'] = sum(c.rows for c in collectors.values() if c is not None)
+    stats['filtered'] = filtered + sum(c.filtered for c in collectors.values() if c is not None)
+    return result, stats
+
+
+# ---------- 主进程 ----------
+def plan_chunks(paths: Sequence[str], chunks: int, reader_kwargs: Optional[Dict[str, Any]] = None) -> List[_Task]:
+    """把每个文件按大小比例切段，合计约 chunks 段"""
+    reader_kwargs = reader_kwargs or {}
+    sizes = [os.path.getsize(p) for p in paths]
+    grand = sum(sizes) or 1
+    tasks: List[_Task] = []
+    for path, size in zip(paths, sizes):
+        n = max(1, round(chunks * size / grand))
+        with CaptureReader(path, **reader_kwargs) as reader:
+            for start, end, first_index in reader.split(n):
+                tasks.append((path, start, end, first_index))
+    return tasks
+
+
+def _concat(parts: List[Any]):
+    if np is not None and isinstance(parts[0], np.ndarray):
+        return np.concatenate(parts)
+    out = array(parts[0].typecode)
+    for p in parts:
+        out.extend(p)
+    return out
+
+
+def bulk_decode(paths: Sequence[str], frames: Iterable = (), jobs: Optional[int] = None,
+                chunks: Optional[int] = None, raw: bool = False, vectorize: bool = True,
+                framer_kwargs: Optional[Dict[str, Any]] = None, where: Optional[str] = None,
+                stats: Optional[Dict[str, int]] = None, **reader_kwargs) -> Dict[str, Dict[str, Any]]:
+    """
+    并行解码 paths 中的抓包，返回 {帧类名: {'timestamp': 列, 信号名: 列}}（按文件、时间顺序拼接）。
+    frames: 只解码这些帧（类名或 msg_id），为空时解码所有能找到帧类的 msg_id
+    jobs: 进程数（默认 CPU 数），jobs=1 时在当前进程内顺序执行
+    chunks: 总分段数（默认 jobs * 4，段数多于进程数可以平衡各段耗时差异）
+    raw: 输出原始值而不是物理值
+    framer_kwargs: 构造 Framer 的参数（默认 mode='custom_4_4'）
+    vectorize: 有 NumPy 时整列向量化解码（列为 ndarray，否则为 array.array）
+    where: 过滤条件（见 predicate.py），只输出满足条件的行；没有所引用信号的帧类不输出
+    stats: 传入 dict 时累加各段的统计（records / pdus / rows / skipped / truncated / short / filtered）
+    其余关键字参数（ethertype / udp_ports / fmt / period）传给 CaptureReader
+    """
+    jobs = jobs or os.cpu_count() or 1
+    chunks = chunks or jobs * 4
+    frames = list(frames)
+    # 默认与 CaptureReader 一致：custom_4_4
+    framer_kwargs = dict(framer_kwargs or {'mode': 'custom_4_4'})
+    if where is not None:
+        # 指定了帧时先在主进程编译一次：语法错误或所有帧都没有所引用的信号时立即报错
+        targets = [_resolve_frame(f) for f in frames]
+        errors = []
+        for frame_cls in targets:
+            try:
+                compile_predicate(where, frame_cls)
+            except KeyError as e:
+                errors.append(e)
+        if targets and len(errors) == len(targets):
+            raise errors[0]
+    tasks = plan_chunks(paths, chunks, reader_kwargs)
+    work = [(t, frames, framer_kwargs, reader_kwargs, raw, vectorize, where) for t in tasks]
+    if jobs == 1 or len(work) <= 1:
+        results = map(_decode_chunk, work)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=jobs)
+        results = pool.map(_decode_chunk, work)
+    parts: Dict[str, Dict[str, List[Any]]] = {}
+    try:
+        for columns, st in results:
+            if stats is not None:
+                for k, v in st.items():
+                    stats[k] = stats.get(k, 0) + v
+            for frame_name, cols in columns.items():
+                dst = parts.setdefault(frame_name, {})
+                for name, col in cols.items():
+                    dst.setdefault(name, []).append(col)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return {frame_name: {name: _concat(p) for name, p in cols.items()}
+            for frame_name, cols in parts.items()}
+
+
+# ---------- 输出 ----------
+_NPY_DESCR = {'d': 'f8', 'Q': 'u8'}
+
+
+def _write_npz_plain(path: str, columns: Dict[str, array]):
+    """不依赖 NumPy 写 .npz：zip 中每列一个 .npy（格式版本 1.0）"""
+    order = '<' if sys.byteorder == 'little' else '>'
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED, allowZip64=True) as zf:
+        for name, col in columns.items():
+            header = "{'descr': '%s%s', 'fortran_order': False, 'shape': (%d,), }" % (
+                order, _NPY_DESCR[col.typecode], len(col))
+            # magic(6) + 版本(2) + 长度(2) + header + '\n' 按 64 字节对齐
+            pad = 64 - (10 + len(header) + 1) % 64
+            header = header + ' ' * (pad % 64) + '\n'
+            buf = io.BytesIO()
+            buf.write(b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin1'))
+            buf.write(col.tobytes())
+            zf.writestr(name + '.npy', buf.getvalue())
+
+
+def write_npz(path: str, columns: Dict[str, Any], compress: bool = False):
+    if np is None:
+        if compress:
+            raise RuntimeError("--compress 需要 NumPy")
+        _write_npz_plain(path, columns)
+    elif compress:
+        np.savez_compressed(path, **columns)
+    else:
+        np.savez(path, **columns)
+
+
+def write_parquet(path: str, columns: Dict[str, Any]):
+    if pa is None:
+        raise RuntimeError("写 Parquet 需要安装 pyarrow")
+    arrays = {}
+    for name, col in columns.items():
+        if isinstance(col, array):
+            typ = pa.float64() if col.typecode == 'd' else pa.uint64()
+            col = pa.Array.from_buffers(typ, len(col), [None, pa.py_buffer(col)])
+        arrays[name] = col
+    pq.write_table(pa.table(arrays), path)
+
+
+def _parse_int(text: str) -> int:
+    return int(text, 0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="并行解码抓包（pcap / pcapng / frames.txt），输出按信号分列的 .npz / .parquet")
+    parser.add_argument('captures', nargs='+', help='抓包文件，多个文件按给出的顺序拼接')
+    parser.add_argument('-o', '--out', default='.', help='输出目录，每个帧类一个 <帧类名>.npz')
+    parser.add_argument('-f', '--frame', action='append', default=[],
+                        help='只解码该帧（类名或 msg_id，如 UDFrame_Z_204 / 0x94），可重复；默认全部')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='进程数（默认 CPU 数）')
+    parser.add_argument('--chunks', type=int, default=None, help='总分段数（默认 jobs*4）')
+    parser.add_argument('--raw', action='store_true', help='输出原始值而不是物理值')
+    parser.add_argument('--no-vectorize', action='store_true', help='不使用 NumPy 向量化解码')
+    parser.add_argument('-w', '--where', default=None,
+                        help="只输出满足条件的行，解码前按原始字节判断（如 'CrsCtrlOvrdnReq == 1'，见 predicate.py）")
+    parser.add_argument('--compress', action='store_true', help='npz 使用压缩（需要 NumPy）')
+    parser.add_argument('--parquet', action='store_true', help='同时输出 .parquet（需要 pyarrow）')
+    parser.add_argument('--ethertype', type=_parse_int, default=0x88B5, help='AF_PACKET 直发帧的以太类型')
+    parser.add_argument('--udp-port', type=int, action='append', default=None, help='只取该 UDP 端口，可重复')
+    parser.add_argument('--format', dest='fmt', choices=['pcap', 'pcapng', 'hex'], default=None,
+                        help='文件格式（默认按文件头识别）')
+    parser.add_argument('--period', type=float, default=0.0, help='frames.txt 相邻两行的时间间隔（秒）')
+    parser.add_argument('--framer', default='custom_4_4', help='Framer 模式（与采集端一致）')
+    parser.add_argument('--endian', choices=['big', 'little'], default='big', help='4+4 header 的字节序')
+    args = parser.parse_args(argv)
+
+    if args.parquet and pa is None:
+        parser.error("--parquet 需要安装 pyarrow")
+    if args.compress and np is None:
+        parser.error("--compress 需要 NumPy")
+    frames = [_parse_int(f) if f[:1].isdigit() else f for f in args.frame]
+    os.makedirs(args.out, exist_ok=True)
+
+    stats: Dict[str, int] = {}
+    t0 = time.perf_counter()
+    result = bulk_decode(args.captures, frames=frames, jobs=args.jobs, chunks=args.chunks,
+                         raw=args.raw, vectorize=not args.no_vectorize,
+                         framer_kwargs={'mode': args.framer, 'id_endian': args.endian, 'len_endian': args.endian},
+                         where=args.where, stats=stats, ethertype=args.ethertype, udp_ports=args.udp_port,
+                         fmt=args.fmt, period=args.period)
+    t1 = time.perf_counter()
+    for frame_name, columns in sorted(result.items()):
+        base = os.path.join(args.out, frame_name)
+        write_npz(base + '.npz', columns, compress=args.compress)
+        if args.parquet:
+            write_parquet(base + '.parquet', columns)
+        print(f"{frame_name}: {len(columns['timestamp'])} 行, {len(columns) - 1} 个信号 -> {base}.npz")
+    print(f"records={stats.get('records', 0)} pdus={stats.get('pdus', 0)} rows={stats.get('rows', 0)} "
+          f"skipped={stats.get('skipped', 0)} truncated={stats.get('truncated', 0)} short={stats.get('short', 0)} "
+          f"filtered={stats.get('filtered', 0)}; "
+          f"解码 {t1 - t0:.2f}s，写出 {time.perf_counter() - t1:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# @Time: 2026/01/03 14:20
+# @Author: JackyYin
+# @Email: jackhuan@icloud.com
+# @File: bulk_decode_test.py
+
+"""
+bulk_decode 的测试：frames.txt 按段并行解码的行数与时间戳、--where 过滤，
+向量化解码（需要安装 NumPy）与逐行解码的结果一致（原始值 / 物理值、带过滤条件）。
+
+运行：python -m pytest bulk_decode_test.py  或  python bulk_decode_test.py
+"""
+import os
+import random
+import tempfile
+
+import pytest
+
+import bulk_decode as bd
+from __init__ import UDFrame_Z_204
+from framer import Framer
+
+_ROWS = 500
+_WHERE = 'LVPwrSplyErrStsSts > 30000 or CrsCtrlOvrdnReq'
+
+
+def _write_frames(path: str, n: int = _ROWS, seed: int = 5):
+    rnd = random.Random(seed)
+    framer = Framer(mode='custom_4_4')
+    with open(path, 'w') as f:
+        for _ in range(n):
+            payload = bytes(rnd.getrandbits(8) for _ in range(UDFrame_Z_204.msg_length))
+            f.write(framer.add_header(payload, msg_id=UDFrame_Z_204.msg_id).hex() + '\n')
+
+
+def _decode(path: str, **kwargs):
+    return bd.bulk_decode([path], jobs=1, chunks=3, period=0.01, **kwargs)['UDFrame_Z_204']
+
+
+def _decode_pure(path: str, **kwargs):
+    np_saved = bd.np
+    bd.np = None
+    try:
+        return _decode(path, **kwargs)
+    finally:
+        bd.np = np_saved
+
+
+def test_rows_timestamps_and_where():
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'frames.txt')
+        _write_frames(path)
+        cols = _decode_pure(path, raw=True)
+        assert len(cols['timestamp']) == _ROWS
+        assert cols['timestamp'][3] == pytest.approx(0.03)
+        stats = {}
+        kept = _decode_pure(path, raw=True, where=_WHERE, stats=stats)
+        expected = [i for i in range(_ROWS)
+                    if cols['LVPwrSplyErrStsSts'][i] > 30000 or cols['CrsCtrlOvrdnReq'][i]]
+        assert 0 < len(expected) < _ROWS
+        assert list(kept['timestamp']) == [cols['timestamp'][i] for i in expected]
+        assert stats['filtered'] == _ROWS - len(expected)
+
+
+@pytest.mark.skipif(bd.np is None, reason="需要 NumPy")
+def test_vectorized_matches_rowwise():
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'frames.txt')
+        _write_frames(path)
+        for kwargs in ({'raw': True}, {'raw': False}, {'raw': True, 'where': _WHERE}):
+            vec = _decode(path, **kwargs)
+            rows = _decode_pure(path, **kwargs)
+            assert set(vec) == set(rows)
+            for name, col in rows.items():
+                assert isinstance(vec[name], bd.np.ndarray)
+                if kwargs['raw']:
+                    assert vec[name].tolist() == list(col), (kwargs, name)
+                else:
+                    assert vec[name].tolist() == pytest.approx(list(col)), name
+
+
+if __name__ == '__main__':
+    test_rows_timestamps_and_where()
+    if bd.np is not None:
+        test_vectorized_matches_rowwise()
+    print('ok')
@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+# @Time: 2025/12/28 21:20
+# @Author: JackyYin
+# @Email: jackhuan@icloud.com
+# @File: capture_diff.py
+
+"""
+两次台架抓包的信号级对比（命令行）：找出两个 ECU 软件版本之间行为不同的信号。
+
+- 两个抓包分别用 bulk_decode 并行解码成按信号分列的数组；
+- 每个帧类按序号（第 i 帧对第 i 帧）或按时间（相对各自第一帧的时间，取 tolerance 内最近的一帧）对齐；
+- 每个信号整列比较：不一致次数、第一次分歧（行号 / 时间 / 两侧取值）、两侧的均值 / 最值 / 跳变次数，
+  以及取值分布的差异：取值种类不多（<= 256）时为直方图的总变差距离（tvd），否则为 KS 统计量；
+- 默认跳过 E2E 信号组的 Counter / Checksum（两次运行的相位不同，必然不一致），--include-e2e 保留。
+安装了 NumPy 时以上计算都是整列向量化运算，否则逐元素计算（结果相同）。
+
+用法：
+    python capture_diff.py v1.pcapng v2.pcapng                    # 按序号对齐
+    python capture_diff.py v1.pcapng v2.pcapng --align time --tolerance 0.005 -f UDFrame_Z_204
+
+    report = diff_captures('v1.pcapng', 'v2.pcapng', align='time')
+    print(format_report(report))
+"""
+import argparse
+import bisect
+import collections
+import math
+import sys
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from bulk_decode import bulk_decode
+from frame_codec import compile_frame
+
+try:
+    import numpy as np
+except ImportError:  # 没有 NumPy 时逐元素计算
+    np = None
+
+ALIGN_MODES = ("seq", "time")
+_DISCRETE_LIMIT = 256
+
+
+def _is_np(col) -> bool:
+    return np is not None and isinstance(col, np.ndarray)
+
+
+# ---------- 对齐 ----------
+def align_seq(n_a: int, n_b: int):
+    """第 i 帧对第 i 帧，返回 (idx_a, idx_b)"""
+    n = min(n_a, n_b)
+    if np is not None:
+        idx = np.arange(n)
+        return idx, idx
+    return range(n), range(n)
+
+
+def align_time(ts_a, ts_b, tolerance: float, relative: bool = True):
+    """
+    A 的每一帧取 B 中时间最近且相差不超过 tolerance 的一帧，返回 (idx_a, idx_b)。
+    relative=True 时两侧时间都减去各自第一帧的时间（两次运行的绝对时间不同）。
+    """
+    if not len(ts_a) or not len(ts_b):
+        return align_seq(0, 0)
+    off_a = ts_a[0] if relative else 0.0
+    off_b = ts_b[0] if relative else 0.0
+    if _is_np(ts_a):
+        a = ts_a - off_a
+        b = ts_b - off_b
+        j = np.clip(np.searchsorted(b, a), 0, len(b) - 1)
+        left = np.clip(j - 1, 0, len(b) - 1)
+        j = np.where(np.abs(b[left] - a) <= np.abs(b[j] - a), left, j)
+        keep = np.abs(b[j] - a) <= tolerance
+        return np.flatnonzero(keep), j[keep]
+    b = [t - off_b for t in ts_b]
+    idx_a = array('Q')
+    idx_b = array('Q')
+    for i, t in enumerate(ts_a):
+        t -= off_a
+        k = bisect.bisect_left(b, t)
+        best = None
+        for c in (k - 1, k):
+            if 0 <= c < len(b) and (best is None or abs(b[c] - t) < abs(b[best] - t)):
+                best = c
+        if abs(b[best] - t) <= tolerance:
+            idx_a.append(i)
+            idx_b.append(best)
+    return idx_a, idx_b
+
+
+def _take(col, idx):
+    if _is_np(col):
+        return col[idx]
+    if isinstance(idx, range):
+        return col[idx.start:idx.stop]
+    return array(col.typecode, (col[i] for i in idx))
+
+
+# ---------- 单列统计 ----------
+def _summary(col) -> Dict[str, Any]:
+    n = len(col)
+    if not n:
+        return {'n': 0, 'mean': None, 'std': None, 'min': None, 'max': None, 'changes': 0}
+    if _is_np(col):
+        v = col.astype(np.float64)
+        return {'n': n, 'mean': float(v.mean()), 'std': float(v.std()), 'min': col.min().item(),
+                'max': col.max().item(), 'changes': int(np.count_nonzero(col[1:] != col[:-1]))}
+    mean = math.fsum(col) / n
+    var = math.fsum((x - mean) ** 2 for x in col) / n
+    changes = sum(1 for x, y in zip(col, col[1:]) if x != y)
+    return {'n': n, 'mean': mean, 'std': math.sqrt(var), 'min': min(col), 'max': max(col), 'changes': changes}
+
+
+def _distribution_distance(a, b) -> Tuple[str, float]:
+    """取值种类 <= 256 时返回 ('tvd', 总变差距离)，否则 ('ks', KS 统计量)"""
+    if not len(a) or not len(b):
+        return 'tvd', 1.0 if len(a) or len(b) else 0.0
+    if _is_np(a):
+        va, ca = np.unique(a, return_counts=True)
+        vb, cb = np.unique(b, return_counts=True)
+        values = np.union1d(va, vb)
+        if len(values) <= _DISCRETE_LIMIT:
+            pa = np.zeros(len(values))
+            pb = np.zeros(len(values))
+            pa[np.searchsorted(values, va)] = ca / len(a)
+            pb[np.searchsorted(values, vb)] = cb / len(b)
+            return 'tvd', float(0.5 * np.abs(pa - pb).sum())
+        sa = np.sort(a)
+        sb = np.sort(b)
+        cdf_a = np.searchsorted(sa, values, side='right') / len(a)
+        cdf_b = np.searchsorted(sb, values, side='right') / len(b)
+        return 'ks', float(np.abs(cdf_a - cdf_b).max())
+    ca = collections.Counter(a)
+    cb = collections.Counter(b)
+    values = set(ca) | set(cb)
+    if len(values) <= _DISCRETE_LIMIT:
+        return 'tvd', 0.5 * sum(abs(ca[v] / len(a) - cb[v] / len(b)) for v in values)
+    sa = sorted(a)
+    sb = sorted(b)
+    return 'ks', max(abs(bisect.bisect_right(sa, v) / len(a) - bisect.bisect_right(sb, v) / len(b))
+                     for v in values)
+
+
+def _mismatch(a, b, atol: float) -> Tuple[int, Optional[int]]:
+    """(不一致次数, 第一次不一致的下标)"""
+    if _is_np(a):
+        if atol:
+            diff = np.abs(a.astype(np.float64) - b.astype(np.float64)) > atol
+        else:
+            diff = a != b
+        count = int(np.count_nonzero(diff))
+        return count, (int(np.argmax(diff)) if count else None)
+    count = 0
+    first = None
+    for i, (x, y) in enumerate(zip(a, b)):
+        if (abs(x - y) > atol) if atol else (x != y):
+            count += 1
+            if first is None:
+                first = i
+    return count, first
+
+
+def _value(v):
+    return v.item() if hasattr(v, 'item') else v
+
+
+# ---------- 对比 ----------
+def diff_frame(cols_a: Dict[str, Any], cols_b: Dict[str, Any], align: str = "seq",
+               tolerance: float = 0.005, relative: bool = True, atol: float = 0.0,
+               signals: Optional[Iterable[str]] = None, skip: Iterable[str] = ()) -> Dict[str, Any]:
+    """对比同一帧类的两组列（bulk_decode 的输出），返回该帧的报告 dict"""
+    if align not in ALIGN_MODES:
+        raise ValueError(f"align must be one of {ALIGN_MODES}")
+    ts_a, ts_b = cols_a['timestamp'], cols_b['timestamp']
+    if align == "seq":
+        idx_a, idx_b = align_seq(len(ts_a), len(ts_b))
+    else:
+        idx_a, idx_b = align_time(ts_a, ts_b, tolerance, relative)
+    skip = set(skip)
+    names = [n for n in (signals if signals is not None else cols_a) if n != 'timestamp']
+    report = {'rows_a': len(ts_a), 'rows_b': len(ts_b), 'pairs': len(idx_a), 'align': align,
+              'signals': [], 'skipped': []}
+    for name in names:
+        if name in skip:
+            report['skipped'].append(name)
+            continue
+        if name not in cols_a or name not in cols_b:
+            raise KeyError(f"Signal '{name}' not found in both captures")
+        col_a, col_b = cols_a[name], cols_b[name]
+        a = _take(col_a, idx_a)
+        b = _take(col_b, idx_b)
+        count, first = _mismatch(a, b, atol)
+        kind, dist = _distribution_distance(col_a, col_b)
+        entry = {
+            'name': name,
+            'mismatches': count,
+            'ratio': count / len(a) if len(a) else 0.0,
+            'first': None,
+            'a': _summary(col_a),
+            'b': _summary(col_b),
+            'dist_kind': kind,
+            'dist': dist,
+        }
+        if first is not None:
+            ia, ib = idx_a[first], idx_b[first]
+            entry['first'] = {'row_a': int(ia), 'row_b': int(ib),
+                              't_a': float(ts_a[ia]) - (float(ts_a[0]) if relative else 0.0),
+                              't_b': float(ts_b[ib]) - (float(ts_b[0]) if relative else 0.0),
+                              'a': _value(col_a[ia]), 'b': _value(col_b[ib])}
+        report['signals'].append(entry)
+    report['signals'].sort(key=lambda e: (-e['mismatches'], -e['dist'], e['name']))
+    return report
+
+
+def _e2e_bookkeeping(frame_name: str) -> List[str]:
+    """E2E 信号组中的 Counter / Checksum 信号名（找不到帧类时为空）"""
+    from __init__ import get_frame_class
+    try:
+        compiled = compile_frame(get_frame_class(frame_name))
+    except (KeyError, ValueError):
+        return []
+    names = []
+    for group in compiled.e2e_groups.values():
+        names.extend(op.name for op in (group.counter, group.checksum) if op is not None)
+    return names
+
+
+def diff_captures(path_a, path_b, frames: Iterable = (), align: str = "seq",
+                  tolerance: float = 0.005, relative: bool = True, atol: float = 0.0,
+                  signals: Optional[Sequence[str]] = None, include_e2e: bool = False,
+                  jobs: Optional[int] = None, **decode_kwargs) -> Dict[str, Any]:
+    """
+    解码并对比两个抓包（path_a / path_b 可以是单个路径或按顺序拼接的路径列表）。
+    返回 {'frames': {帧类名: 报告}, 'only_a': [...], 'only_b': [...]}。
+    decode_kwargs 传给 bulk_decode（framer_kwargs / ethertype / udp_ports / fmt / period / raw）。
+    """
+    paths_a = [path_a] if isinstance(path_a, str) else list(path_a)
+    paths_b = [path_b] if isinstance(path_b, str) else list(path_b)
+    frames = list(frames)
+    cols_a = bulk_decode(paths_a, frames=frames, jobs=jobs, **decode_kwargs)
+    cols_b = bulk_decode(paths_b, frames=frames, jobs=jobs, **decode_kwargs)
+    result = {'frames': {}, 'only_a': sorted(set(cols_a) - set(cols_b)),
+              'only_b': sorted(set(cols_b) - set(cols_a))}
+    for frame_name in sorted(set(cols_a) & set(cols_b)):
+        skip = () if include_e2e else _e2e_bookkeeping(frame_name)
+        result['frames'][frame_name] = diff_frame(cols_a[frame_name], cols_b[frame_name], align=align,
+                                                  tolerance=tolerance, relative=relative, atol=atol,
+                                                  signals=signals, skip=skip)
+    return result
+
+
+# ---------- 报告 ----------
+def _fmt(v) -> str:
+    if v is None:
+        return '-'
+    if isinstance(v, float):
+        return f"{v:.6g}"
+    return str(v)
+
+
+def format_report(result: Dict[str, Any], top: Optional[int] = None, show_identical: bool = False) -> str:
+    lines = []
+    for frame_name, rep in result['frames'].items():
+        lines.append(f"== {frame_name}: A {rep['rows_a']} 帧 / B {rep['rows_b']} 帧，"
+                     f"按{'序号' if rep['align'] == 'seq' else '时间'}对齐 {rep['pairs']} 对")
+        differing = [e for e in rep['signals'] if e['mismatches'] or e['dist'] > 0]
+        identical = len(rep['signals']) - len(differing)
+        shown = rep['signals'] if show_identical else differing
+        if top is not None:
+            shown = shown[:top]
+        if shown:
+            lines.append(f"  {'signal':<32} {'mismatch':>9} {'%':>7}  {'first divergence (t A/B: A -> B)':<38}"
+                         f" {'mean A / B':<23} {'changes A/B':<13} dist")
+        for e in shown:
+            first = e['first']
+            if first is None:
+                fd = '-'
+            else:
+                fd = f"{first['t_a']:.3f}/{first['t_b']:.3f}: {_fmt(first['a'])} -> {_fmt(first['b'])}"
+            mean = f"{_fmt(e['a']['mean'])} / {_fmt(e['b']['mean'])}"
+            changes = f"{e['a']['changes']}/{e['b']['changes']}"
+            lines.append(f"  {e['name']:<32} {e['mismatches']:>9} {100 * e['ratio']:>6.2f}%  {fd:<38}"
+                         f" {mean:<23} {changes:<13} {e['dist_kind']}={e['dist']:.4f}")
+        lines.append(f"  一致: {identical} 个信号；不同: {len(differing)} 个"
+                     + (f"；跳过（E2E Counter/Checksum）: {', '.join(rep['skipped'])}" if rep['skipped'] else ''))
+    if result['only_a']:
+        lines.append(f"仅出现在 A: {', '.join(result['only_a'])}")
+    if result['only_b']:
+        lines.append(f"仅出现在 B: {', '.join(result['only_b'])}")
+    return '\n'.join(lines)
+
+
+def _parse_int(text: str) -> int:
+    return int(text, 0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="对比两个抓包中各信号的行为（按序号或时间对齐）")
+    parser.add_argument('capture_a')
+    parser.add_argument('capture_b')
+    parser.add_argument('-f', '--frame', action='append', default=[],
+                        help='只对比该帧（类名或 msg_id），可重复；默认两侧都出现的全部帧')
+    parser.add_argument('-s', '--signal', action='append', default=None, help='只对比该信号，可重复')
+    parser.add_argument('--align', choices=ALIGN_MODES, default='seq', help='对齐方式（默认按序号）')
+    parser.add_argument('--tolerance', type=float, default=0.005, help='按时间对齐时允许的最大时间差（秒）')
+    parser.add_argument('--absolute', action='store_true', help='按绝对时间对齐（默认各自相对第一帧）')
+    parser.add_argument('--atol', type=float, default=0.0, help='数值差超过 atol 才算不一致')
+    parser.add_argument('--raw', action='store_true', help='比较原始值而不是物理值')
+    parser.add_argument('--include-e2e', action='store_true', help='同时比较 E2E Counter / Checksum')
+    parser.add_argument('--top', type=int, default=None, help='每个帧只列出差异最大的前 N 个信号')
+    parser.add_argument('--all', action='store_true', help='同时列出一致的信号')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='解码进程数')
+    parser.add_argument('--ethertype', type=_parse_int, default=0x88B5)
+    parser.add_argument('--udp-port', type=int, action='append', default=None)
+    parser.add_argument('--period', type=float, default=0.0, help='frames.txt 相邻两行的时间间隔（秒）')
+    parser.add_argument('--endian', choices=['big', 'little'], default='big', help='4+4 header 的字节序')
+    args = parser.parse_args(argv)
+
+    frames = [_parse_int(f) if f[:1].isdigit() else f for f in args.frame]
+    result = diff_captures(args.capture_a, args.capture_b, frames=frames, align=args.align,
+                           tolerance=args.tolerance, relative=not args.absolute, atol=args.atol,
+                           signals=args.signal, include_e2e=args.include_e2e, jobs=args.jobs,
+                           raw=args.raw, ethertype=args.ethertype, udp_ports=args.udp_port,
+                           period=args.period,
+                           framer_kwargs={'mode': 'custom_4_4', 'id_endian': args.endian,
+                                          'len_endian': args.endian})
+    print(format_report(result, top=args.top, show_identical=args.all))
+    differs = any(e['mismatches'] for rep in result['frames'].values() for e in rep['signals'])
+    return 1 if differs or result['only_a'] or result['only_b'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
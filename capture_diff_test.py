@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# @Time: 2026/01/03 14:50
+# @Author: JackyYin
+# @Email: jackhuan@icloud.com
+# @File: capture_diff_test.py
+
+"""
+capture_diff 的测试：按序号 / 按时间对齐后的不一致计数与第一次不一致的位置，
+NumPy 列（需要安装 NumPy）与 array 列得到相同的报告。
+
+运行：python -m pytest capture_diff_test.py  或  python capture_diff_test.py
+"""
+import random
+from array import array
+
+import pytest
+
+import capture_diff as cd
+
+_N = 400
+
+
+def _columns(seed: int = 3):
+    rnd = random.Random(seed)
+    ts = array('d', (100.0 + i * 0.01 for i in range(_N)))
+    a = {'timestamp': ts,
+         'Cnt': array('Q', (i & 0xF for i in range(_N))),
+         'Volt': array('d', (round(rnd.uniform(10, 15), 1) for _ in range(_N))),
+         'Wide': array('Q', (rnd.getrandbits(16) for _ in range(_N)))}
+    # B：整体时间偏移、少一帧、Volt 有 7 处改动
+    b = {name: array(col.typecode, col) for name, col in a.items()}
+    b['timestamp'] = array('d', (t + 50.0 for t in ts))
+    for i in range(120, 400, 40):
+        b['Volt'][i] += 0.5
+    for col in b.values():
+        del col[-1]
+    return a, b
+
+
+def _report(a, b, **kwargs):
+    r = cd.diff_frame(a, b, **kwargs)
+    return r['pairs'], [(e['name'], e['mismatches'], e['first'] and e['first']['row_a'],
+                         e['dist_kind'], pytest.approx(e['dist']), pytest.approx(e['a']['mean']))
+                        for e in r['signals']]
+
+
+def _report_pure(a, b, **kwargs):
+    np_saved = cd.np
+    cd.np = None
+    try:
+        return _report(a, b, **kwargs)
+    finally:
+        cd.np = np_saved
+
+
+def test_mismatches_seq_and_time():
+    a, b = _columns()
+    pairs, signals = _report_pure(a, b, align='seq')
+    assert pairs == _N - 1
+    assert [s[:3] for s in signals] == [('Volt', 7, 120), ('Cnt', 0, None), ('Wide', 0, None)]
+    assert signals[2][3] == 'ks' and signals[1][3] == 'tvd'
+    pairs, signals = _report_pure(a, b, align='time', tolerance=0.004)
+    assert pairs == _N - 1 and signals[0][:3] == ('Volt', 7, 120)
+    # 容差内的改动不计
+    assert _report_pure(a, b, atol=0.6)[1][0][1] == 0
+
+
+@pytest.mark.skipif(cd.np is None, reason="需要 NumPy")
+def test_numpy_columns_match_arrays():
+    a, b = _columns()
+    np_a = {k: cd.np.asarray(v) for k, v in a.items()}
+    np_b = {k: cd.np.asarray(v) for k, v in b.items()}
+    for kwargs in ({'align': 'seq'}, {'align': 'time', 'tolerance': 0.004}, {'atol': 0.3}):
+        assert _report(np_a, np_b, **kwargs) == _report_pure(a, b, **kwargs), kwargs
+
+
+if __name__ == '__main__':
+    test_mismatches_seq_and_time()
+    if cd.np is not None:
+        test_numpy_columns_match_arrays()
+    print('ok')
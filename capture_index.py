@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+# @Time: 2025/12/26 21:30
+# @Author: JackyYin
+# @Email: jackhuan@icloud.com
+# @File: capture_index.py
+
+"""
+抓包文件索引（旁路文件 <capture>.idx）：按 msg_id 与时间桶定位文件偏移，避免整文件扫描。
+
+一次遍历（CaptureIndex.build）记录：
+- 时间桶（默认 1 s）：每个桶第一条记录的偏移与序号；
+- 每个 msg_id：出现过的每个时间桶中，第一条含该 msg_id 的记录偏移、最后一条的结束偏移与条数。
+查询时在有序的桶号上二分（O(log n)），得到需要读取的若干字节范围，再交给
+CaptureReader.iter_pdus(start, end, first_index) 只解析这些范围。
+
+索引记录了抓包文件的大小与修改时间，文件变化后自动失效；msg_id 由建索引时的 Framer 拆分得到，
+读取时需使用相同的 framer / ethertype / udp_ports。时间戳不单调的抓包仍可建索引，
+此时按 msg_id 查询退化为线性遍历索引项（仍然只读取命中的范围）。
+
+用法：
+    with CaptureReader('day1.pcapng') as reader:     # 存在且未过期的 day1.pcapng.idx 会自动加载
+        if reader.index is None:
+            reader.build_index(bucket=1.0)           # 一次遍历并写出 day1.pcapng.idx
+        cf = compile_frame(UDFrame_Z_204)
+        for ts, msg_id, payload in reader.select([0x94], t0, t1):
+            parsed = cf.decode(payload)              # 只解码请求的帧
+"""
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from framer import PDUTruncatedError
+
+_MAGIC = b'CIDX'
+_VERSION = 1
+_HEADER = struct.Struct('<4sHB5xQqddIII')
+_MSG_HEADER = struct.Struct('<II')
+_FORMATS = ('pcap', 'pcapng', 'hex')
+_FLAG_MONOTONIC = 1
+
+# 需要读取的一段：(start, end, first_index)，与 CaptureReader.split() 的返回值一致
+Range = Tuple[int, int, int]
+
+
+def sidecar_path(capture_path: str) -> str:
+    return capture_path + '.idx'
+
+
+def _write_array(f, arr: array):
+    if sys.byteorder != 'little':
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    arr.tofile(f)
+
+
+def _read_array(data: bytes, pos: int, code: str, n: int) -> Tuple[array, int]:
+    arr = array(code)
+    end = pos + arr.itemsize * n
+    if end > len(data):
+        raise ValueError("capture index truncated")
+    arr.frombytes(data[pos:end])
+    if sys.byteorder != 'little':
+        arr.byteswap()
+    return arr, end
+
+
+class _MsgEntries:
+    """某个 msg_id 的索引项：每个出现过的时间桶一项"""
+    __slots__ = ('bucket', 'start', 'end', 'ordinal', 'count')
+
+    def __init__(self):
+        self.bucket = array('q')
+        self.start = array('Q')
+        self.end = array('Q')
+        self.ordinal = array('Q')
+        self.count = array('Q')
+
+    def arrays(self):
+        return self.bucket, self.start, self.end, self.ordinal, self.count
+
+
+class CaptureIndex:
+    def __init__(self, fmt: str, size: int, mtime_ns: int, bucket: float, period: float = 0.0,
+                 monotonic: bool = True):
+        if bucket <= 0:
+            raise ValueError("bucket must be > 0")
+        self.fmt = fmt
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.bucket = bucket
+        self.period = period
+        self.monotonic = monotonic
+        # 时间桶：桶号 / 桶内第一条记录的偏移 / 序号
+        self.buckets = array('q')
+        self.offsets = array('Q')
+        self.ordinals = array('Q')
+        self.msgs: Dict[int, _MsgEntries] = {}
+
+    # --- 建立 ---
+    @classmethod
+    def build(cls, reader, bucket: float = 1.0) -> 'CaptureIndex':
+        """一次遍历 reader 对应的整个文件建立索引（不保存，见 save()）"""
+        if reader.framer.mode == "none":
+            raise ValueError("建立 msg_id 索引需要带 msg_id 的 framer（例如 custom_4_4）")
+        st = os.stat(reader.path)
+        index = cls(reader.fmt, st.st_size, st.st_mtime_ns, bucket, reader.period)
+        iter_pdus = reader.framer.iter_pdus
+        buckets, offsets, ordinals = index.buckets, index.offsets, index.ordinals
+        msgs = index.msgs
+        # 上一条记录涉及的索引项：其结束偏移等于下一条记录的起始偏移
+        pending: List[Tuple[_MsgEntries, int]] = []
+        last_bucket = None
+        last_ts = float('-inf')
+        base = reader.records
+        for ts, datagram in reader.iter_datagrams():
+            off = reader.offset
+            for entries, i in pending:
+                entries.end[i] = off
+            pending = []
+            if ts < last_ts:
+                index.monotonic = False
+            last_ts = ts
+            b = int(ts // bucket)
+            ordinal = reader.records - base - 1
+            if b != last_bucket:
+                buckets.append(b)
+                offsets.append(off)
+                ordinals.append(ordinal)
+                last_bucket = b
+            seen = set()
+            try:
+                for msg_id, _ in iter_pdus(datagram):
+                    if msg_id in seen:
+                        continue
+                    seen.add(msg_id)
+                    entries = msgs.get(msg_id)
+                    if entries is None:
+                        entries = msgs[msg_id] = _MsgEntries()
+                    if entries.bucket and entries.bucket[-1] == b:
+                        entries.count[-1] += 1
+                    else:
+                        entries.bucket.append(b)
+                        entries.start.append(off)
+                        entries.end.append(off)
+                        entries.ordinal.append(ordinal)
+                        entries.count.append(1)
+                    pending.append((entries, len(entries.end) - 1))
+            except PDUTruncatedError:
+                pass
+        for entries, i in pending:
+            entries.end[i] = index.size
+        return index
+
+    # --- 持久化 ---
+    def save(self, path: str):
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, _VERSION, _FORMATS.index(self.fmt), self.size, self.mtime_ns,
+                                 self.bucket, self.period, _FLAG_MONOTONIC if self.monotonic else 0,
+                                 len(self.buckets), len(self.msgs)))
+            for arr in (self.buckets, self.offsets, self.ordinals):
+                _write_array(f, arr)
+            for msg_id in sorted(self.msgs):
+                entries = self.msgs[msg_id]
+                f.write(_MSG_HEADER.pack(msg_id, len(entries.bucket)))
+                for arr in entries.arrays():
+                    _write_array(f, arr)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'CaptureIndex':
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < _HEADER.size:
+            raise ValueError(f"{path}: not a capture index")
+        (magic, version, fmt, size, mtime_ns, bucket, period, flags,
+         n_buckets, n_msgs) = _HEADER.unpack_from(data, 0)
+        if magic != _MAGIC or version != _VERSION or fmt >= len(_FORMATS):
+            raise ValueError(f"{path}: unsupported capture index")
+        index = cls(_FORMATS[fmt], size, mtime_ns, bucket, period, bool(flags & _FLAG_MONOTONIC))
+        pos = _HEADER.size
+        index.buckets, pos = _read_array(data, pos, 'q', n_buckets)
+        index.offsets, pos = _read_array(data, pos, 'Q', n_buckets)
+        index.ordinals, pos = _read_array(data, pos, 'Q', n_buckets)
+        for _ in range(n_msgs):
+            if pos + _MSG_HEADER.size > len(data):
+                raise ValueError("capture index truncated")
+            msg_id, n = _MSG_HEADER.unpack_from(data, pos)
+            pos += _MSG_HEADER.size
+            entries = _MsgEntries()
+            entries.bucket, pos = _read_array(data, pos, 'q', n)
+            entries.start, pos = _read_array(data, pos, 'Q', n)
+            entries.end, pos = _read_array(data, pos, 'Q', n)
+            entries.ordinal, pos = _read_array(data, pos, 'Q', n)
+            entries.count, pos = _read_array(data, pos, 'Q', n)
+            index.msgs[msg_id] = entries
+        return index
+
+    def matches(self, reader) -> bool:
+        """索引是否对应 reader 当前的文件（大小 / 修改时间 / 格式，frames.txt 还要求 period 相同）"""
+        try:
+            st = os.stat(reader.path)
+        except OSError:
+            return False
+        if (st.st_size, st.st_mtime_ns, reader.fmt) != (self.size, self.mtime_ns, self.fmt):
+            return False
+        return reader.fmt != "hex" or reader.period == self.period
+
+    # --- 查询 ---
+    def msg_ids(self) -> List[int]:
+        return sorted(self.msgs)
+
+    def count(self, msg_id: int) -> int:
+        entries = self.msgs.get(msg_id)
+        return 0 if entries is None else sum(entries.count)
+
+    def _bucket_bounds(self, t0: Optional[float], t1: Optional[float]) -> Tuple[Optional[int], Optional[int]]:
+        b0 = None if t0 is None else int(t0 // self.bucket)
+        b1 = None if t1 is None else int(t1 // self.bucket)
+        return b0, b1
+
+    def seek(self, t: float) -> Tuple[int, int]:
+        """时间 t 所在时间桶的起始 (offset, first_index)；早于第一条记录时返回第一条"""
+        if not self.buckets:
+            return self.size, 0
+        i = max(0, bisect_right(self.buckets, int(t // self.bucket)) - 1)
+        return self.offsets[i], self.ordinals[i]
+
+    def ranges(self, msg_ids: Optional[Iterable[int]] = None, t0: Optional[float] = None,
+               t1: Optional[float] = None) -> List[Range]:
+        """
+        需要读取的字节范围 [(start, end, first_index)]（已排序、相邻 / 重叠的已合并）。
+        范围按时间桶取整，调用方仍需按 ts 与 msg_id 过滤。
+        """
+        b0, b1 = self._bucket_bounds(t0, t1)
+        found: List[Range] = []
+        if msg_ids is None:
+            buckets = self.buckets
+            if not buckets:
+                return []
+            if self.monotonic:
+                lo = 0 if b0 is None else max(0, bisect_right(buckets, b0) - 1)
+                hi = len(buckets) if b1 is None else bisect_right(buckets, b1)
+                if lo >= hi:
+                    return []
+                end = self.offsets[hi] if hi < len(buckets) else self.size
+                return [(self.offsets[lo], end, self.ordinals[lo])]
+            for i, b in enumerate(buckets):
+                if (b0 is None or b >= b0) and (b1 is None or b <= b1):
+                    end = self.offsets[i + 1] if i + 1 < len(buckets) else self.size
+                    found.append((self.offsets[i], end, self.ordinals[i]))
+        else:
+            for msg_id in msg_ids:
+                entries = self.msgs.get(msg_id)
+                if entries is None:
+                    continue
+                bucket = entries.bucket
+                if self.monotonic:
+                    lo = 0 if b0 is None else bisect_left(bucket, b0)
+                    hi = len(bucket) if b1 is None else bisect_right(bucket, b1)
+                    selected = range(lo, hi)
+                else:
+                    selected = [i for i, b in enumerate(bucket)
+                                if (b0 is None or b >= b0) and (b1 is None or b <= b1)]
+                for i in selected:
+                    found.append((entries.start[i], entries.end[i], entries.ordinal[i]))
+        return self._merge(found)
+
+    @staticmethod
+    def _merge(found: List[Range]) -> List[Range]:
+        found.sort()
+        merged: List[Range] = []
+        for start, end, ordinal in found:
+            if merged and start <= merged[-1][1]:
+                if end > merged[-1][1]:
+                    merged[-1] = (merged[-1][0], end, merged[-1][2])
+                continue
+            merged.append((start, end, ordinal))
+        return merged
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'buckets': len(self.buckets),
+            'msg_ids': len(self.msgs),
+            'entries': sum(len(e.bucket) for e in self.msgs.values()),
+            'monotonic': self.monotonic,
+        }
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# @Time: 2026/01/02 15:30
+# @Author: JackyYin
+# @Email: jackhuan@icloud.com
+# @File: capture_index_test.py
+
+"""
+capture_index 的测试：借助索引的 select 与整文件扫描结果一致、旁路索引的保存 / 加载、文件变化后失效。
+
+运行：python -m pytest capture_index_test.py  或  python capture_index_test.py
+"""
+import os
+import tempfile
+
+from capture_index import CaptureIndex, sidecar_path
+from capture_reader import CaptureReader
+from framer import Framer
+from pcap_recorder import wrap_udp, write_capture
+
+_LOCAL = ('192.168.1.10', 50000)
+_REMOTE = ('192.168.1.20', 50001)
+_T0_NS = 1_700_000_000_000_000_000
+
+
+def _write_sample(path: str, fmt: str) -> None:
+    """20 s 的抓包：0x94 每 10 ms、0x95 每 100 ms、0x96 只在第 5~6 s 出现；部分数据报聚合两个 PDU"""
+    framer = Framer(mode='custom_4_4')
+    records = []
+    for i in range(2000):
+        ts_ns = _T0_NS + i * 10_000_000
+        data = framer.add_header(bytes([i & 0xFF]) * 8, msg_id=0x94)
+        if i % 10 == 0:
+            data += framer.add_header(bytes([i % 7]) * 4, msg_id=0x95)
+        if 500 <= i < 600 and i % 5 == 0:
+            data += framer.add_header(b'\x96' * 6, msg_id=0x96)
+        frame = wrap_udp(data, _LOCAL, _REMOTE)
+        records.append((ts_ns, 'rx', frame, len(frame)))
+    write_capture(path, records, fmt=fmt)
+
+
+def _items(it):
+    return [(ts, msg_id, bytes(p)) for ts, msg_id, p in it]
+
+
+def _check_select_matches_scan(fmt: str):
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'sample.' + fmt)
+        _write_sample(path, fmt)
+        t = _T0_NS / 1e9
+        queries = [
+            (None, None, None),
+            ([0x94], None, None),
+            ([0x96], None, None),
+            ([0x95, 0x96], t + 4.5, t + 5.3),
+            (None, t + 12.0, t + 12.0),
+            ([0x94], t + 19.95, None),
+            ([0x97], None, None),
+            ([0x96], t + 10.0, t + 15.0),
+        ]
+        with CaptureReader(path, index=False) as scan:
+            expected = [_items(scan.select(*q)) for q in queries]
+        assert len(expected[0]) == 2000 + 200 + 20
+        assert len(expected[2]) == 20
+
+        with CaptureReader(path) as reader:
+            assert reader.index is None
+            index = reader.build_index(bucket=1.0)
+            assert index.msg_ids() == [0x94, 0x95, 0x96]
+            assert index.count(0x96) == 20
+            # 稀疏的 msg_id 只需读取文件的一小部分
+            read = sum(end - start for start, end, _ in index.ranges({0x96}))
+            assert read < os.path.getsize(path) // 10
+            for q, exp in zip(queries, expected):
+                assert _items(reader.select(*q)) == exp, q
+
+        # 旁路索引自动加载，内容与建立时一致
+        with CaptureReader(path) as reader:
+            assert reader.index is not None
+            assert reader.index.stats() == index.stats()
+            for q, exp in zip(queries, expected):
+                assert _items(reader.select(*q)) == exp, q
+
+        # 文件变化后索引失效
+        with open(path, 'ab') as f:
+            f.write(b'\x00' * 16)
+        loaded = CaptureIndex.load(sidecar_path(path))
+        with CaptureReader(path, index=False) as reader:
+            assert not loaded.matches(reader)
+
+
+def test_select_matches_full_scan_pcap():
+    _check_select_matches_scan('pcap')
+
+
+def test_select_matches_full_scan_pcapng():
+    _check_select_matches_scan('pcapng')
+
+
+if __name__ == '__main__':
+    test_select_matches_full_scan_pcap()
+    test_select_matches_full_scan_pcapng()
+    print('ok')
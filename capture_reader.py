@@ -0,0 +1,458 @@
+# -*- coding: utf-8 -*-
+# @Time: 2025/12/23 21:15
+# @Author: JackyYin
+# @Email: jackhuan@icloud.com
+# @File: capture_reader.py
+
+"""
+抓包文件读取：mmap 方式遍历 pcap / pcapng 以及 frames.txt（每行一个十六进制数据报）。
+
+- 文件只做 mmap，记录按偏移逐条解析，产出的 payload 是指向映射内存的 memoryview，不复制；
+- 链路层支持 Ethernet（含 802.1Q VLAN）、Linux SLL、Raw IPv4：
+  以太类型等于 ethertype（AF_PACKET 直发）时取以太头之后的数据，IPv4/UDP 时取 UDP 载荷
+  （udp_ports 可限定端口），其它报文跳过并计数；
+- 取出的数据报再按 Framer 配置用 iter_pdus 拆成 (msg_id, payload)，一个数据报可产出多个 PDU；
+- frames.txt 按大块（默认 8 MiB，按行对齐）整体 split + bytes.fromhex，没有逐行 readline 开销，
+  由于文件里没有时间戳，ts = 行号 * period；
+- split(n) 把文件切成 n 段按记录对齐的字节范围，iter_pdus(start, end, first_index) 只遍历其中一段，
+  供多进程并行处理（见 bulk_decode.py）；
+- 旁路索引 <path>.idx（见 capture_index.py）存在且未过期时自动加载，
+  select(msg_ids, t0, t1) 借助索引只读取命中的范围，没有索引时退化为整文件扫描过滤。
+
+用法：
+    with CaptureReader('bench.pcapng', framer=Framer(mode='custom_4_4')) as reader:
+        for ts, msg_id, payload in reader:
+            ...
+注意：memoryview 在 reader 关闭后失效，需要长期保存时请 bytes(payload)。
+"""
+import mmap
+import os
+import struct
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from framer import Framer, PDUTruncatedError
+from capture_index import CaptureIndex, sidecar_path
+
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+
+_PCAP_MAGICS = {
+    b'\xd4\xc3\xb2\xa1': ('<', 1e-6),
+    b'\xa1\xb2\xc3\xd4': ('>', 1e-6),
+    b'\x4d\x3c\xb2\xa1': ('<', 1e-9),
+    b'\xa1\xb2\x3c\x4d': ('>', 1e-9),
+}
+_PCAPNG_SHB = 0x0A0D0D0A
+_ETH_TYPE = struct.Struct('!H')
+
+CaptureItem = Tuple[float, Optional[int], memoryview]
+
+
+def detect_format(path: str) -> str:
+    """按文件头识别格式："pcap" / "pcapng" / "hex"（frames.txt）"""
+    with open(path, 'rb') as f:
+        head = f.read(4)
+    if head in _PCAP_MAGICS:
+        return "pcap"
+    if len(head) == 4 and struct.unpack('<I', head)[0] == _PCAPNG_SHB:
+        return "pcapng"
+    return "hex"
+
+
+class CaptureReader:
+    def __init__(self, path: str, framer: Optional[Framer] = None, ethertype: int = 0x88B5,
+                 udp_ports: Optional[Iterable[int]] = None, fmt: Optional[str] = None,
+                 period: float = 0.0, hex_block_size: int = 8 << 20, index=None):
+        """
+        framer: 拆分数据报的 Framer（默认 custom_4_4，与 EthService 默认一致）
+        ethertype: AF_PACKET 直发帧的以太类型
+        udp_ports: 只取源或目的端口在其中的 UDP 报文（None 表示全部）
+        fmt: "pcap" / "pcapng" / "hex"，None 时按文件头自动识别
+        period: frames.txt 相邻两行的时间间隔（秒）
+        index: None 时自动加载未过期的旁路索引 <path>.idx；False 不使用索引；也可直接传入 CaptureIndex
+        """
+        self.path = path
+        self.framer = framer if framer is not None else Framer(mode="custom_4_4")
+        self.ethertype = ethertype
+        self.udp_ports = None if udp_ports is None else frozenset(udp_ports)
+        self.fmt = fmt or detect_format(path)
+        self.period = period
+        self.hex_block_size = hex_block_size
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        if self._mm is not None and hasattr(mmap, 'MADV_SEQUENTIAL'):
+            try:
+                self._mm.madvise(mmap.MADV_SEQUENTIAL)
+            except (OSError, ValueError):
+                pass
+
+        # 当前记录（数据报）在文件中的起始偏移，建立索引时使用
+        self.offset = 0
+        self.index: Optional[CaptureIndex] = None
+        if isinstance(index, CaptureIndex):
+            self.index = index
+        elif index is None:
+            self.index = self._load_index()
+
+        # 统计
+        self.records = 0
+        self.pdus = 0
+        self.skipped = 0
+        self.truncated = 0
+
+    # --- 上下文 / 释放 ---
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        mm = self._mm
+        self._mm = None
+        if mm is not None:
+            try:
+                mm.close()
+            except BufferError:
+                pass  # 仍有 memoryview 引用映射内存，由 GC 释放
+        self._file.close()
+
+    # --- 遍历 ---
+    def __iter__(self) -> Iterator[CaptureItem]:
+        return self.iter_pdus()
+
+    def iter_pdus(self, start: Optional[int] = None, end: Optional[int] = None,
+                  first_index: int = 0) -> Iterator[CaptureItem]:
+        """产出 (ts, msg_id, payload_memoryview)；start / end / first_index 见 iter_datagrams"""
+        iter_pdus = self.framer.iter_pdus
+        for ts, datagram in self.iter_datagrams(start, end, first_index):
+            try:
+                for msg_id, payload in iter_pdus(datagram):
+                    self.pdus += 1
+                    yield ts, msg_id, payload
+            except PDUTruncatedError:
+                self.truncated += 1
+
+    def iter_datagrams(self, start: Optional[int] = None, end: Optional[int] = None,
+                       first_index: int = 0) -> Iterator[Tuple[float, memoryview]]:
+        """
+        产出 (ts, 应用层数据报)：已去掉 以太 / IP / UDP 头，尚未按 Framer 拆分。
+        start / end: 只遍历该字节范围内的记录，必须是 split() 给出的记录边界（None 表示文件首 / 尾）
+        first_index: frames.txt 中 start 处的行号（用于计算 ts），同样由 split() 给出
+        """
+        if self.fmt == "hex":
+            yield from self._iter_hex(start, end, first_index)
+            return
+        if self.fmt == "pcap":
+            records = self._iter_pcap(start, end)
+        else:
+            records = self._iter_pcapng(start, end)
+        for ts, linktype, frame in records:
+            self.records += 1
+            data = self._extract(linktype, frame)
+            if data is None:
+                self.skipped += 1
+                continue
+            yield ts, data
+
+    # --- 索引 ---
+    def _load_index(self) -> Optional[CaptureIndex]:
+        path = sidecar_path(self.path)
+        if not os.path.exists(path):
+            return None
+        try:
+            index = CaptureIndex.load(path)
+        except (OSError, ValueError, struct.error):
+            return None
+        return index if index.matches(self) else None
+
+    def build_index(self, bucket: float = 1.0, save: bool = True) -> CaptureIndex:
+        """遍历整个文件建立索引（save=True 时写出 <path>.idx），并供本 reader 后续 select 使用"""
+        index = CaptureIndex.build(self, bucket=bucket)
+        if save:
+            index.save(sidecar_path(self.path))
+        self.index = index
+        return index
+
+    def select(self, msg_ids: Optional[Iterable[int]] = None, t0: Optional[float] = None,
+               t1: Optional[float] = None) -> Iterator[CaptureItem]:
+        """只产出 msg_id 在 msg_ids 中（None 表示全部）且 t0 <= ts <= t1 的 PDU"""
+        wanted = None if msg_ids is None else frozenset(msg_ids)
+        if self.index is not None:
+            ranges = self.index.ranges(wanted, t0, t1)
+        else:
+            ranges = [(None, None, 0)]
+        lo = float('-inf') if t0 is None else t0
+        hi = float('inf') if t1 is None else t1
+        for start, end, first_index in ranges:
+            for ts, msg_id, payload in self.iter_pdus(start, end, first_index):
+                if lo <= ts <= hi and (wanted is None or msg_id in wanted):
+                    yield ts, msg_id, payload
+
+    # --- 分段 ---
+    def split(self, n: int) -> List[Tuple[int, int, int]]:
+        """
+        把文件切成至多 n 段大小相近、按记录对齐的字节范围，返回 [(start, end, first_index)]。
+        pcap / pcapng 只扫描记录头（不解析载荷）；frames.txt 按换行对齐，并统计每段之前的行数。
+        """
+        if n < 1:
+            raise ValueError("n must be >= 1")
+        mm = self._mm
+        if mm is None:
+            return []
+        total = len(mm)
+        if self.fmt == "hex":
+            return self._split_hex(n, total)
+        if self.fmt == "pcap":
+            bounds = self._record_offsets_pcap()
+        else:
+            bounds = self._record_offsets_pcapng()
+        first = next(bounds, None)
+        if first is None:
+            return []
+        step = max(1, (total - first) // n)
+        cuts = [first]
+        target = first + step
+        for off in bounds:
+            if off >= target and len(cuts) < n:
+                cuts.append(off)
+                target = off + step
+        cuts.append(total)
+        return [(a, b, 0) for a, b in zip(cuts, cuts[1:])]
+
+    def _split_hex(self, n: int, total: int) -> List[Tuple[int, int, int]]:
+        mm = self._mm
+        step = max(1, total // n)
+        cuts = [0]
+        while len(cuts) < n:
+            nl = mm.find(b'\n', cuts[-1] + step)
+            if nl < 0 or nl + 1 >= total:
+                break
+            cuts.append(nl + 1)
+        cuts.append(total)
+        ranges = []
+        index = 0
+        for a, b in zip(cuts, cuts[1:]):
+            ranges.append((a, b, index))
+            index += sum(1 for line in mm[a:b].split(b'\n') if line and not line.isspace())
+        return ranges
+
+    def _record_offsets_pcap(self) -> Iterator[int]:
+        mm = self._mm
+        if len(mm) < 24:
+            return
+        endian = _PCAP_MAGICS[mm[:4]][0]
+        caplen_of = struct.Struct(endian + 'I').unpack_from
+        total = len(mm)
+        off = 24
+        while off + 16 <= total:
+            yield off
+            off += 16 + caplen_of(mm, off + 8)[0]
+
+    def _record_offsets_pcapng(self) -> Iterator[int]:
+        """数据块（EPB / SPB）的偏移；第二个 SHB 之后不再给出切分点（其接口表需要从头解析）"""
+        mm = self._mm
+        endian, _, off = self._pcapng_prologue()
+        total = len(mm)
+        while off + 12 <= total:
+            btype, blen = struct.unpack_from(endian + 'II', mm, off)
+            if btype == _PCAPNG_SHB or blen < 12:
+                return
+            if btype in (3, 6):
+                yield off
+            off += blen
+
+    # --- 链路层 ---
+    def _extract(self, linktype: int, frame: memoryview) -> Optional[memoryview]:
+        if linktype == LINKTYPE_ETHERNET:
+            if len(frame) < 14:
+                return None
+            off = 12
+            eth_type = _ETH_TYPE.unpack_from(frame, off)[0]
+            while eth_type in (0x8100, 0x88A8) and len(frame) >= off + 6:
+                off += 4
+                eth_type = _ETH_TYPE.unpack_from(frame, off)[0]
+            off += 2
+        elif linktype == LINKTYPE_LINUX_SLL:
+            if len(frame) < 16:
+                return None
+            eth_type = _ETH_TYPE.unpack_from(frame, 14)[0]
+            off = 16
+        elif linktype in (LINKTYPE_RAW, LINKTYPE_IPV4):
+            eth_type = 0x0800
+            off = 0
+        else:
+            return None
+        if eth_type == self.ethertype:
+            return frame[off:]
+        if eth_type != 0x0800 or len(frame) < off + 20:
+            return None
+        ver_ihl = frame[off]
+        if ver_ihl >> 4 != 4 or frame[off + 9] != 17:
+            return None  # 只处理 IPv4 / UDP
+        ip_len = _ETH_TYPE.unpack_from(frame, off + 2)[0]
+        udp = off + (ver_ihl & 0x0F) * 4
+        if len(frame) < udp + 8:
+            return None
+        if self.udp_ports is not None:
+            sport, dport = struct.unpack_from('!HH', frame, udp)
+            if sport not in self.udp_ports and dport not in self.udp_ports:
+                return None
+        udp_len = _ETH_TYPE.unpack_from(frame, udp + 4)[0]
+        # 以 UDP 长度为准（以太最小帧填充不属于载荷），并受 IP 总长与实际捕获长度约束
+        end = min(udp + udp_len, off + ip_len, len(frame))
+        return frame[udp + 8:end]
+
+    # --- pcap ---
+    def _iter_pcap(self, start: Optional[int] = None,
+                   stop: Optional[int] = None) -> Iterator[Tuple[float, int, memoryview]]:
+        mm = self._mm
+        if mm is None or len(mm) < 24:
+            return
+        endian, unit = _PCAP_MAGICS[mm[:4]]
+        linktype = struct.unpack_from(endian + 'I', mm, 20)[0] & 0x0FFFFFFF
+        rec = struct.Struct(endian + 'IIII')
+        view = memoryview(mm)
+        try:
+            total = len(mm)
+            limit = total if stop is None else min(stop, total)
+            off = 24 if start is None else max(start, 24)
+            while off + 16 <= limit:
+                sec, frac, caplen, _ = rec.unpack_from(mm, off)
+                start = off + 16
+                end = start + caplen
+                if end > total:
+                    self.truncated += 1
+                    break
+                self.offset = off
+                yield sec + frac * unit, linktype, view[start:end]
+                off = end
+        finally:
+            view.release()
+
+    # --- pcapng ---
+    def _pcapng_prologue(self) -> Tuple[str, List[Tuple[int, float]], int]:
+        """解析文件开头的 SHB / IDB 等非数据块，返回 (字节序, 接口表, 第一个数据块的偏移)"""
+        mm = self._mm
+        total = len(mm)
+        endian = '<'
+        interfaces: List[Tuple[int, float]] = []
+        off = 0
+        while off + 12 <= total:
+            btype = struct.unpack_from(endian + 'I', mm, off)[0]
+            if btype == _PCAPNG_SHB:
+                if off:
+                    break
+                endian = '<' if mm[off + 8:off + 12] == b'\x4d\x3c\x2b\x1a' else '>'
+            elif btype in (3, 6):
+                break
+            blen = struct.unpack_from(endian + 'I', mm, off + 4)[0]
+            if blen < 12 or off + blen > total:
+                break
+            if btype == 1:
+                linktype = struct.unpack_from(endian + 'H', mm, off + 8)[0]
+                interfaces.append((linktype, self._tsresol(mm, off + 16, off + blen - 4, endian)))
+            off += blen
+        return endian, interfaces, off
+
+    def _iter_pcapng(self, start: Optional[int] = None,
+                     stop: Optional[int] = None) -> Iterator[Tuple[float, int, memoryview]]:
+        mm = self._mm
+        if mm is None:
+            return
+        view = memoryview(mm)
+        total = len(mm)
+        limit = total if stop is None else min(stop, total)
+        endian = '<'
+        interfaces = []  # [(linktype, 每个时间戳单位对应的秒数)]
+        off = 0
+        if start:
+            # 从文件中间开始时，字节序与接口表取自文件开头
+            endian, interfaces, first = self._pcapng_prologue()
+            off = max(start, first)
+        try:
+            while off + 12 <= limit:
+                btype = struct.unpack_from(endian + 'I', mm, off)[0]
+                if btype == _PCAPNG_SHB:
+                    bom = mm[off + 8:off + 12]
+                    endian = '<' if bom == b'\x4d\x3c\x2b\x1a' else '>'
+                    interfaces = []
+                blen = struct.unpack_from(endian + 'I', mm, off + 4)[0]
+                if blen < 12 or off + blen > total:
+                    self.truncated += 1
+                    break
+                if btype == 1:  # IDB
+                    linktype = struct.unpack_from(endian + 'H', mm, off + 8)[0]
+                    interfaces.append((linktype, self._tsresol(mm, off + 16, off + blen - 4, endian)))
+                elif btype == 6:  # EPB
+                    iface, hi, lo, caplen = struct.unpack_from(endian + 'IIII', mm, off + 8)
+                    if iface < len(interfaces):
+                        linktype, unit = interfaces[iface]
+                        start = off + 28
+                        self.offset = off
+                        yield ((hi << 32) | lo) * unit, linktype, view[start:start + caplen]
+                elif btype == 3:  # SPB：无时间戳，长度以原始长度与块长度较小者为准
+                    if interfaces:
+                        orig = struct.unpack_from(endian + 'I', mm, off + 8)[0]
+                        start = off + 12
+                        self.offset = off
+                        yield 0.0, interfaces[0][0], view[start:start + min(orig, blen - 16)]
+                off += blen
+        finally:
+            view.release()
+
+    @staticmethod
+    def _tsresol(mm, off: int, end: int, endian: str) -> float:
+        """解析 IDB 选项中的 if_tsresol（默认微秒）"""
+        unit = 1e-6
+        while off + 4 <= end:
+            code, length = struct.unpack_from(endian + 'HH', mm, off)
+            if code == 0:
+                break
+            if code == 9 and length >= 1:
+                v = mm[off + 4]
+                unit = 2.0 ** -(v & 0x7F) if v & 0x80 else 10.0 ** -v
+            off += 4 + ((length + 3) & ~3)
+        return unit
+
+    # --- frames.txt ---
+    def _iter_hex(self, start: Optional[int] = None, stop: Optional[int] = None,
+                  first_index: int = 0) -> Iterator[Tuple[float, memoryview]]:
+        mm = self._mm
+        if mm is None:
+            return
+        total = len(mm) if stop is None else min(stop, len(mm))
+        block = self.hex_block_size
+        period = self.period
+        index = first_index
+        off = start or 0
+        while off < total:
+            end = min(off + block, total)
+            if end < total:
+                nl = mm.rfind(b'\n', off, end)
+                end = nl + 1 if nl >= 0 else total
+            pos = off
+            for line in mm[off:end].split(b'\n'):
+                self.offset = pos
+                pos += len(line) + 1
+                if not line or line.isspace():
+                    continue
+                self.records += 1
+                try:
+                    data = bytes.fromhex(line.decode('ascii'))
+                except ValueError:
+                    self.skipped += 1
+                    index += 1
+                    continue
+                yield index * period, memoryview(data)
+                index += 1
+            off = end
+
+
+def iter_capture(path: str, **kwargs) -> Iterator[CaptureItem]:
+    """便捷函数：遍历 path 中的全部 PDU，结束后自动关闭文件"""
+    with CaptureReader(path, **kwargs) as reader:
+        yield from reader
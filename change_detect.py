@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+# @Time: 2025/12/17 20:40
+# @Author: JackyYin
+# @Email: jackhuan@icloud.com
+# @File: change_detect.py
+
+"""
+按字节差分的变化检测：只解码相对上一帧发生变化的信号。
+
+10 ms 周期帧大多只有 Counter / CRC 字节在变。ChangeDetector 保存上一帧 payload（整数形式），
+新帧到来时做一次 XOR，按变化的字节查 CompiledFrame.byte_index 得到受影响的信号，
+只对这些信号调用编译后的解码函数。相同的"变化字节组合"复用同一个解码函数，
+因此 CPU 开销随变化率而不是帧率增长。与变化信号共用字节、但值未变的信号（例如与 Counter
+同字节的 DataID）会与上次的解码值比较后剔除。
+
+用法：
+    det = ChangeDetector(compile_frame(UDFrame_Z_204))
+    changed = det.update(payload)   # {sig_name: 物理值}，无变化时返回 None；第一帧返回全部信号
+"""
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from frame_codec import CompiledFrame
+
+
+class ChangeDetector:
+    def __init__(self, compiled: CompiledFrame, names: Optional[Iterable[str]] = None,
+                 max_decoders: int = 256):
+        """
+        :param compiled: compile_frame() 的结果
+        :param names: 只关心的信号（None 表示全部信号）；其它信号所在字节的变化被忽略
+        :param max_decoders: 缓存的"变化字节组合 → 解码函数"上限，超出后逐信号解码
+        """
+        self.compiled = compiled
+        self.msg_length = compiled.msg_length
+        if names is None:
+            wanted = None
+        else:
+            wanted = set(names)
+            unknown = wanted - set(compiled.ops)
+            if unknown:
+                raise KeyError(f"Signal(s) {sorted(unknown)} not found in frame definition")
+        self.names = None if wanted is None else tuple(op.name for op in compiled.signals if op.name in wanted)
+        self._byte_index: Tuple[Tuple[str, ...], ...] = tuple(
+            names_ if wanted is None else tuple(n for n in names_ if n in wanted)
+            for names_ in compiled.byte_index
+        )
+        # 只保留被关心信号覆盖的字节，其它字节的变化直接屏蔽
+        watch = 0
+        for i, names_ in enumerate(self._byte_index):
+            if names_:
+                watch |= 0xFF << (8 * i)
+        self._watch_mask = watch
+        self._max_decoders = max_decoders
+        self._decoders: Dict[int, Any] = {}  # 变化字节位图 → 解码函数（None 表示无信号）
+        self._last: Optional[int] = None
+        self._values: Dict[str, Any] = {}  # 已解码信号的上一次物理值
+
+        # 统计
+        self.frames = 0
+        self.unchanged = 0
+
+    @property
+    def last_payload(self) -> Optional[bytes]:
+        """上一帧 payload（尚未收到帧时为 None）"""
+        if self._last is None:
+            return None
+        return self._last.to_bytes(self.msg_length, 'little')
+
+    def reset(self):
+        """丢弃上一帧，下一帧按"全部变化"处理"""
+        self._last = None
+        self._values = {}
+
+    def prime(self, payload) -> None:
+        """记录 payload 作为上一帧（不回报变化），例如从另一个检测器继承状态"""
+        self._last = int.from_bytes(payload[:self.msg_length], 'little')
+        self._values = self.compiled.make_decoder(self.names)(payload)
+
+    def changed_signals(self, payload) -> Tuple[str, ...]:
+        """返回相对上一帧变化的信号名（不更新上一帧、不解码）"""
+        cur = int.from_bytes(payload[:self.msg_length], 'little')
+        byte_mask = self._byte_mask(cur)
+        return self._names_for(byte_mask) if byte_mask else ()
+
+    def update(self, payload) -> Optional[Dict[str, Any]]:
+        """
+        与上一帧比较并记录当前帧；返回变化信号的物理值 dict，无变化时返回 None。
+        payload 长度必须 >= msg_length。
+        """
+        self.frames += 1
+        cur = int.from_bytes(payload[:self.msg_length], 'little')
+        byte_mask = self._byte_mask(cur)
+        self._last = cur
+        if not byte_mask:
+            self.unchanged += 1
+            return None
+        decoder = self._decoders.get(byte_mask)
+        if decoder is None:
+            names = self._names_for(byte_mask)
+            if len(self._decoders) < self._max_decoders:
+                decoder = self.compiled.make_decoder(names) if names else False
+                self._decoders[byte_mask] = decoder
+            else:
+                ops = self.compiled.ops
+                decoder = lambda p: {n: ops[n].to_physical(ops[n].read(p)) for n in names}
+        if decoder is False:
+            self.unchanged += 1
+            return None
+        decoded = decoder(payload)
+        values = self._values
+        changed = {n: v for n, v in decoded.items() if n not in values or values[n] != v}
+        values.update(decoded)
+        if not changed:
+            self.unchanged += 1
+            return None
+        return changed
+
+    def _byte_mask(self, cur: int) -> int:
+        """变化字节位图：bit i 置位表示第 i 字节（在关心范围内）发生变化"""
+        last = self._last
+        if last is None:
+            x = self._watch_mask
+        else:
+            x = (cur ^ last) & self._watch_mask
+        byte_mask = 0
+        while x:
+            b = ((x & -x).bit_length() - 1) >> 3
+            byte_mask |= 1 << b
+            x &= ~(0xFF << (8 * b))
+        return byte_mask
+
+    def _names_for(self, byte_mask: int) -> Tuple[str, ...]:
+        hit = set()
+        index = self._byte_index
+        while byte_mask:
+            b = (byte_mask & -byte_mask).bit_length() - 1
+            hit.update(index[b])
+            byte_mask &= byte_mask - 1
+        # 保持帧定义中的信号顺序
+        return tuple(op.name for op in self.compiled.signals if op.name in hit)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'frames': self.frames,
+            'unchanged': self.unchanged,
+            'decoders': len(self._decoders),
+        }
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# @Time: 2026/01/02 10:20
+# @Author: JackyYin
+# @Email: jackhuan@icloud.com
+# @File: conflate_test.py
+
+"""
+conflate 的测试：publish 不解码；投递线程每个新帧只解码一次，多个订阅者共享。
+
+运行：python -m pytest conflate_test.py  或  python conflate_test.py
+"""
+import threading
+import time
+
+from conflate import LatestValueConflator
+
+
+def test_publish_does_not_decode_and_subscribers_share_one_decode():
+    calls = []
+
+    def decode(raw):
+        calls.append(raw)
+        return {'v': raw[0]}
+
+    conflator = LatestValueConflator(decode)
+    got_a, got_b = [], []
+    done = threading.Event()
+
+    def cb_a(parsed, raw, collapsed):
+        got_a.append((parsed['v'], collapsed))
+
+    def cb_b(parsed, raw, collapsed):
+        got_b.append((parsed['v'], collapsed))
+        done.set()
+
+    conflator.subscribe(cb_a, 0.05)
+    conflator.subscribe(cb_b, 0.05)
+    for i in range(100):
+        conflator.publish(bytes([i]))
+    assert calls == []  # 接收线程一侧不解码
+
+    conflator.start()
+    try:
+        assert done.wait(2.0)
+        time.sleep(0.1)
+    finally:
+        conflator.stop()
+    assert got_a == [(99, 99)]
+    assert got_b == [(99, 99)]
+    assert calls == [bytes([99])]
+
+
+if __name__ == '__main__':
+    test_publish_does_not_decode_and_subscribers_share_one_decode()
+    print('ok')
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+# @Time: 2025/12/13 16:05
+# @Author: JackyYin
+# @Email: jackhuan@icloud.com
+# @File: dispatch.py
+
+"""
+有界回调分发器：把用户回调从 socket 接收线程中剥离出来。
+
+接收线程只做 submit()（入队），由 workers 个工作线程执行回调，
+某个回调执行慢时不会拖住 socket 读取，从而避免内核丢包。
+
+队列满时的溢出策略（overflow）：
+- "drop_oldest"：丢弃队首最旧的任务，放入新任务（默认，适合周期信号）
+- "drop_newest"：丢弃本次提交的新任务
+- "block"：阻塞接收线程直到队列有空位（不丢任务，但会反压到 socket）
+
+统计：stats() 返回当前队列深度、历史最大深度、已执行/丢弃/异常数量。
+注意：workers > 1 时回调的执行顺序不再保证与接收顺序一致。
+"""
+import threading
+from collections import deque
+from typing import Any, Callable, Dict
+
+OVERFLOW_POLICIES = ("drop_oldest", "drop_newest", "block")
+
+
+class CallbackDispatcher:
+    def __init__(self, workers: int = 1, maxsize: int = 1024, overflow: str = "drop_oldest",
+                 name: str = "CallbackDispatcher"):
+        if workers < 1:
+            raise ValueError("workers must be >= 1")
+        if maxsize < 1:
+            raise ValueError("maxsize must be >= 1")
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}")
+        self.workers = workers
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.name = name
+
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)        # 队列非空（工作线程等待）
+        self._not_full = threading.Condition(self._lock)    # 队列有空位（block 策略下提交方等待）
+        self._threads = []
+        self._running = False
+
+        # 统计
+        self._max_depth = 0
+        self._submitted = 0
+        self._executed = 0
+        self._dropped_oldest = 0
+        self._dropped_newest = 0
+        self._errors = 0
+
+    # --- 生命周期 ---
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"{self.name}-{i}", daemon=True)
+            self._threads.append(t)
+            t.start()
+
+    def stop(self, drain: bool = False, timeout: float = 1.0):
+        """停止工作线程。drain=True 时先执行完队列中剩余的任务。"""
+        with self._cond:
+            if not self._running:
+                return
+            if not drain:
+                self._queue.clear()
+            self._running = False
+            self._cond.notify_all()
+            self._not_full.notify_all()
+        for t in self._threads:
+            if t is not threading.current_thread():
+                t.join(timeout=timeout)
+        self._threads = []
+
+    # --- 提交 ---
+    def submit(self, fn: Callable[..., Any], *args) -> bool:
+        """
+        提交一个回调任务，返回是否已入队（drop_newest 丢弃时返回 False）。
+        接收线程调用，除 block 策略外不会阻塞。
+        """
+        with self._cond:
+            if not self._running:
+                return False
+            self._submitted += 1
+            if len(self._queue) >= self.maxsize:
+                if self.overflow == "drop_newest":
+                    self._dropped_newest += 1
+                    return False
+                if self.overflow == "drop_oldest":
+                    self._queue.popleft()
+                    self._dropped_oldest += 1
+                else:
+                    while self._running and len(self._queue) >= self.maxsize:
+                        self._not_full.wait()
+                    if not self._running:
+                        return False
+            self._queue.append((fn, args))
+            depth = len(self._queue)
+            if depth > self._max_depth:
+                self._max_depth = depth
+            self._cond.notify()
+            return True
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while self._running and not self._queue:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                fn, args = self._queue.popleft()
+                if self.overflow == "block":
+                    self._not_full.notify()
+            try:
+                fn(*args)
+                ok = True
+            except Exception:
+                ok = False
+            with self._lock:
+                self._executed += 1
+                if not ok:
+                    self._errors += 1
+
+    # --- 统计 ---
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'depth': len(self._queue),
+                'max_depth': self._max_depth,
+                'submitted': self._submitted,
+                'executed': self._executed,
+                'dropped_oldest': self._dropped_oldest,
+                'dropped_newest': self._dropped_newest,
+                'dropped': self._dropped_oldest + self._dropped_newest,
+                'errors': self._errors,
+            }
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# @Time: 2025/12/18 21:10
+# @Author: JackyYin
+# @Email: jackhuan@icloud.com
+# @File: dup_filter.py
+
+"""
+重复 payload 快速路径。
+
+冗余链路、重传、回显型模拟器（如 main_thread.mock_adcu_responder）会送来与上一帧逐字节相同的数据，
+原来仍要走 strip header → 解码 → 回调的完整流程。DuplicateFilter 在任何解析之前
+用一次 bytes 比较（C 层 memcmp）判断是否与同一 key（msg_id）的上一帧完全相同：
+- mode="off"：不检测（默认，保持原行为）
+- mode="drop"：重复帧计数后直接丢弃
+- mode="notify"：重复帧不解码，只回调 on_repeat(msg_id, repeat_count)，repeat_count 为连续重复次数
+"""
+from typing import Callable, Dict, List
+
+DUPLICATE_MODES = ("off", "drop", "notify")
+
+RepeatCallback = Callable[[int, int], None]
+
+
+class DuplicateFilter:
+    def __init__(self, mode: str = "drop"):
+        if mode not in DUPLICATE_MODES:
+            raise ValueError(f"mode must be one of {DUPLICATE_MODES}")
+        self.mode = mode
+        self._last: Dict[int, bytes] = {}
+        self._runs: Dict[int, int] = {}
+        self._repeat_cbs: List[RepeatCallback] = []
+
+        # 统计（仅由接收线程更新）
+        self.frames = 0
+        self.duplicates = 0
+        self._per_key: Dict[int, int] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def register_on_repeat(self, callback: RepeatCallback):
+        if not callable(callback):
+            raise ValueError("callback must be callable")
+        self._repeat_cbs = self._repeat_cbs + [callback]
+
+    def unregister_on_repeat(self, callback: RepeatCallback):
+        self._repeat_cbs = [cb for cb in self._repeat_cbs if cb is not callback]
+
+    def repeat_callbacks(self) -> List[RepeatCallback]:
+        """已注册的 on_repeat 回调（副本，例如切换 mode 时转移到新的过滤器）"""
+        return list(self._repeat_cbs)
+
+    def check(self, key: int, data) -> bool:
+        """
+        data 与 key 的上一帧完全相同时返回 True（调用方应跳过后续解析），
+        否则记录 data 为新的上一帧并返回 False。data 可以是 bytes / memoryview。
+        mode="off" 时始终返回 False（不检测、不记录）。
+        """
+        if self.mode == "off":
+            return False
+        self.frames += 1
+        if self._last.get(key) == data:
+            self.duplicates += 1
+            self._per_key[key] = self._per_key.get(key, 0) + 1
+            run = self._runs.get(key, 0) + 1
+            self._runs[key] = run
+            if self.mode == "notify":
+                for cb in self._repeat_cbs:
+                    try:
+                        cb(key, run)
+                    except Exception:
+                        pass
+            return True
+        # 保存副本：接收缓冲区可能被复用
+        self._last[key] = bytes(data)
+        self._runs[key] = 0
+        return False
+
+    def reset(self):
+        self._last = {}
+        self._runs = {}
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            'mode': self.mode,
+            'frames': self.frames,
+            'duplicates': self.duplicates,
+            'per_msg_id': dict(self._per_key),
+        }
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+# @Time: 2026/01/03 12:10
+# @Author: JackyYin
+# @Email: jackhuan@icloud.com
+# @File: dup_filter_test.py
+
+"""
+dup_filter 的测试：drop / notify 判定与连续重复计数、off 模式不检测、回调在切换模式时保留。
+
+运行：python -m pytest dup_filter_test.py  或  python dup_filter_test.py
+"""
+from __init__ import UDFrame_Z_204
+from dup_filter import DuplicateFilter
+from eth_comm2 import EthECUCommunicator
+
+
+def test_drop_and_notify():
+    f = DuplicateFilter('notify')
+    runs = []
+    f.register_on_repeat(lambda key, run: runs.append((key, run)))
+    assert not f.check(1, b'ab')
+    assert f.check(1, memoryview(b'ab'))
+    assert f.check(1, b'ab')
+    assert not f.check(2, b'ab')     # 按 key 分开记录
+    assert not f.check(1, b'ac')
+    assert f.check(1, b'ac')
+    assert runs == [(1, 1), (1, 2), (1, 1)]
+    assert f.stats()['duplicates'] == 3 and f.stats()['per_msg_id'] == {1: 3}
+
+
+def test_off_mode_never_reports_duplicates():
+    f = DuplicateFilter('off')
+    f.register_on_repeat(lambda key, run: (_ for _ in ()).throw(AssertionError))
+    assert not f.check(1, b'ab')
+    assert not f.check(1, b'ab')
+    assert f.stats()['frames'] == 0
+
+
+def test_mode_switch_keeps_repeat_callbacks():
+    comm = EthECUCommunicator(UDFrame_Z_204, None)
+    comm.set_duplicate_mode('notify')
+    cb = lambda key, run: None
+    comm.register_on_repeat(cb)
+    dup = comm.set_duplicate_mode('drop')
+    assert dup.repeat_callbacks() == [cb]
+    assert dup.repeat_callbacks() is not dup.repeat_callbacks()
+
+
+if __name__ == '__main__':
+    test_drop_and_notify()
+    test_off_mode_never_reports_duplicates()
+    test_mode_switch_keeps_repeat_callbacks()
+    print('ok')
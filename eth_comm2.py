@@ -12,12 +12,22 @@ EthECUCommunicator 支持 AUTOSAR E2E Profile 11（符合 OEM 实测帧）。
 - DataID 字段写入高字节低4位（OEM 定制）
 - CRC 计算使用 e2e.profile11_crc8(data_id, counter, user_data)
 - 可选 Framer 支持（add_header / strip_header）
+- 接收使用编译后的帧解码器（frame_codec）；subscribe() 按信号订阅，只解码被订阅信号的并集
+- set_duplicate_mode("drop"/"notify") 在解析 header 之前比较整段数据报，与上一帧相同则直接丢弃/只通知
+- subscribe_on_change() 与上一帧按字节 XOR 比较（change_detect），只解码并回调发生变化的信号
+- 发送时 header 写入预分配缓冲区，transport 支持 send_parts 时 header 与 payload 分段 sendmsg，不做拼接
+- 信号值保存在 DoubleBufferedSignalStore 中：set_signal 不阻塞发送，
+  send() 总是基于同一份一致的快照打包（多信号更新用 begin_update()/commit()）
 """
 
-from typing import Callable, Dict, Any, List, Optional
-from bitops import set_bits, get_bits
+from typing import Callable, Dict, Any, Iterable, List, Optional
+from bitops import set_bits
 import e2e
 from framer import Framer  # 可选，若未使用可传 None
+from signal_store import DoubleBufferedSignalStore
+from frame_codec import compile_frame, CompiledFrame
+from change_detect import ChangeDetector
+from dup_filter import DuplicateFilter
 
 
 class EthECUCommunicator:
@@ -31,14 +41,42 @@ class EthECUCommunicator:
         self.transport = transport
         self.framer = framer
         self.payload = bytearray(self.frame.msg_length)
-        self._signal_values: Dict[str, int] = {}
+        self._store = DoubleBufferedSignalStore()
+        # 预分配的应用层 header 缓冲区（每次发送原地改写）
+        self._header_buf = framer.make_header_buffer() if framer is not None else None
+        self._msg_id = getattr(self.frame, 'msg_id', 0)
         self._group_counters: Dict[str, int] = {}
         self._on_receive_callbacks: List[Callable[[Dict[str, Any], bytes], None]] = []
+        # 原始 payload 回调：不解码，由回调自行决定何时 / 如何解码
+        self._on_payload_callbacks: List[Callable[[bytes], None]] = []
+        # 按信号订阅：(((signal_names, callback), ...), 并集解码函数)
+        self._subscriptions = ((), None)
+        # 变化订阅：(((signal_names 或 None, callback), ...), ChangeDetector)
+        self._change_subs = ((), None)
+        self._compiled: Optional[CompiledFrame] = None
+        self._dup_filter: Optional[DuplicateFilter] = None
 
         # 初始化所有信号组 Counter 为 0（第一帧将发送 0）
         for g in getattr(self.frame, 'sig_group_dict', {}):
             self._group_counters[g] = 0
 
+    @property
+    def _signal_values(self) -> Dict[str, int]:
+        """当前已发布的信号值快照（只读）"""
+        return self._store.snapshot()
+
+    def begin_update(self):
+        """开始多信号写事务，期间的 set_signal 在 commit() 之前对发送不可见"""
+        self._store.begin_update()
+
+    def commit(self):
+        """发布 begin_update() 以来的全部信号修改"""
+        self._store.commit()
+
+    def abort(self):
+        """放弃 begin_update() 以来的全部信号修改"""
+        self._store.abort()
+
     def set_signal(self, sig_name: str, physical_value: float):
         """设置信号物理值（自动转 raw value）"""
         sig_def = None
@@ -69,13 +107,15 @@ class EthECUCommunicator:
         if not (0 <= raw_value <= max_val):
             raise ValueError(f"Raw value {raw_value} out of range [0, {max_val}]")
 
-        self._signal_values[sig_name] = raw_value
+        self._store.set(sig_name, raw_value)
 
     def set_raw_signal(self, sig_name: str, raw_value: int):
         """直接设置原始值（绕过物理转换）"""
-        self._signal_values[sig_name] = int(raw_value)
+        self._store.set(sig_name, int(raw_value))
 
-    def _pack_signals(self):
+    def _pack_signals(self, values: Optional[Dict[str, int]] = None):
+        if values is None:
+            values = self._store.snapshot()
         self.payload = bytearray(self.frame.msg_length)
         for attr in dir(self.frame):
             if attr.startswith('__'):
@@ -89,7 +129,7 @@ class EthECUCommunicator:
             byteorder = getattr(sig_cls, 'sig_byteorder', "Intel")
             if startbit is None or length is None:
                 continue
-            val = self._signal_values.get(name, getattr(sig_cls, 'sig_value_init', 0))
+            val = values.get(name, getattr(sig_cls, 'sig_value_init', 0))
             maxv = (1 << length) - 1
             if val < 0:
                 val = 0
@@ -178,7 +218,9 @@ class EthECUCommunicator:
                     byteorder = getattr(chkdef, 'sig_byteorder', "Intel")
                     set_bits(self.payload, startbit, length, crc_value, byteorder=byteorder)
 
-    def _apply_e2e_for_groups(self):
+    def _apply_e2e_for_groups(self, values: Optional[Dict[str, int]] = None):
+        if values is None:
+            values = self._store.snapshot()
         groups = getattr(self.frame, 'sig_group_dict', {})
         dataids = getattr(self.frame, 'sig_group_dataid_dict', {})
         profiles = getattr(self.frame, 'e2e_profile_dict', {})
@@ -235,7 +277,7 @@ class EthECUCommunicator:
                     length = getattr(sig_def, 'length', getattr(sig_def, 'sig_length', 0))
                     if length <= 0:
                         continue
-                    raw_val = self._signal_values.get(sig_name, 0)
+                    raw_val = values.get(sig_name, 0)
                     num_bytes = (length + 7) // 8
                     protected_data.extend(raw_val.to_bytes(num_bytes, 'little'))
 
@@ -263,9 +305,24 @@ class EthECUCommunicator:
                     byteorder = getattr(chkdef, 'sig_byteorder', "Intel")
                     set_bits(self.payload, startbit, length, crc_value, byteorder=byteorder)
 
+    def _build(self):
+        # 同一份快照用于打包与 E2E，保证 CRC 与 payload 中的信号一致
+        values = self._store.snapshot()
+        self._pack_signals(values)
+        self._apply_e2e_for_groups(values)
+
+    def build_payload(self) -> bytes:
+        """打包信号并应用 E2E，返回 payload（不含 header，不发送；计数器会递增）"""
+        self._build()
+        return bytes(self.payload)
+
     def send(self):
-        self._pack_signals()
-        self._apply_e2e_for_groups()
+        self._build()
+        send_parts = getattr(self.transport, 'send_parts', None)
+        if self._header_buf is not None and send_parts is not None:
+            self.framer.header_into(self._header_buf, self._msg_id, len(self.payload))
+            send_parts((self._header_buf, self.payload))
+            return
         payload_bytes = bytes(self.payload)
         if self.framer is not None:
             framed = self.framer.add_header(payload_bytes, msg_id=getattr(self.frame, 'msg_id', 0))
@@ -274,10 +331,139 @@ class EthECUCommunicator:
             self.transport.send(payload_bytes)
 
     def register_on_receive(self, callback: Callable[[Dict[str, Any], bytes], None]):
-        self._on_receive_callbacks.append(callback)
+        """注册全量回调：每帧解码全部信号后回调 callback(parsed, raw_payload)"""
+        self._on_receive_callbacks = self._on_receive_callbacks + [callback]
+
+    def unregister_on_receive(self, callback: Callable[[Dict[str, Any], bytes], None]):
+        self._on_receive_callbacks = [cb for cb in self._on_receive_callbacks if cb is not callback]
+
+    def register_on_payload(self, callback: Callable[[bytes], None]):
+        """注册原始回调：每帧去 header、截断到 msg_length 后回调 callback(raw_payload)，接收端不解码"""
+        self._on_payload_callbacks = self._on_payload_callbacks + [callback]
+
+    def unregister_on_payload(self, callback: Callable[[bytes], None]):
+        self._on_payload_callbacks = [cb for cb in self._on_payload_callbacks if cb is not callback]
+
+    def subscribe(self, signal_names: Iterable[str], callback: Callable[[Dict[str, Any], bytes], None]):
+        """
+        按信号订阅：callback(values, raw_payload)，values 只包含 signal_names 中的信号（物理值）。
+        每帧只解码所有订阅者关心信号的并集；没有任何回调/订阅时整帧跳过解码。
+        """
+        if not callable(callback):
+            raise ValueError("callback must be callable")
+        names = tuple(dict.fromkeys(signal_names))
+        if not names:
+            raise ValueError("signal_names must not be empty")
+        compiled = self._get_compiled()
+        unknown = [n for n in names if n not in compiled.ops]
+        if unknown:
+            raise KeyError(f"Signal(s) {unknown} not found in frame definition")
+        subs = self._subscriptions[0] + ((names, callback),)
+        self._set_subscriptions(subs)
+
+    def unsubscribe(self, callback: Callable[[Dict[str, Any], bytes], None]):
+        subs = tuple(s for s in self._subscriptions[0] if s[1] is not callback)
+        self._set_subscriptions(subs)
+
+    def _set_subscriptions(self, subs):
+        # (订阅列表, 并集解码函数) 作为一个元组整体替换，接收线程读取时总是一致的
+        if not subs:
+            self._subscriptions = ((), None)
+            return
+        union = set()
+        for names, _ in subs:
+            union.update(names)
+        self._subscriptions = (subs, self._get_compiled().make_decoder(union))
+
+    def subscribe_on_change(self, callback: Callable[[Dict[str, Any], bytes], None],
+                            signal_names: Optional[Iterable[str]] = None):
+        """
+        变化订阅：callback(changed, raw_payload)，changed 只包含相对上一帧发生变化的信号（物理值），
+        signal_names 可限定关心的信号。第一帧视为全部变化；没有变化的帧不回调。
+        """
+        if not callable(callback):
+            raise ValueError("callback must be callable")
+        names = None
+        if signal_names is not None:
+            names = tuple(dict.fromkeys(signal_names))
+            if not names:
+                raise ValueError("signal_names must not be empty")
+            unknown = [n for n in names if n not in self._get_compiled().ops]
+            if unknown:
+                raise KeyError(f"Signal(s) {unknown} not found in frame definition")
+        self._set_change_subs(self._change_subs[0] + ((names, callback),))
+
+    def unsubscribe_on_change(self, callback: Callable[[Dict[str, Any], bytes], None]):
+        self._set_change_subs(tuple(s for s in self._change_subs[0] if s[1] is not callback))
+
+    def _set_change_subs(self, subs):
+        if not subs:
+            self._change_subs = ((), None)
+            return
+        union = set()
+        for names, _ in subs:
+            if names is None:
+                union = None
+                break
+            union.update(names)
+        detector = ChangeDetector(self._get_compiled(), union)
+        # 新订阅者从下一帧起只看到变化，已有订阅者不会因重建检测器而收到一次全量
+        old = self._change_subs[1]
+        if old is not None and old.last_payload is not None:
+            detector.prime(old.last_payload)
+        self._change_subs = (subs, detector)
+
+    def set_duplicate_mode(self, mode: str = "drop") -> Optional[DuplicateFilter]:
+        """
+        重复帧快速路径："off" 关闭；"drop" 与上一帧完全相同的数据报直接丢弃；
+        "notify" 丢弃并回调 register_on_repeat 注册的 cb(msg_id, repeat_count)。
+        """
+        if mode == "off":
+            self._dup_filter = None
+            return None
+        dup = DuplicateFilter(mode)
+        old = self._dup_filter
+        if old is not None:
+            for cb in old.repeat_callbacks():
+                dup.register_on_repeat(cb)
+        self._dup_filter = dup
+        return dup
+
+    def register_on_repeat(self, callback: Callable[[int, int], None]):
+        """重复帧通知 callback(msg_id, repeat_count)（需 set_duplicate_mode("notify")）"""
+        if self._dup_filter is None:
+            raise RuntimeError("duplicate filter is off; call set_duplicate_mode('notify') first")
+        self._dup_filter.register_on_repeat(callback)
+
+    def unregister_on_repeat(self, callback: Callable[[int, int], None]):
+        if self._dup_filter is not None:
+            self._dup_filter.unregister_on_repeat(callback)
+
+    def duplicate_stats(self) -> Dict[str, Any]:
+        return {} if self._dup_filter is None else self._dup_filter.stats()
+
+    def _get_compiled(self) -> CompiledFrame:
+        if self._compiled is None:
+            self._compiled = compile_frame(self.frame)
+        return self._compiled
 
     def start_receiving(self):
+        compiled = self._get_compiled()
+        decode = compiled.decode
+        msg_length = compiled.msg_length
+
         def _cb(raw: bytes):
+            full_cbs = self._on_receive_callbacks
+            payload_cbs = self._on_payload_callbacks
+            subs, sub_decode = self._subscriptions
+            change_subs, detector = self._change_subs
+            if not full_cbs and not payload_cbs and not subs and not change_subs:
+                return  # 没有任何消费者：跳过 header 解析与解码
+
+            dup = self._dup_filter
+            if dup is not None and dup.check(self._msg_id, raw):
+                return  # 与上一帧逐字节相同（header 相同即 payload 相同）→ 不解析
+
             try:
                 if self.framer is not None:
                     _, payload = self.framer.strip_header(raw)
@@ -286,30 +472,47 @@ class EthECUCommunicator:
             except Exception:
                 return  # Header error → drop
 
-            payload = bytearray(payload[:self.frame.msg_length])
-            parsed = {}
-            for attr in dir(self.frame):
-                if attr.startswith('__'):
-                    continue
-                sig_cls = getattr(self.frame, attr)
-                if not hasattr(sig_cls, 'sig_name'):
-                    continue
-                name = getattr(sig_cls, 'sig_name')
-                startbit = getattr(sig_cls, 'sig_start_bit', getattr(sig_cls, 'startbit', None))
-                length = getattr(sig_cls, 'sig_length', getattr(sig_cls, 'length', None))
-                byteorder = getattr(sig_cls, 'sig_byteorder', "Intel")
-                if startbit is None or length is None:
-                    continue
-                raw_val = get_bits(payload, startbit, length, byteorder=byteorder)
-                factor = getattr(sig_cls, 'sig_value_factor', 1.0)
-                offset = getattr(sig_cls, 'sig_value_offset', 0.0)
-                physical_val = raw_val * factor + offset
-                parsed[name] = physical_val
+            if len(payload) < msg_length:
+                return  # 短帧 → drop
+            payload = bytes(payload[:msg_length])
 
-            for cb in self._on_receive_callbacks:
+            for cb in payload_cbs:
                 try:
-                    cb(parsed, bytes(payload))
+                    cb(payload)
                 except Exception:
                     pass
 
-        self.transport.start_receiving(_cb)
\ No newline at end of file
+            parsed = None
+            if full_cbs:
+                parsed = decode(payload)
+                for cb in full_cbs:
+                    try:
+                        cb(parsed, payload)
+                    except Exception:
+                        pass
+
+            if subs:
+                values = parsed if parsed is not None else sub_decode(payload)
+                for names, cb in subs:
+                    try:
+                        cb({n: values[n] for n in names}, payload)
+                    except Exception:
+                        pass
+
+            if change_subs:
+                changed = detector.update(payload)
+                if changed is None:
+                    return
+                for names, cb in change_subs:
+                    if names is None:
+                        values = changed
+                    else:
+                        values = {n: changed[n] for n in names if n in changed}
+                        if not values:
+                            continue
+                    try:
+                        cb(values, payload)
+                    except Exception:
+                        pass
+
+        self.transport.start_receiving(_cb)
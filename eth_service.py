@@ -11,14 +11,28 @@
 
 对外接口：
 - register_receive_callback(cb)
+- subscribe(signal_names, cb)（只解码并回调订阅的信号）
+- subscribe_on_change(cb, signal_names)（只回调相对上一帧变化的信号）
+- subscribe_conflated(cb, interval)（每个 interval 至多回调一次最新值）
 - set_signal(name, value)
+- begin_update() / commit() / abort()（多信号原子更新）
 - send()
 - send_raw_frame(frame_bytes)
 - start() / stop()
+- start_cyclic() / stop_cyclic()（按 msg_cycle 周期发送的 TX 线程）
+- add_tx_frame(frame_cls, period)（周期发送线程负责的其它帧，可聚合到同一数据报）
+- get_rt_policy()（RX/TX 线程实际生效的 CPU 绑定与调度策略）
+- dispatch_stats()（回调分发队列深度 / 丢弃计数）
+- start_recording(path, fmt) / stop_recording()（全部收发帧写入 pcap / pcapng）
+- enable_flight_recorder(...) / disable_flight_recorder()（内存环形缓冲区，E2E 失败 / 超时 / 手动触发时转储 pcap）
+- rx_process_stats()（rx_process=True 时子进程接收环形缓冲区的批量 / 丢弃统计）
+- register_repeat_callback(cb) / duplicate_stats()（重复帧快速路径）
+- enable_shm_table(name) / disable_shm_table()（解码一次，发布到共享内存最新值表供其它进程读取）
+- enable_timeseries(...) / disable_timeseries()（接收到的信号写入列式时间序列，支持区间查询与降采样）
 - build_framed_payload()
 - send_and_return_bytes()
 """
-from typing import Callable, Optional, Tuple, Dict, Any
+from typing import Callable, Optional, Tuple, Dict, Any, Iterable
 import threading
 import time
 
@@ -29,11 +43,34 @@ except ImportError:
 
 from framer import Framer
 from eth_comm2 import EthECUCommunicator
+from frame_codec import compile_frame
+from rt_sched import make_thread_init
+from dispatch import CallbackDispatcher
+from conflate import LatestValueConflator
+from tx_aggregator import PDUAggregator
+from shm_table import SharedSignalTable
+from rx_process import ProcessRxTransport
+from pcap_recorder import PcapRecorder
+from timeseries import TimeSeriesStore
+from flight_recorder import FlightRecorder
 
 # transport 实现
 from transport_udp import UDPTransport
 from transport_afpacket import AFPacketTransport
 
+# 周期发送：截止时间相差不超过该值（秒）的帧视为同一时隙
+_SLOT_TOLERANCE = 0.0005
+
+
+class _TxEntry:
+    __slots__ = ('comm', 'period', 'msg_id', 'next_due')
+
+    def __init__(self, comm: EthECUCommunicator, period: float):
+        self.comm = comm
+        self.period = period
+        self.msg_id = getattr(comm.frame, 'msg_id', 0)
+        self.next_due: Optional[float] = None
+
 
 class EthService:
     """
@@ -59,7 +96,37 @@ class EthService:
                  ethertype: int = 0x88B5,
                  framer_mode: str = 'custom_4_4',
                  id_endian: str = 'big',
-                 len_endian: str = 'big'):
+                 len_endian: str = 'big',
+                 # 实时调度（Linux，权限不足时自动回退为普通调度）
+                 rx_cpus: Optional[Iterable[int]] = None,
+                 tx_cpus: Optional[Iterable[int]] = None,
+                 rx_priority: Optional[int] = None,
+                 tx_priority: Optional[int] = None,
+                 # 回调分发（0 表示在接收线程内直接执行回调，保持原行为）
+                 dispatch_workers: int = 0,
+                 dispatch_queue_size: int = 1024,
+                 dispatch_overflow: str = 'drop_oldest',
+                 # 发送聚合（仅对周期发送线程生效）
+                 tx_aggregate: bool = False,
+                 tx_mtu: int = 1472,
+                 # 重复帧快速路径（off / drop / notify）
+                 duplicate_mode: str = 'off',
+                 # 独立进程接收（socket 接收循环在子进程，经共享内存环形缓冲区交给本进程）
+                 rx_process: bool = False,
+                 rx_ring_slots: int = 4096,
+                 rx_process_cpus: Optional[Iterable[int]] = None):
+        """
+        rx_cpus / tx_cpus: 接收线程 / 周期发送线程绑定的 CPU 编号
+        rx_priority / tx_priority: 对应线程请求的 SCHED_FIFO 优先级（1~99）
+        dispatch_workers: >0 时用户回调交给有界队列 + 工作线程池执行，接收线程只负责入队
+        dispatch_queue_size / dispatch_overflow: 队列容量与溢出策略（drop_oldest / drop_newest / block）
+        tx_aggregate: 周期发送时把同一时隙到期的帧聚合进一个数据报（需要 custom_4_4 framer）
+        tx_mtu: 聚合数据报的最大字节数
+        duplicate_mode: 与上一帧逐字节相同的接收帧在解析前丢弃（drop）或只通知重复次数（notify）
+        rx_process: True 时接收 socket 交给子进程读取，避免接收与应用线程争 GIL；
+            rx_cpus / rx_priority 作用于本进程的消费线程，rx_process_cpus 为子进程绑定的 CPU
+        rx_ring_slots: 子进程 → 本进程环形缓冲区的槽位数
+        """
         if frame_cls is None:
             if UDFrame_Z_204 is None:
                 raise ValueError("frame_cls 未提供，且默认 UDFrame_Z_204 无法导入，请传入 frame_cls 参数")
@@ -136,20 +203,67 @@ class EthService:
         else:
             raise ValueError("未知的 transport_type: 支持 'afpacket' 或 'udp'")
 
+        if duplicate_mode != 'off':
+            self.comm_recv.set_duplicate_mode(duplicate_mode)
+
+        if rx_process:
+            rx_transport = ProcessRxTransport(self.transport_recv, slots=rx_ring_slots, cpus=rx_process_cpus)
+            if self.transport_send is self.transport_recv:
+                # AF_PACKET：发送与接收共用 socket，发送经包装对象委托回原 transport
+                self.transport_send = rx_transport
+            self.transport_recv = rx_transport
+            self.comm_recv.transport = rx_transport
+
         # 注册列表
         self._receive_cbs = []
-        # 内部转发接收回调（由接收端 communicator 调用）
-        self.comm_recv.register_on_receive(self._internal_on_receive)
+        self._callback_errors = 0
+        self._compiled = compile_frame(self.frame_cls)
+        # 合并订阅者只拿原始 payload，在投递线程中按周期解码
+        self._conflator = LatestValueConflator(self._compiled.decode, name="EthService-conflate")
+        self._dispatcher: Optional[CallbackDispatcher] = None
+        if dispatch_workers and dispatch_workers > 0:
+            self._dispatcher = CallbackDispatcher(workers=dispatch_workers,
+                                                  maxsize=dispatch_queue_size,
+                                                  overflow=dispatch_overflow,
+                                                  name="EthService-dispatch")
+        # 内部接收钩子（接收端 communicator 的原始 payload 回调）：只有存在全量回调 / 合并订阅 /
+        # 共享表 / 时间序列时才挂上；合并订阅不在接收线程解码，其余消费者共享同一次解码
+        self._rx_hook_attached = False
+        self._subscribed_wrappers: Dict[Any, Callable[[Dict[str, Any], bytes], None]] = {}
+        self._change_wrappers: Dict[Any, Callable[[Dict[str, Any], bytes], None]] = {}
+        self._shm_table: Optional[SharedSignalTable] = None
+        self._timeseries: Optional[TimeSeriesStore] = None
+        self._recorder: Optional[PcapRecorder] = None
+        self._flight_recorder: Optional[FlightRecorder] = None
 
         # 线程/锁管理
         self._send_lock = threading.Lock()
         self._running = False
 
+        # 实时调度：接收线程由 transport 在线程启动时调用 thread_init 应用策略
+        self._rt_policy: Dict[str, Any] = {'rx': None, 'tx': None}
+        self._tx_thread_init = make_thread_init(tx_cpus, tx_priority, self._on_tx_policy_applied)
+        rx_init = make_thread_init(rx_cpus, rx_priority, self._on_rx_policy_applied)
+        if rx_init is not None and self.transport_recv is not None:
+            self.transport_recv.thread_init = rx_init
+        self._cyclic_thread: Optional[threading.Thread] = None
+        self._cyclic_stop = threading.Event()
+        self._main_tx_entry: Optional[_TxEntry] = None
+        self._tx_entries = []
+
+        # 发送聚合：同一时隙到期的多帧合并为一个数据报
+        self._aggregator: Optional[PDUAggregator] = None
+        if tx_aggregate:
+            self._aggregator = PDUAggregator(self.transport_send, self.framer, mtu=tx_mtu)
+
     # --- 生命周期 ---
     def start(self):
         if self._running:
             return
         self._running = True
+        if self._dispatcher is not None:
+            self._dispatcher.start()
+        self._conflator.start()
         # 启动接收端的接收循环（AF_PACKET 时 comm_recv == comm_send）
         try:
             self.comm_recv.start_receiving()
@@ -158,6 +272,7 @@ class EthService:
             pass
 
     def stop(self):
+        self.stop_cyclic()
         if not self._running:
             return
         # 停止 transport(s)
@@ -172,32 +287,380 @@ class EthService:
                 self.transport_recv.stop()
         except Exception:
             pass
+        if self._dispatcher is not None:
+            self._dispatcher.stop()
+        self._conflator.stop()
+        self.disable_shm_table()
+        self.stop_recording()
+        self.disable_flight_recorder()
         self._running = False
 
+    # --- 周期发送 ---
+    def add_tx_frame(self, frame_cls, period: Optional[float] = None) -> EthECUCommunicator:
+        """
+        增加一个由周期发送线程负责的帧（共用发送 transport 与 framer），返回其 communicator，
+        通过返回值的 set_signal / begin_update / commit 设置该帧的信号。
+        period 默认使用 frame_cls.msg_cycle。
+        """
+        if period is None:
+            period = getattr(frame_cls, 'msg_cycle', None)
+        if not period or period <= 0:
+            raise ValueError("period 必须为正数（或在 frame_cls 中定义 msg_cycle）")
+        comm = EthECUCommunicator(frame_cls, self.transport_send, framer=self.framer)
+        # 写时复制：发送线程每个时隙读取一次列表
+        self._tx_entries = self._tx_entries + [_TxEntry(comm, float(period))]
+        return comm
+
+    def start_cyclic(self, period: Optional[float] = None):
+        """
+        启动周期发送线程：主帧（frame_cls）每 period 秒发送一次（默认使用 frame_cls.msg_cycle），
+        add_tx_frame 增加的帧按各自周期发送。
+        使用绝对截止时间推进，单次发送耗时不会累积成周期漂移；
+        开启 tx_aggregate 时同一时隙到期的帧打包进一个数据报发送。
+        """
+        if self._cyclic_thread is not None:
+            return
+        if period is None:
+            period = getattr(self.frame_cls, 'msg_cycle', None)
+        if not period or period <= 0:
+            raise ValueError("period 必须为正数（或在 frame_cls 中定义 msg_cycle）")
+        self._main_tx_entry = _TxEntry(self.comm_send, float(period))
+        # 重新启动时从当前时刻起算，不补发停止期间错过的周期
+        for e in self._tx_entries:
+            e.next_due = None
+        self._cyclic_stop.clear()
+        self._cyclic_thread = threading.Thread(target=self._cyclic_loop,
+                                               name="EthService-tx", daemon=True)
+        self._cyclic_thread.start()
+
+    def stop_cyclic(self):
+        t = self._cyclic_thread
+        if t is None:
+            return
+        self._cyclic_stop.set()
+        if t is not threading.current_thread():
+            t.join(timeout=1.0)
+        self._cyclic_thread = None
+
+    def _cyclic_loop(self):
+        if self._tx_thread_init is not None:
+            try:
+                self._tx_thread_init()
+            except Exception:
+                pass
+        while not self._cyclic_stop.is_set():
+            entries = [self._main_tx_entry] + self._tx_entries
+            now = time.monotonic()
+            due = []
+            next_due = None
+            for e in entries:
+                if e.next_due is None:
+                    e.next_due = now
+                if e.next_due <= now + _SLOT_TOLERANCE:
+                    due.append(e)
+                    e.next_due += e.period
+                    if e.next_due < now - e.period:
+                        # 落后超过一个周期：跳过错过的周期，避免补发突发
+                        e.next_due += int((now - e.next_due) // e.period) * e.period
+                if next_due is None or e.next_due < next_due:
+                    next_due = e.next_due
+            if due:
+                self._send_slot(due)
+            delay = next_due - time.monotonic()
+            if delay > 0 and self._cyclic_stop.wait(delay):
+                break
+
+    def _send_slot(self, due):
+        """发送一个时隙内到期的全部帧"""
+        with self._send_lock:
+            if self._aggregator is None:
+                for e in due:
+                    try:
+                        e.comm.send()
+                    except Exception:
+                        pass
+                return
+            for e in due:
+                try:
+                    self._aggregator.add(e.msg_id, e.comm.build_payload())
+                except Exception:
+                    pass
+            try:
+                self._aggregator.flush()
+            except Exception:
+                pass
+
+    def tx_stats(self) -> Dict[str, int]:
+        """发送聚合统计（datagrams / pdus / bytes）；未开启聚合时返回空 dict"""
+        if self._aggregator is None:
+            return {}
+        return self._aggregator.stats()
+
+    # --- 实时调度报告 ---
+    def _on_rx_policy_applied(self, report: Dict[str, Any]):
+        self._rt_policy['rx'] = report
+
+    def _on_tx_policy_applied(self, report: Dict[str, Any]):
+        self._rt_policy['tx'] = report
+
+    def get_rt_policy(self) -> Dict[str, Any]:
+        """
+        返回 RX/TX 线程实际生效的策略（见 rt_sched.apply_thread_policy 的报告格式）。
+        未配置或线程尚未启动时对应项为 None。
+        """
+        return dict(self._rt_policy)
+
     # --- 接收回调注册 ---
     def register_receive_callback(self, cb: Callable[[Dict[str, Any], bytes], None]):
         if not callable(cb):
             raise ValueError("cb must be callable")
-        self._receive_cbs.append(cb)
+        # 写时复制：接收线程直接遍历当前列表
+        self._receive_cbs = self._receive_cbs + [cb]
+        self._update_rx_hook()
 
     def unregister_receive_callback(self, cb: Callable[[Dict[str, Any], bytes], None]):
-        try:
-            self._receive_cbs.remove(cb)
-        except ValueError:
-            pass
+        self._receive_cbs = [c for c in self._receive_cbs if c is not cb]
+        self._update_rx_hook()
+
+    def subscribe(self, signal_names, cb: Callable[[Dict[str, Any], bytes], None]):
+        """
+        按信号订阅：cb(values, raw_payload)，values 只包含 signal_names 中的信号。
+        接收端每帧只解码所有订阅信号的并集（启用 dispatch_workers 时回调在分发线程执行）。
+        """
+        wrapper = self._wrap_for_dispatch(cb)
+        self.comm_recv.subscribe(signal_names, wrapper)
+        self._subscribed_wrappers[cb] = wrapper
+
+    def unsubscribe(self, cb: Callable[[Dict[str, Any], bytes], None]):
+        wrapper = self._subscribed_wrappers.pop(cb, None)
+        if wrapper is not None:
+            self.comm_recv.unsubscribe(wrapper)
+
+    def subscribe_on_change(self, cb: Callable[[Dict[str, Any], bytes], None],
+                            signal_names: Optional[Iterable[str]] = None):
+        """
+        变化订阅：cb(changed, raw_payload)，changed 只包含相对上一帧发生变化的信号；
+        接收端按字节 XOR 比较，只解码变化字节涉及的信号。
+        """
+        wrapper = self._wrap_for_dispatch(cb)
+        self.comm_recv.subscribe_on_change(wrapper, signal_names)
+        self._change_wrappers[cb] = wrapper
+
+    def unsubscribe_on_change(self, cb: Callable[[Dict[str, Any], bytes], None]):
+        wrapper = self._change_wrappers.pop(cb, None)
+        if wrapper is not None:
+            self.comm_recv.unsubscribe_on_change(wrapper)
+
+    def _wrap_for_dispatch(self, cb):
+        if not callable(cb):
+            raise ValueError("cb must be callable")
+        if self._dispatcher is None:
+            return cb
+        dispatcher = self._dispatcher
+
+        def wrapper(values, raw_payload, _cb=cb):
+            dispatcher.submit(_cb, values, raw_payload)
+        return wrapper
+
+    def subscribe_conflated(self, cb: Callable[[Dict[str, Any], bytes, int], None], interval: float):
+        """
+        合并订阅：每 interval 秒至多回调一次 cb(parsed, raw_payload, collapsed)，
+        携带最新一帧的解析结果，collapsed 为期间被合并掉的帧数。
+        """
+        self._conflator.subscribe(cb, interval)
+        self._update_rx_hook()
+
+    def unsubscribe_conflated(self, cb: Callable[[Dict[str, Any], bytes, int], None]):
+        self._conflator.unsubscribe(cb)
+        self._update_rx_hook()
+
+    def enable_shm_table(self, name: Optional[str] = None) -> str:
+        """
+        发布者模式：每帧解码一次，把各信号最新的 raw / 物理值与时间戳写入共享内存信号表，
+        其它进程用 SharedSignalTable.attach(返回的名字) 无系统调用地读取。
+        """
+        if self._shm_table is None:
+            self._shm_table = SharedSignalTable.create(self.frame_cls, name=name)
+            self._update_rx_hook()
+        return self._shm_table.name
+
+    def disable_shm_table(self):
+        table = self._shm_table
+        if table is None:
+            return
+        self._shm_table = None
+        self._update_rx_hook()
+        table.close()
+        table.unlink()
+
+    def enable_timeseries(self, signals: Optional[Iterable[str]] = None, chunk_rows: int = 4096,
+                          max_bytes: Optional[int] = 64 << 20,
+                          max_age: Optional[float] = None) -> TimeSeriesStore:
+        """
+        接收到的每帧（解码一次）追加到列式时间序列，返回 TimeSeriesStore（range / downsample 查询）。
+        已启用时直接返回现有的 store。
+        """
+        if self._timeseries is None:
+            self._timeseries = TimeSeriesStore(self.frame_cls, signals=signals, chunk_rows=chunk_rows,
+                                               max_bytes=max_bytes, max_age=max_age)
+            self._update_rx_hook()
+        return self._timeseries
+
+    def disable_timeseries(self):
+        """停止写入（已返回的 store 仍可查询）"""
+        if self._timeseries is None:
+            return
+        self._timeseries = None
+        self._update_rx_hook()
+
+    def _update_rx_hook(self):
+        need = (bool(self._receive_cbs) or self._conflator.active or self._shm_table is not None
+                or self._timeseries is not None)
+        if need and not self._rx_hook_attached:
+            self.comm_recv.register_on_payload(self._internal_on_payload)
+            self._rx_hook_attached = True
+        elif not need and self._rx_hook_attached:
+            self.comm_recv.unregister_on_payload(self._internal_on_payload)
+            self._rx_hook_attached = False
+
+    def _internal_on_payload(self, raw_payload: bytes):
+        if self._conflator.active:
+            # 合并订阅者：接收线程只替换最新值引用，不解码
+            self._conflator.publish(raw_payload)
+        table = self._shm_table
+        store = self._timeseries
+        if table is None and store is None and not self._receive_cbs:
+            return  # 没有需要解码结果的消费者
+        # 按帧的接收时间戳记录（而非解码时刻），transport 不提供时由 publish / append 取当前时间
+        ts = getattr(self.transport_recv, 'rx_ts', None) or None
+        if table is not None:
+            # 共享表同时需要原始值与物理值：原始值只取一次，物理值由其换算
+            parsed, raw = self._compiled.decode_pair(raw_payload)
+            try:
+                table.publish(parsed, raw, ts=ts)
+            except Exception:
+                pass
+        else:
+            parsed = self._compiled.decode(raw_payload)
+        if store is not None:
+            try:
+                store.append(parsed, ts)
+            except Exception:
+                pass
+        cbs = self._receive_cbs
+        if not cbs:
+            return
+        if self._dispatcher is not None:
+            # 接收线程只入队：每帧一个任务，同一帧的回调要么全部执行、要么整帧被丢弃，且按注册顺序执行
+            self._dispatcher.submit(self._deliver, cbs, parsed, raw_payload)
+        else:
+            self._deliver(cbs, parsed, raw_payload)
 
-    def _internal_on_receive(self, parsed: Dict[str, Any], raw_payload: bytes):
+    def _deliver(self, cbs, parsed: Dict[str, Any], raw_payload: bytes):
         # 分发给用户注册的回调
-        for cb in list(self._receive_cbs):
+        for cb in cbs:
             try:
                 cb(parsed, raw_payload)
             except Exception:
-                pass
+                self._callback_errors += 1
+
+    def dispatch_stats(self) -> Dict[str, int]:
+        """
+        回调分发统计（depth / max_depth / dropped / errors 等）；未启用分发时返回空 dict。
+        dropped 按帧计数；errors 为抛出异常的接收回调次数。
+        """
+        if self._dispatcher is None:
+            return {}
+        stats = self._dispatcher.stats()
+        stats['errors'] += self._callback_errors
+        return stats
+
+    def start_recording(self, path: str, fmt: str = 'pcap', max_bytes: Optional[int] = None,
+                        max_seconds: Optional[float] = None) -> PcapRecorder:
+        """
+        把发送与接收 transport 上的每一帧写入 pcap / pcapng（后台线程批量写盘，可按大小 / 时长轮转）。
+        """
+        if self._recorder is not None:
+            raise RuntimeError("recording already in progress; call stop_recording() first")
+        recorder = PcapRecorder(path, fmt=fmt, max_bytes=max_bytes, max_seconds=max_seconds)
+        for transport in (self.transport_send, self.transport_recv):
+            if transport is not None:
+                recorder.attach(transport)
+        recorder.start()
+        self._recorder = recorder
+        return recorder
+
+    def stop_recording(self):
+        recorder = self._recorder
+        if recorder is None:
+            return
+        self._recorder = None
+        recorder.stop()
+
+    def enable_flight_recorder(self, dump_dir: str = '.', slots: int = 16384, slot_size: int = 2048,
+                               fmt: str = 'pcap', pre_seconds: Optional[float] = None,
+                               post_seconds: float = 0.0, min_interval: float = 5.0,
+                               e2e: bool = True, timeout: Optional[float] = None) -> FlightRecorder:
+        """
+        在收发 transport 上挂飞行记录器（内存环形缓冲区），返回 FlightRecorder。
+        e2e=True 时本帧 E2E 校验失败触发转储；timeout 给出时本帧超过 timeout 秒未收到触发转储；
+        其它条件用返回值的 add_signal_trigger / trigger() 添加或手动触发。
+        """
+        if self._flight_recorder is not None:
+            return self._flight_recorder
+        fr = FlightRecorder(slots=slots, slot_size=slot_size, dump_dir=dump_dir, fmt=fmt,
+                            pre_seconds=pre_seconds, post_seconds=post_seconds,
+                            min_interval=min_interval, framer=self.framer)
+        if e2e and self._compiled.e2e_groups:
+            fr.add_e2e_trigger(self.frame_cls)
+        if timeout is not None:
+            fr.add_timeout_trigger(self.frame_cls, timeout)
+        for transport in (self.transport_send, self.transport_recv):
+            if transport is not None:
+                fr.attach(transport)
+        fr.start()
+        self._flight_recorder = fr
+        return fr
+
+    def disable_flight_recorder(self):
+        fr = self._flight_recorder
+        if fr is None:
+            return
+        self._flight_recorder = None
+        fr.stop()
+
+    def rx_process_stats(self) -> Dict[str, int]:
+        """独立进程接收的统计（frames / batches / max_batch / dropped）；未启用时返回空 dict"""
+        if isinstance(self.transport_recv, ProcessRxTransport):
+            return self.transport_recv.stats()
+        return {}
+
+    def register_repeat_callback(self, cb: Callable[[int, int], None]):
+        """重复帧通知 cb(msg_id, repeat_count)，需 duplicate_mode='notify'"""
+        self.comm_recv.register_on_repeat(self._wrap_for_dispatch(cb))
+
+    def duplicate_stats(self) -> Dict[str, Any]:
+        """重复帧统计（frames / duplicates / per_msg_id）；未启用时返回空 dict"""
+        return self.comm_recv.duplicate_stats()
 
     # --- 发送接口 ---
     def set_signal(self, sig_name: str, value: int):
+        # 不加 _send_lock：信号写入走双缓冲存储，不会阻塞发送线程
         self.comm_send.set_signal(sig_name, value)
 
+    def begin_update(self):
+        """
+        开始多信号写事务：之后的 set_signal 在 commit() 之前对发送不可见，
+        发送线程始终读取上一次 commit 的一致快照。
+        """
+        self.comm_send.begin_update()
+
+    def commit(self):
+        self.comm_send.commit()
+
+    def abort(self):
+        self.comm_send.abort()
+
     def send(self):
         with self._send_lock:
             self.comm_send.send()
@@ -214,8 +677,9 @@ class EthService:
 
     def build_framed_payload(self) -> bytes:
         with self._send_lock:
-            self.comm_send._pack_signals()
-            self.comm_send._apply_e2e_for_groups()
+            values = self.comm_send._store.snapshot()
+            self.comm_send._pack_signals(values)
+            self.comm_send._apply_e2e_for_groups(values)
             payload = bytes(self.comm_send.payload)
             if self.framer is not None:
                 return self.framer.add_header(payload, msg_id=getattr(self.frame_cls, 'msg_id', 0))
@@ -223,8 +687,9 @@ class EthService:
 
     def send_and_return_bytes(self) -> bytes:
         with self._send_lock:
-            self.comm_send._pack_signals()
-            self.comm_send._apply_e2e_for_groups()
+            values = self.comm_send._store.snapshot()
+            self.comm_send._pack_signals(values)
+            self.comm_send._apply_e2e_for_groups(values)
             payload = bytes(self.comm_send.payload)
             if self.framer is not None:
                 framed = self.framer.add_header(payload, msg_id=getattr(self.frame_cls, 'msg_id', 0))
@@ -10,6 +10,9 @@ from typing import Callable, Optional, Tuple, Dict, Any
 from .signal_ops.framer import Framer
 from .eth_udp.eth_comm import EthECUCommunicator
 from .eth_udp.transport_udp import UDPTransport
+from .eth_udp.conflate import LatestValueConflator
+from .eth_udp.shm_table import SharedSignalTable
+from .eth_udp.rx_process import ProcessRxTransport
 
 
 class BaseUDPFrameClient:
@@ -22,8 +25,14 @@ class BaseUDPFrameClient:
         ethertype: int = 0x88B5,
         framer_mode: str = 'custom_4_4',
         id_endian: str = 'big',
-        len_endian: str = 'big'
+        len_endian: str = 'big',
+        rx_process: bool = False,
+        rx_ring_slots: int = 4096
     ):
+        """
+        rx_process: True 时 socket 接收循环在子进程中运行，经共享内存环形缓冲区（rx_ring_slots 个槽位）
+            批量交给本进程，接收不再与应用线程争 GIL
+        """
         if transport_type.lower() != 'udp':
             raise ValueError("当前仅支持 'udp' transport_type")
         if not udp_local or not udp_remote:
@@ -41,11 +50,16 @@ class BaseUDPFrameClient:
 
         # UDP Transport：接收端绑定 remote（因为对端发到 remote 端口）
         self.transport_recv = UDPTransport(local_addr=udp_remote, remote_addr=udp_local)
+        if rx_process:
+            self.transport_recv = ProcessRxTransport(self.transport_recv, slots=rx_ring_slots)
         self.comm_recv = EthECUCommunicator(self.frame_cls, self.transport_recv, framer=self.framer)
 
         # 回调管理
         self._receive_cbs = []
-        self.comm_recv.register_on_receive(self._internal_on_receive)
+        # 合并订阅者只拿原始 payload，在投递线程中按周期解码
+        self._conflator = LatestValueConflator(self.comm_recv.decode, name="UDPClient-conflate")
+        self.comm_recv.register_on_payload(self._internal_on_payload)
+        self._shm_table: Optional[SharedSignalTable] = None
 
         # 线程/状态
         self._running = False
@@ -55,6 +69,7 @@ class BaseUDPFrameClient:
         if self._running:
             return
         self._running = True
+        self._conflator.start()
         try:
             self.comm_recv.start_receiving()
         except Exception as e:
@@ -68,6 +83,8 @@ class BaseUDPFrameClient:
                 self.transport_recv.stop()
         except Exception:
             pass
+        self._conflator.stop()
+        self.disable_shm_table()
         self._running = False
 
     # --- 回调注册 ---
@@ -82,7 +99,43 @@ class BaseUDPFrameClient:
         except ValueError:
             pass
 
-    def _internal_on_receive(self, parsed: Dict[str, Any], raw_payload: bytes):
+    def subscribe_conflated(self, cb: Callable[[Dict[str, Any], bytes, int], None], interval: float):
+        """合并订阅：每 interval 秒至多回调一次 cb(parsed, raw_payload, collapsed)"""
+        self._conflator.subscribe(cb, interval)
+
+    def unsubscribe_conflated(self, cb: Callable[[Dict[str, Any], bytes, int], None]):
+        self._conflator.unsubscribe(cb)
+
+    def enable_shm_table(self, name: Optional[str] = None) -> str:
+        """
+        发布者模式：本客户端解码后把各信号最新值写入共享内存信号表，
+        同机其它进程用 SharedSignalTable.attach(name) 读取，不必各自再开 socket 解码。
+        """
+        if self._shm_table is None:
+            self._shm_table = SharedSignalTable.create(self.frame_cls, name=name)
+        return self._shm_table.name
+
+    def disable_shm_table(self):
+        table = self._shm_table
+        if table is None:
+            return
+        self._shm_table = None
+        table.close()
+        table.unlink()
+
+    def _internal_on_payload(self, raw_payload: bytes):
+        if self._conflator.active:
+            # 合并订阅者：接收线程只替换最新值引用，不解码
+            self._conflator.publish(raw_payload)
+        table = self._shm_table
+        if table is None and not self._receive_cbs:
+            return  # 没有需要解码结果的消费者
+        parsed = self.comm_recv.decode(raw_payload)
+        if table is not None:
+            try:
+                table.publish(parsed)
+            except Exception:
+                pass
         for cb in list(self._receive_cbs):
             try:
                 cb(parsed, raw_payload)
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+# @Time: 2025/12/14 11:30
+# @Author: JackyYin
+# @Email: jackhuan@icloud.com
+# @File: conflate.py
+
+"""
+最新值合并（conflation）订阅。
+
+很多消费者（仪表盘、日志）只需要每个信号的最新值，不需要每 10 ms 一帧都回调。
+LatestValueConflator：
+- 接收线程调用 publish(raw_payload)：只做一次元组引用替换（seq, raw），不解码，
+  与合并订阅者数量无关，不做任何额外处理；
+- 独立的投递线程按各订阅者的 interval 检查最新值，若有新帧则在投递线程中解码（同一帧只解码一次，
+  多个订阅者共享结果）并回调 cb(parsed, raw_payload, collapsed)，
+  collapsed 为自上次投递以来被合并掉（未单独回调）的帧数。
+
+用法：
+    conflator = LatestValueConflator(decode)   # decode(raw_payload) -> {信号名: 物理值}
+    conflator.subscribe(cb, 0.1)
+    conflator.start()
+    conflator.publish(raw_payload)   # 接收线程
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+ConflatedCallback = Callable[[Dict[str, Any], bytes, int], None]
+
+
+class _Subscriber:
+    __slots__ = ('cb', 'interval', 'next_due', 'last_seq')
+
+    def __init__(self, cb: ConflatedCallback, interval: float, now: float, last_seq: int):
+        self.cb = cb
+        self.interval = interval
+        self.next_due = now + interval
+        self.last_seq = last_seq
+
+
+class LatestValueConflator:
+    def __init__(self, decode: Callable[[bytes], Dict[str, Any]], name: str = "Conflator"):
+        self.name = name
+        self._decode = decode
+        self._latest = None  # (seq, raw)
+        self._decoded = None  # (seq, parsed)，仅投递线程访问
+        self._seq = 0
+        self._subs: List[_Subscriber] = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+    @property
+    def active(self) -> bool:
+        """是否存在合并订阅者（没有订阅者时接收路径可以跳过 publish）"""
+        return bool(self._subs)
+
+    # --- 接收线程 ---
+    def publish(self, raw_payload: bytes):
+        """接收线程调用：仅替换最新值引用（不解码）。"""
+        seq = self._seq + 1
+        self._seq = seq
+        self._latest = (seq, raw_payload)
+
+    # --- 订阅管理 ---
+    def subscribe(self, cb: ConflatedCallback, interval: float):
+        if not callable(cb):
+            raise ValueError("cb must be callable")
+        if interval <= 0:
+            raise ValueError("interval must be > 0")
+        with self._lock:
+            # 订阅之前收到的帧不计入 collapsed
+            sub = _Subscriber(cb, float(interval), time.monotonic(), self._seq)
+            self._subs = self._subs + [sub]
+        self._wakeup.set()
+
+    def unsubscribe(self, cb: ConflatedCallback):
+        with self._lock:
+            self._subs = [s for s in self._subs if s.cb is not cb]
+
+    # --- 生命周期 ---
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name=f"{self.name}-deliver", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 1.0):
+        t = self._thread
+        if t is None:
+            return
+        self._running = False
+        self._wakeup.set()
+        if t is not threading.current_thread():
+            t.join(timeout=timeout)
+        self._thread = None
+
+    def _loop(self):
+        while self._running:
+            subs = self._subs
+            now = time.monotonic()
+            if not subs:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            next_due = None
+            for sub in subs:
+                if sub.next_due <= now:
+                    self._deliver(sub)
+                    # 以截止时间推进，落后时直接对齐到当前时刻
+                    sub.next_due += sub.interval
+                    if sub.next_due <= now:
+                        sub.next_due = now + sub.interval
+                if next_due is None or sub.next_due < next_due:
+                    next_due = sub.next_due
+            delay = next_due - time.monotonic()
+            if delay > 0:
+                self._wakeup.wait(delay)
+                self._wakeup.clear()
+
+    def _deliver(self, sub: _Subscriber):
+        latest = self._latest
+        if latest is None:
+            return
+        seq, raw = latest
+        if seq <= sub.last_seq:
+            return  # 该周期内没有新帧
+        collapsed = seq - sub.last_seq - 1
+        sub.last_seq = seq
+        decoded = self._decoded
+        if decoded is not None and decoded[0] == seq:
+            parsed = decoded[1]
+        else:
+            try:
+                parsed = self._decode(raw)
+            except Exception:
+                return
+            self._decoded = (seq, parsed)
+        try:
+            sub.cb(parsed, raw, collapsed)
+        except Exception:
+            pass
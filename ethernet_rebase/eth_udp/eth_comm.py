@@ -11,6 +11,8 @@ eth_comm.py（带可选 framer 支持）
 - 构造函数增加 framer 参数（默认为 None），接受 Framer 实例。
 - send() 在 transport.send 之前，若配置了 framer 会先调用 framer.add_header(payload, msg_id=self.frame.msg_id)。
 - start_receiving 的回调会在解析之前调用 framer.strip_header(raw)（若配置了 framer），并把剥离后的 payload 用于信号解析。
+- register_on_payload(cb)：cb(raw_payload) 只拿剥离 header 后的原始 payload，不解码；
+  没有 register_on_receive 回调时接收线程不做信号解析，需要时由使用方调用 decode(payload)。
 """
 from typing import Callable, Dict, Any, List, Optional
 from ..signal_ops.bitops import set_bits, get_bits
@@ -31,6 +33,7 @@ class EthECUCommunicator:
         self._signal_values: Dict[str, int] = {}
         self._group_counters: Dict[str, int] = {}
         self._on_receive_callbacks: List[Callable[[Dict[str, Any], bytes], None]] = []
+        self._on_payload_callbacks: List[Callable[[bytes], None]] = []
 
         for g in getattr(self.frame, 'sig_group_dict', {}):
             self._group_counters[g] = 0
@@ -215,6 +218,34 @@ class EthECUCommunicator:
     def register_on_receive(self, callback: Callable[[Dict[str, Any], bytes], None]):
         self._on_receive_callbacks.append(callback)
 
+    def register_on_payload(self, callback: Callable[[bytes], None]):
+        """注册原始 payload 回调 cb(raw_payload)（已剥离 header、截断到 msg_length，未解码）"""
+        self._on_payload_callbacks.append(callback)
+
+    def decode(self, payload) -> Dict[str, Any]:
+        """把 payload 解析为 {信号名: 物理值}"""
+        parsed = {}
+        for attr in dir(self.frame):
+            if attr.startswith('__'):
+                continue
+            sig_cls = getattr(self.frame, attr)
+            if not hasattr(sig_cls, 'sig_name'):
+                continue
+            name = getattr(sig_cls, 'sig_name')
+            startbit = getattr(sig_cls, 'sig_start_bit', getattr(sig_cls, 'startbit', None))
+            length = getattr(sig_cls, 'sig_length', getattr(sig_cls, 'length', None))
+            byteorder = getattr(sig_cls, 'sig_byteorder', "Intel")
+            if startbit is None or length is None:
+                continue
+            # val = get_bits(payload, startbit, length, byteorder=byteorder)
+            # parsed[name] = val
+            raw_val = get_bits(payload, startbit, length, byteorder=byteorder)
+            factor = getattr(sig_cls, 'sig_value_factor', 1.0)
+            offset = getattr(sig_cls, 'sig_value_offset', 0.0)
+            physical_val = raw_val * factor + offset
+            parsed[name] = physical_val
+        return parsed
+
     def start_receiving(self):
         def _cb(raw: bytes):
             # 如果配置了 framer，则先剥离 header
@@ -229,26 +260,14 @@ class EthECUCommunicator:
                 return
 
             payload = bytearray(payload[:self.frame.msg_length])
-            parsed = {}
-            for attr in dir(self.frame):
-                if attr.startswith('__'):
-                    continue
-                sig_cls = getattr(self.frame, attr)
-                if not hasattr(sig_cls, 'sig_name'):
-                    continue
-                name = getattr(sig_cls, 'sig_name')
-                startbit = getattr(sig_cls, 'sig_start_bit', getattr(sig_cls, 'startbit', None))
-                length = getattr(sig_cls, 'sig_length', getattr(sig_cls, 'length', None))
-                byteorder = getattr(sig_cls, 'sig_byteorder', "Intel")
-                if startbit is None or length is None:
-                    continue
-                # val = get_bits(payload, startbit, length, byteorder=byteorder)
-                # parsed[name] = val
-                raw_val = get_bits(payload, startbit, length, byteorder=byteorder)
-                factor = getattr(sig_cls, 'sig_value_factor', 1.0)
-                offset = getattr(sig_cls, 'sig_value_offset', 0.0)
-                physical_val = raw_val * factor + offset
-                parsed[name] = physical_val
+            for cb in self._on_payload_callbacks:
+                try:
+                    cb(bytes(payload))
+                except Exception:
+                    pass
+            if not self._on_receive_callbacks:
+                return  # 没有全量回调：不做信号解析
+            parsed = self.decode(payload)
 
             for cb in self._on_receive_callbacks:
                 try:
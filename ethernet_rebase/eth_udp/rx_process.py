@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+# @Time: 2025/12/21 21:00
+# @Author: JackyYin
+# @Email: jackhuan@icloud.com
+# @File: rx_process.py
+
+"""
+独立进程接收：socket 接收循环放到子进程，经共享内存单生产者/单消费者环形缓冲区交给父进程。
+
+接收线程与应用线程同在一个解释器时要争 GIL，应用负载会直接变成接收延迟抖动。
+ProcessRxTransport 包装已有的 UDPTransport / AFPacketTransport：
+- 子进程（默认 fork，继承已绑定的 socket）循环 recv_into 直接写入环形缓冲区的槽位，记录时间戳，
+  然后发布 head；缓冲区满时丢弃新帧并计数；
+- 父进程的消费线程一次取走 [tail, head) 之间的全部帧（批量复制后立即推进 tail），再逐帧回调；
+  缓冲区为空时置 waiting 标志并在管道上阻塞，子进程发布新帧时发现 waiting 才写管道唤醒，
+  高负载下不产生额外系统调用；
+- send / send_parts 仍由父进程通过原 transport 的 socket 发送。
+
+环形缓冲区布局（小端）：
+    0    slots u32 | slot_size u32
+    64   head u64（子进程写）       128  tail u64（父进程写）
+    192  dropped u64 | truncated u64 | waiting u32 | stop u32
+    256  槽位：每个 (len u32, data_offset u32, ts_ns i64, data[slot_size])
+"""
+import multiprocessing
+import os
+import select
+import socket
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import Callable, Iterable, List, Optional, Tuple
+
+_HDR_CFG = struct.Struct('<II')
+_U64 = struct.Struct('<Q')
+_U32 = struct.Struct('<I')
+_SLOT_HDR = struct.Struct('<IIq')
+_HEAD = 64
+_TAIL = 128
+_DROPPED = 192
+_TRUNCATED = 200
+_WAITING = 208
+_STOP = 212
+_SLOTS_BASE = 256
+SO_TIMESTAMPNS = getattr(socket, 'SO_TIMESTAMPNS', 35)
+_TIMESPEC = struct.Struct('@qq')
+_POLL_MS = 200
+
+RxFrame = Tuple[float, bytes]  # (ts, data)
+
+
+def _rx_child(ring_name: str, sock: socket.socket, wake_conn, eth_type: Optional[int],
+              cpus: Optional[Tuple[int, ...]]):
+    """子进程主循环：socket → 环形缓冲区"""
+    if cpus:
+        try:
+            os.sched_setaffinity(0, cpus)
+        except (AttributeError, OSError):
+            pass
+    shm = shared_memory.SharedMemory(name=ring_name)
+    buf = shm.buf
+    try:
+        slots, slot_size = _HDR_CFG.unpack_from(buf, 0)
+        stride = _SLOT_HDR.size + slot_size
+        scratch = bytearray(slot_size)
+        unpack_u64 = _U64.unpack_from
+        unpack_u32 = _U32.unpack_from
+        head = unpack_u64(buf, _HEAD)[0]
+        dropped = truncated = 0
+        # socket 与父进程共享同一个打开的文件（父进程仍用它发送）：不改阻塞标志，
+        # 用 poll 做超时（以便检查 stop），接收时单次 MSG_DONTWAIT
+        poller = select.poll()
+        poller.register(sock.fileno(), select.POLLIN)
+        cmsg_space = socket.CMSG_SPACE(_TIMESPEC.size)
+        while not unpack_u32(buf, _STOP)[0]:
+            try:
+                if not poller.poll(_POLL_MS):
+                    continue
+            except InterruptedError:
+                continue
+            tail = unpack_u64(buf, _TAIL)[0]
+            if head - tail >= slots:
+                # 缓冲区满：丢弃新帧（父进程消费跟不上）
+                try:
+                    sock.recv_into(scratch, 0, socket.MSG_DONTWAIT)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    break
+                dropped += 1
+                _U64.pack_into(buf, _DROPPED, dropped)
+                continue
+            off = _SLOTS_BASE + (head % slots) * stride
+            data_view = buf[off + _SLOT_HDR.size:off + stride]
+            try:
+                n, ancdata, msg_flags, _ = sock.recvmsg_into([data_view], cmsg_space, socket.MSG_DONTWAIT)
+            except BlockingIOError:
+                continue
+            except OSError:
+                break
+            finally:
+                data_view.release()
+            # 开启 SO_TIMESTAMPNS（enable_kernel_timestamps）时使用内核到达时间
+            ts_ns = 0
+            for level, kind, cdata in ancdata:
+                if level == socket.SOL_SOCKET and kind == SO_TIMESTAMPNS:
+                    sec, nsec = _TIMESPEC.unpack_from(cdata)
+                    ts_ns = sec * 1_000_000_000 + nsec
+            if not ts_ns:
+                ts_ns = time.time_ns()
+            data_offset = 0
+            if eth_type is not None:
+                # AF_PACKET：收到完整以太帧，只保留匹配 ethertype 的帧，payload 从以太头之后开始
+                if n < 14 or struct.unpack_from('!H', buf, off + _SLOT_HDR.size + 12)[0] != eth_type:
+                    continue
+                data_offset = 14
+            if msg_flags & socket.MSG_TRUNC:
+                # 数据报比槽位长（恰好填满槽位不算截断）
+                truncated += 1
+                _U64.pack_into(buf, _TRUNCATED, truncated)
+            _SLOT_HDR.pack_into(buf, off, n, data_offset, ts_ns)
+            head += 1
+            _U64.pack_into(buf, _HEAD, head)
+            if unpack_u32(buf, _WAITING)[0]:
+                _U32.pack_into(buf, _WAITING, 0)
+                try:
+                    wake_conn.send_bytes(b'\x01')
+                except (OSError, EOFError):
+                    pass
+    finally:
+        try:
+            sock.close()
+        except Exception:
+            pass
+        del buf
+        shm.close()
+
+
+class ProcessRxTransport:
+    def __init__(self, transport, slots: int = 4096, slot_size: int = 2048,
+                 cpus: Optional[Iterable[int]] = None, mp_context: Optional[str] = None):
+        """
+        transport: 已创建的 UDPTransport / AFPacketTransport（其 socket 交给子进程接收，发送仍走它）
+        slots / slot_size: 环形缓冲区槽位数与单槽最大数据长度（超长数据报被截断并计数）
+        cpus: 子进程绑定的 CPU 编号（Linux）
+        mp_context: multiprocessing 启动方式，默认 'fork'（子进程直接继承已绑定的 socket）
+        """
+        if slots <= 0 or slot_size <= 0:
+            raise ValueError("slots / slot_size must be > 0")
+        self.transport = transport
+        self.slots = slots
+        self.slot_size = slot_size
+        self.cpus = tuple(cpus) if cpus is not None else None
+        self._ctx = multiprocessing.get_context(mp_context or 'fork')
+        # AF_PACKET transport 带 ethertype，子进程需要去掉以太头并过滤
+        self._eth_type = getattr(transport, 'ethertype', None) if hasattr(transport, 'dst_mac_bytes') else None
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        self._proc = None
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._wake_recv = None
+        self._tap: Optional[Callable] = None
+        # 当前回调中这一帧的接收时间戳（秒，子进程收到该帧的时间，见 start_receiving_batch）
+        self.rx_ts = 0.0
+        self._inner_prev: Optional[Callable] = None  # 挂转发之前原 transport 上已有的 tap
+        self._inner_hooked = False
+        self.thread_init: Optional[Callable[[], None]] = None
+
+        # 统计（父进程侧）
+        self.frames = 0
+        self.batches = 0
+        self.max_batch = 0
+
+    # --- 记录：发送由原 transport 记录，接收由消费线程按子进程时间戳记录 ---
+    @property
+    def tap(self) -> Optional[Callable]:
+        return self._tap
+
+    @tap.setter
+    def tap(self, fn: Optional[Callable]):
+        """
+        只改本包装对象的 tap；发送由原 transport 经 _forward_tx 转发过来。
+        原 transport 上已有的 tap（例如直接 install_tap 到原 transport 的记录者）保留在转发之后，不被覆盖。
+        """
+        self._tap = fn
+        inner = self.transport
+        if fn is not None and not self._inner_hooked:
+            self._inner_prev = getattr(inner, 'tap', None)
+            inner.tap = self._forward_tx
+            self._inner_hooked = True
+        elif fn is None and self._inner_hooked and getattr(inner, 'tap', None) == self._forward_tx:
+            inner.tap = self._inner_prev
+            self._inner_prev = None
+            self._inner_hooked = False
+
+    def _forward_tx(self, direction: str, ts_ns: int, data: bytes, peer=None):
+        tap = self._tap
+        if tap is not None:
+            tap(direction, ts_ns, data, peer)
+        prev = self._inner_prev
+        if prev is not None:
+            prev(direction, ts_ns, data, peer)
+
+    def enable_kernel_timestamps(self):
+        """打开 SO_TIMESTAMPNS：子进程记录内核给出的到达时间（与 UDPTransport 一致）"""
+        self.transport.sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+
+    # --- 发送：委托给原 transport ---
+    def send(self, payload):
+        self.transport.send(payload)
+
+    def send_parts(self, parts):
+        if hasattr(self.transport, 'send_parts'):
+            self.transport.send_parts(parts)
+        else:
+            self.transport.send(b''.join(parts))
+
+    # --- 接收 ---
+    def start_receiving(self, callback: Callable[[bytes], None]):
+        """与普通 transport 相同的接口：逐帧回调 callback(data)"""
+        def _on_batch(batch: List[RxFrame]):
+            for ts, data in batch:
+                self.rx_ts = ts
+                try:
+                    callback(data)
+                except Exception:
+                    pass
+        self.start_receiving_batch(_on_batch)
+
+    def start_receiving_batch(self, callback: Callable[[List[RxFrame]], None]):
+        """批量回调 callback([(ts, data), ...])，ts 为子进程收到该帧时的 time.time()（开启内核时间戳时为内核到达时间）"""
+        if self._thread is not None:
+            return
+        sock = getattr(self.transport, 'sock', None)
+        if sock is None:
+            raise RuntimeError("wrapped transport has no socket")
+        size = _SLOTS_BASE + self.slots * (_SLOT_HDR.size + self.slot_size)
+        self._shm = shared_memory.SharedMemory(create=True, size=size)
+        buf = self._shm.buf
+        buf[:_SLOTS_BASE] = bytes(_SLOTS_BASE)
+        _HDR_CFG.pack_into(buf, 0, self.slots, self.slot_size)
+        self._wake_recv, wake_send = self._ctx.Pipe(duplex=False)
+        self._proc = self._ctx.Process(
+            target=_rx_child,
+            args=(self._shm.name, sock, wake_send, self._eth_type, self.cpus),
+            name="ProcessRxTransport-rx", daemon=True)
+        self._proc.start()
+        wake_send.close()
+        self._running = True
+        self._thread = threading.Thread(target=self._consume, args=(callback,),
+                                        name="ProcessRxTransport-consume", daemon=True)
+        self._thread.start()
+
+    def _consume(self, callback: Callable[[List[RxFrame]], None]):
+        if self.thread_init is not None:
+            try:
+                self.thread_init()
+            except Exception:
+                pass
+        buf = self._shm.buf
+        slots = self.slots
+        stride = _SLOT_HDR.size + self.slot_size
+        unpack_u64 = _U64.unpack_from
+        unpack_slot = _SLOT_HDR.unpack_from
+        wake = self._wake_recv
+        tail = unpack_u64(buf, _TAIL)[0]
+        while self._running:
+            head = unpack_u64(buf, _HEAD)[0]
+            if head == tail:
+                # 先声明等待，再复查 head，避免错过在两者之间发布的帧
+                _U32.pack_into(buf, _WAITING, 1)
+                if unpack_u64(buf, _HEAD)[0] == tail:
+                    try:
+                        if wake.poll(0.2):
+                            while wake.poll(0):
+                                wake.recv_bytes()
+                    except (OSError, EOFError):
+                        if self._proc is not None and not self._proc.is_alive():
+                            break
+                _U32.pack_into(buf, _WAITING, 0)
+                continue
+            batch: List[RxFrame] = []
+            for seq in range(tail, head):
+                off = _SLOTS_BASE + (seq % slots) * stride
+                n, data_offset, ts_ns = unpack_slot(buf, off)
+                start = off + _SLOT_HDR.size
+                end = start + min(n, self.slot_size)
+                data = bytes(buf[start + data_offset:end])
+                tap = self._tap
+                if tap is not None:
+                    # AF_PACKET 记录完整以太帧（含以太头）
+                    tap('rx', ts_ns, bytes(buf[start:end]) if data_offset else data)
+                batch.append((ts_ns / 1e9, data))
+            tail = head
+            _U64.pack_into(buf, _TAIL, tail)   # 复制完成后立即归还槽位
+            self.frames += len(batch)
+            self.batches += 1
+            if len(batch) > self.max_batch:
+                self.max_batch = len(batch)
+            try:
+                callback(batch)
+            except Exception:
+                pass
+        del buf
+
+    def stop(self):
+        self._running = False
+        shm = self._shm
+        if shm is not None:
+            _U32.pack_into(shm.buf, _STOP, 1)
+        if self._proc is not None:
+            self._proc.join(timeout=1.0)
+            if self._proc.is_alive():
+                self._proc.terminate()
+                self._proc.join(timeout=1.0)
+            self._proc = None
+        t = self._thread
+        if t is not None and t is not threading.current_thread():
+            t.join(timeout=1.0)
+        self._thread = None
+        if self._wake_recv is not None:
+            self._wake_recv.close()
+            self._wake_recv = None
+        if shm is not None:
+            self._shm = None
+            shm.close()
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+        if hasattr(self.transport, 'stop'):
+            self.transport.stop()
+
+    def stats(self):
+        dropped = truncated = 0
+        if self._shm is not None:
+            dropped = _U64.unpack_from(self._shm.buf, _DROPPED)[0]
+            truncated = _U64.unpack_from(self._shm.buf, _TRUNCATED)[0]
+        return {
+            'frames': self.frames,
+            'batches': self.batches,
+            'max_batch': self.max_batch,
+            'dropped': dropped,
+            'truncated': truncated,
+        }
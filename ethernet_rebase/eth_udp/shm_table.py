@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+# @Time: 2025/12/20 20:30
+# @Author: JackyYin
+# @Email: jackhuan@icloud.com
+# @File: shm_table.py
+
+"""
+共享内存最新值信号表：一个进程解码，多个进程（HIL 逻辑、仪表盘、记录器）直接读取。
+
+布局（multiprocessing.shared_memory，小端）：
+    0   magic 'SIGT' | layout 版本 u32 | 信号数 n u32 | 名字区长度 u32 | 记录区偏移 u32
+    24  seq u64（seqlock：写入期间为奇数，写完为偶数；seq // 2 即已发布帧数）
+    32  ts  f64（最近一帧的时间戳，time.time()）
+    40  名字区：utf-8，'\\n' 分隔，顺序即记录顺序
+    off 记录区：每个信号 16 字节 (raw u64, physical f64)
+
+写端（单写者）整帧发布：seq 置奇数 → 一次 pack_into 写全部记录与时间戳 → seq 置偶数。
+读端先读 seq，复制记录区，再读 seq，两次相同且为偶数即得到同一帧的一致快照；
+正常情况下全程只访问映射内存，没有系统调用（只有持续冲突时才 sleep(0) 让出 CPU）。
+
+用法：
+    table = SharedSignalTable.create(UDFrame_Z_204)       # 发布进程
+    table.publish(parsed)                                 # parsed: {sig_name: 物理值}
+    reader = SharedSignalTable.attach(table.name)         # 其它进程
+    raw, phys, ts = reader.read('CrsCtrlOvrdnReq')
+"""
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+_MAGIC = b'SIGT'
+_LAYOUT_VERSION = 1
+_HEADER = struct.Struct('<4sIIII')
+_SEQ = struct.Struct('<Q')
+_TS = struct.Struct('<d')
+_SEQ_OFFSET = 24
+_TS_OFFSET = 32
+_NAMES_OFFSET = 40
+_RECORD = 16
+
+SignalValue = Tuple[int, float, float]  # (raw, physical, ts)
+
+# 本进程（及 fork 出的子进程）创建的共享内存名：这些名字的 tracker 登记属于创建者，attach 时不能注销
+_created_names = set()
+
+
+def _signal_specs(frame_cls) -> List[Tuple[str, Any, Any, int]]:
+    """(sig_name, factor, offset, length)，顺序与接收端解析结果一致（dir() 顺序）"""
+    specs = []
+    for attr in dir(frame_cls):
+        if attr.startswith('__'):
+            continue
+        sig_cls = getattr(frame_cls, attr)
+        if not hasattr(sig_cls, 'sig_name'):
+            continue
+        length = getattr(sig_cls, 'sig_length', getattr(sig_cls, 'length', None))
+        if length is None or length <= 0:
+            continue
+        if length > 64:
+            raise ValueError(f"signal '{sig_cls.sig_name}' 长度 {length} 超过 64 位，无法放入共享表")
+        specs.append((sig_cls.sig_name,
+                      getattr(sig_cls, 'sig_value_factor', 1.0),
+                      getattr(sig_cls, 'sig_value_offset', 0.0),
+                      int(length)))
+    return specs
+
+
+def _open_untracked(name: str) -> shared_memory.SharedMemory:
+    """
+    读端打开已有的共享内存，且不登记到本进程的 resource_tracker：
+    否则独立启动的读进程退出时 tracker 会 unlink 写端的共享内存，后续的读进程再也打不开。
+    删除只由创建者（unlink()）负责。
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, create=False, track=False)
+    except TypeError:  # Python < 3.13 没有 track 参数
+        shm = shared_memory.SharedMemory(name=name, create=False)
+        if shm._name in _created_names:
+            return shm
+        try:
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        except Exception:
+            pass
+        return shm
+
+
+class SharedSignalTable:
+    def __init__(self, shm: shared_memory.SharedMemory, names: List[str], records_offset: int,
+                 owner: bool, specs: Optional[List[Tuple[str, Any, Any, int]]] = None):
+        """请使用 create() / attach() 构造"""
+        self._shm = shm
+        self._buf = shm.buf
+        self.name = shm.name
+        self.names: Tuple[str, ...] = tuple(names)
+        self._index: Dict[str, int] = {n: i for i, n in enumerate(self.names)}
+        self._records_offset = records_offset
+        self._records_size = _RECORD * len(self.names)
+        self._records = struct.Struct('<' + 'Qd' * len(self.names))
+        self._owner = owner
+        self._specs = specs
+        self._seq = 0
+
+    # --- 构造 ---
+    @classmethod
+    def create(cls, frame_cls, name: Optional[str] = None) -> 'SharedSignalTable':
+        """创建共享表（写端），name=None 时由系统分配名字（见 .name）"""
+        specs = _signal_specs(frame_cls)
+        names = [s[0] for s in specs]
+        blob = '\n'.join(names).encode('utf-8')
+        records_offset = (_NAMES_OFFSET + len(blob) + 7) & ~7
+        size = records_offset + _RECORD * len(names)
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        _created_names.add(shm._name)
+        buf = shm.buf
+        buf[:records_offset] = bytes(records_offset)
+        _HEADER.pack_into(buf, 0, _MAGIC, _LAYOUT_VERSION, len(names), len(blob), records_offset)
+        buf[_NAMES_OFFSET:_NAMES_OFFSET + len(blob)] = blob
+        table = cls(shm, names, records_offset, owner=True, specs=specs)
+        # 初始值：raw=0 对应的物理值
+        table.publish({n: 0 * f + o for n, f, o, _ in specs}, ts=0.0)
+        table._seq = 0
+        _SEQ.pack_into(buf, _SEQ_OFFSET, 0)
+        return table
+
+    @classmethod
+    def attach(cls, name: str) -> 'SharedSignalTable':
+        """按名字打开已有的共享表（读端）"""
+        shm = _open_untracked(name)
+        magic, version, n, names_len, records_offset = _HEADER.unpack_from(shm.buf, 0)
+        if magic != _MAGIC or version != _LAYOUT_VERSION:
+            shm.close()
+            raise ValueError(f"shared memory '{name}' 不是信号表（或版本不兼容）")
+        blob = bytes(shm.buf[_NAMES_OFFSET:_NAMES_OFFSET + names_len]).decode('utf-8')
+        names = blob.split('\n') if n else []
+        return cls(shm, names, records_offset, owner=False)
+
+    # --- 写端 ---
+    def publish(self, parsed: Dict[str, Any], raw: Optional[Dict[str, int]] = None,
+                ts: Optional[float] = None) -> None:
+        """
+        发布一帧：parsed 为物理值 dict；raw 为原始值 dict（不提供时按 factor/offset 反算）。
+        缺失的信号保留上一帧的值。
+        """
+        if self._specs is None:
+            raise RuntimeError("attach() 打开的共享表是只读的")
+        if ts is None:
+            ts = time.time()
+        buf = self._buf
+        off = self._records_offset
+        old = self._records.unpack_from(buf, off)
+        values = []
+        for i, (name, factor, offset, length) in enumerate(self._specs):
+            phys = parsed.get(name)
+            if phys is None:
+                values.append(old[2 * i])
+                values.append(old[2 * i + 1])
+                continue
+            if raw is not None and name in raw:
+                r = raw[name]
+            else:
+                r = int(round((phys - offset) / factor)) if factor else 0
+            values.append(r & 0xFFFFFFFFFFFFFFFF)
+            values.append(float(phys))
+        seq = self._seq + 1
+        _SEQ.pack_into(buf, _SEQ_OFFSET, seq)           # 奇数：写入中
+        self._records.pack_into(buf, off, *values)
+        _TS.pack_into(buf, _TS_OFFSET, ts)
+        self._seq = seq + 1
+        _SEQ.pack_into(buf, _SEQ_OFFSET, seq + 1)       # 偶数：写入完成
+
+    # --- 读端 ---
+    @property
+    def seq(self) -> int:
+        return _SEQ.unpack_from(self._buf, _SEQ_OFFSET)[0]
+
+    def frames(self) -> int:
+        """已发布的帧数"""
+        return self.seq // 2
+
+    def _read_consistent(self, start: int, end: int, retries: int) -> Tuple[bytes, float, int]:
+        buf = self._buf
+        for i in range(retries):
+            if i and i % 64 == 0:
+                time.sleep(0)  # 持续冲突时让出 CPU（单核上写端才能完成本次写入）
+            s1 = _SEQ.unpack_from(buf, _SEQ_OFFSET)[0]
+            if s1 & 1:
+                continue
+            data = bytes(buf[start:end])
+            ts = _TS.unpack_from(buf, _TS_OFFSET)[0]
+            if _SEQ.unpack_from(buf, _SEQ_OFFSET)[0] == s1:
+                return data, ts, s1
+        raise RuntimeError("signal table is being written continuously (writer stalled mid-update?)")
+
+    def read(self, sig_name: str, retries: int = 10000) -> SignalValue:
+        """返回 (raw, physical, ts)"""
+        i = self._index.get(sig_name)
+        if i is None:
+            raise KeyError(f"Signal '{sig_name}' not found in shared table")
+        start = self._records_offset + _RECORD * i
+        data, ts, _ = self._read_consistent(start, start + _RECORD, retries)
+        raw, phys = struct.unpack('<Qd', data)
+        return raw, phys, ts
+
+    def snapshot(self, retries: int = 10000) -> Dict[str, SignalValue]:
+        """同一帧内全部信号的一致快照 {sig_name: (raw, physical, ts)}"""
+        start = self._records_offset
+        data, ts, _ = self._read_consistent(start, start + self._records_size, retries)
+        vals = self._records.unpack(data)
+        return {n: (vals[2 * i], vals[2 * i + 1], ts) for i, n in enumerate(self.names)}
+
+    # --- 释放 ---
+    def close(self):
+        self._buf = None
+        try:
+            self._shm.close()
+        except Exception:
+            pass
+
+    def unlink(self):
+        """删除共享内存（仅创建者调用）"""
+        if self._owner:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+            _created_names.discard(self._shm._name)
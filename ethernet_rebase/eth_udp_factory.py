@@ -9,22 +9,28 @@ from .base_udp_client import BaseUDPFrameClient
 
 class UDPFactory:
     @staticmethod
-    def _get_frame_class(name: str):
-        # 假设所有 Frame 类定义在 __init__.py 中
+    def _get_frame_class(name):
+        # 假设所有 Frame 类定义在 __init__.py 中（或由其按需加载，见 frame_registry）
+        # name 可以是类名，也可以是 msg_id（int）
         import __init__ as frame_mod
+        if isinstance(name, int):
+            try:
+                return frame_mod.get_frame_class(name)
+            except (AttributeError, KeyError):
+                raise ValueError(f"Frame class for msg_id 0x{name:X} not found in __init__") from None
         cls = getattr(frame_mod, name, None)
         if cls is None:
             raise ValueError(f"Frame class '{name}' not found in __init__")
         return cls
 
     @staticmethod
-    def asServer(frame_name: str, **kwargs):
+    def asServer(frame_name, **kwargs):
         """创建发送服务（Server）"""
         frame_cls = UDPFactory._get_frame_class(frame_name)
         return BaseUDPFrameService(frame_cls=frame_cls, **kwargs)
 
     @staticmethod
-    def asClient(frame_name: str, **kwargs):
+    def asClient(frame_name, **kwargs):
         """创建接收客户端（Client）"""
         frame_cls = UDPFactory._get_frame_class(frame_name)
         return BaseUDPFrameClient(frame_cls=frame_cls, **kwargs)
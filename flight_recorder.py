@@ -0,0 +1,375 @@
+# -*- coding: utf-8 -*-
+# @Time: 2025/12/27 20:50
+# @Author: JackyYin
+# @Email: jackhuan@icloud.com
+# @File: flight_recorder.py
+
+"""
+飞行记录器：常驻内存的收发帧环形缓冲区，出现异常时把之前几秒的流量写成 pcap。
+
+PcapRecorder 全量写盘不适合 7x24 常开。FlightRecorder：
+- 启动时一次性分配 slots * slot_size 的 bytearray 与各槽的元数据 array（时间戳 / 长度 / 方向），
+  之后不再分配内存；
+- 挂在 transport.tap 上（与 PcapRecorder 串联，见 pcap_recorder.install_tap），每帧只做一次
+  memcpy 到下一个槽（itertools.count 取槽号，收发线程之间不加锁），超过 slot_size 的部分截断；
+- 每个槽带序号（写入前清零、写完再置位），dump 时复制整个缓冲区后丢弃复制期间被改写的槽，
+  按序号排序输出；
+- 触发条件：E2E 校验失败（add_e2e_trigger）、信号谓词（add_signal_trigger）、
+  某帧超时未收到（add_timeout_trigger）以及 trigger() 手动触发；
+  触发后再等 post_seconds 秒（记录触发之后的流量），由后台线程写出
+  <dump_dir>/<prefix>_<时间>_<原因>.pcap，min_interval 内的重复触发只计数不写盘。
+E2E / 信号谓词需要在接收线程中按 framer 拆分 PDU，只有注册了这类触发条件时才会执行。
+
+用法：
+    fr = FlightRecorder(slots=16384, dump_dir='/var/log/ecu', post_seconds=1.0)
+    fr.attach(transport)                               # 可多次调用
+    fr.add_e2e_trigger(UDFrame_Z_204)                  # E2E 失败时转储
+    fr.add_signal_trigger(UDFrame_Z_204, lambda s: s['LVPwrSplyErrStsSts'] != 0)
+    fr.add_timeout_trigger(UDFrame_Z_204, 0.1)         # 100 ms 没收到时转储
+    fr.register_on_dump(lambda path, reason: print(path, reason))
+    fr.start()
+    ...
+    fr.trigger('operator')                             # 或 fr.dump(path) 同步写出
+"""
+import itertools
+import os
+import queue
+import re
+import threading
+import time
+from array import array
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from framer import Framer, PDUTruncatedError
+from frame_codec import compile_frame
+from pcap_recorder import FORMATS, TapSource, install_tap, remove_tap, write_capture
+
+DumpCallback = Callable[[str, str], None]
+
+_DIRECTIONS = ('rx', 'tx')
+_REASON_RE = re.compile(r'[^A-Za-z0-9_.-]+')
+
+
+class FlightRecorder:
+    def __init__(self, slots: int = 16384, slot_size: int = 2048, dump_dir: str = '.',
+                 fmt: str = "pcap", prefix: str = "flight", pre_seconds: Optional[float] = None,
+                 post_seconds: float = 0.0, min_interval: float = 5.0, framer: Optional[Framer] = None):
+        """
+        slots / slot_size: 槽数与每槽字节数（内存占用约 slots * slot_size）
+        dump_dir / fmt / prefix: 转储目录、格式（"pcap" / "pcapng"）与文件名前缀
+        pre_seconds: 只转储触发前这么多秒内的帧（None 表示环中全部）
+        post_seconds: 触发后继续记录这么多秒再转储
+        min_interval: 两次转储的最小间隔（秒），期间的触发只计数
+        framer: 触发条件拆分 PDU 用的 Framer（默认 custom_4_4）
+        """
+        if slots < 1 or slot_size < 1:
+            raise ValueError("slots and slot_size must be >= 1")
+        if fmt not in FORMATS:
+            raise ValueError(f"fmt must be one of {FORMATS}")
+        self.slots = slots
+        self.slot_size = slot_size
+        self.dump_dir = dump_dir
+        self.fmt = fmt
+        self.prefix = prefix
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.min_interval = min_interval
+        self.framer = framer if framer is not None else Framer(mode="custom_4_4")
+
+        # 预分配的环：数据区 + 每槽元数据
+        self._buf = bytearray(slots * slot_size)
+        self._view = memoryview(self._buf)
+        self._seq = array('Q', bytes(8 * slots))
+        self._ts = array('q', bytes(8 * slots))
+        self._len = array('I', bytes(4 * slots))
+        self._dir = array('B', bytes(slots))
+        self._src = array('H', bytes(2 * slots))
+        self._peer: List[Any] = [None] * slots
+        self._counter = itertools.count()
+
+        self._sources: List[TapSource] = []
+        self._attached: List[Tuple[Any, Any]] = []
+        # 触发条件：msg_id -> [check(payload) -> 原因或 None]；超时：msg_id -> (timeout, 帧名)
+        self._checks: Dict[Optional[int], List[Callable[[Any], Optional[str]]]] = {}
+        self._timeouts: Dict[int, Tuple[float, str]] = {}
+        self._last_rx: Dict[int, float] = {}
+        self._timed_out: Dict[int, float] = {}
+        self._dump_cbs: List[DumpCallback] = []
+        self._lock = threading.Lock()
+
+        self._requests: "queue.Queue[Tuple[float, str]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._last_trigger = float('-inf')
+        self._dump_index = 0
+
+        # 统计
+        self.triggers = 0
+        self.suppressed = 0
+        self.dumps: List[str] = []
+        self.truncated = 0
+
+    # --- 挂接 transport ---
+    def attach(self, transport) -> None:
+        """挂到 transport 上记录其全部收发（与已挂的 tap 串联）"""
+        if any(t is transport for t, _ in self._attached):
+            return
+        source = TapSource(transport)
+        self._sources.append(source)
+        index = len(self._sources) - 1
+        # AF_PACKET 的 tap 数据是完整以太帧，触发条件按以太头之后的数据报拆分
+        skip = 0 if source.udp else 14
+
+        def tap(direction: str, ts_ns: int, data: bytes, peer=None):
+            self.record(direction, ts_ns, data, peer, index)
+            if direction == 'rx' and (self._checks or self._timeouts):
+                self._inspect(data[skip:] if skip else data)
+
+        link = install_tap(transport, tap)
+        if hasattr(transport, 'enable_kernel_timestamps'):
+            try:
+                transport.enable_kernel_timestamps()
+            except OSError:
+                pass
+        self._attached.append((transport, link))
+
+    def detach(self, transport) -> None:
+        for t, link in self._attached:
+            if t is transport:
+                remove_tap(transport, link)
+        self._attached = [(t, link) for t, link in self._attached if t is not transport]
+
+    # --- 写入（收发线程） ---
+    def record(self, direction: str, ts_ns: int, data, peer=None, source: int = 0):
+        """把一帧拷贝进下一个槽（超过 slot_size 的部分截断）"""
+        n = next(self._counter)
+        slot = n % self.slots
+        seq = self._seq
+        seq[slot] = 0
+        size = len(data)
+        cap = size if size <= self.slot_size else self.slot_size
+        off = slot * self.slot_size
+        if cap < size:
+            self.truncated += 1
+            data = memoryview(data)[:cap]
+        self._view[off:off + cap] = data
+        self._ts[slot] = ts_ns
+        self._len[slot] = size
+        self._dir[slot] = 1 if direction == 'tx' else 0
+        self._src[slot] = source
+        self._peer[slot] = peer
+        seq[slot] = n + 1
+
+    def _inspect(self, datagram):
+        checks = self._checks
+        timeouts = self._timeouts
+        try:
+            for msg_id, payload in self.framer.iter_pdus(datagram):
+                if msg_id in timeouts:
+                    self._last_rx[msg_id] = time.monotonic()
+                for check in checks.get(msg_id, ()):
+                    try:
+                        reason = check(payload)
+                    except Exception:
+                        continue
+                    if reason:
+                        self.trigger(reason)
+        except PDUTruncatedError:
+            pass
+        except Exception:
+            pass
+
+    # --- 触发条件 ---
+    def _add_check(self, msg_id: Optional[int], check: Callable[[Any], Optional[str]]):
+        with self._lock:
+            checks = dict(self._checks)
+            checks[msg_id] = checks.get(msg_id, []) + [check]
+            self._checks = checks
+
+    def add_e2e_trigger(self, frame_cls) -> None:
+        """接收到的 frame_cls 帧任一 E2E 信号组（Profile 11）CRC 校验失败时触发"""
+        compiled = compile_frame(frame_cls)
+        groups = list(compiled.e2e_groups.values())
+        if not groups:
+            raise ValueError(f"frame class {frame_cls.__name__} has no supported E2E group")
+        length = compiled.msg_length
+        name = frame_cls.__name__
+
+        def check(payload):
+            if len(payload) < length:
+                return None
+            for group in groups:
+                if not group.check(payload):
+                    return f"e2e_{name}_{group.name}"
+            return None
+        self._add_check(compiled.msg_id, check)
+
+    def add_signal_trigger(self, frame_cls, predicate: Callable[[Dict[str, Any]], bool],
+                           name: Optional[str] = None) -> None:
+        """frame_cls 帧解码后 predicate(parsed) 为真时触发（只解码该帧）"""
+        if not callable(predicate):
+            raise ValueError("predicate must be callable")
+        compiled = compile_frame(frame_cls)
+        decode = compiled.decode
+        length = compiled.msg_length
+        reason = f"signal_{name or frame_cls.__name__}"
+
+        def check(payload):
+            if len(payload) < length:
+                return None
+            return reason if predicate(decode(payload)) else None
+        self._add_check(compiled.msg_id, check)
+
+    def add_timeout_trigger(self, frame_or_msg_id, timeout: float) -> None:
+        """收到过的帧超过 timeout 秒没有再收到时触发（每次中断只触发一次）"""
+        if timeout <= 0:
+            raise ValueError("timeout must be > 0")
+        if isinstance(frame_or_msg_id, int):
+            msg_id, name = frame_or_msg_id, f"0x{frame_or_msg_id:X}"
+        else:
+            msg_id, name = frame_or_msg_id.msg_id, frame_or_msg_id.__name__
+        with self._lock:
+            timeouts = dict(self._timeouts)
+            timeouts[msg_id] = (float(timeout), name)
+            self._timeouts = timeouts
+
+    def clear_triggers(self):
+        with self._lock:
+            self._checks = {}
+            self._timeouts = {}
+
+    def register_on_dump(self, callback: DumpCallback):
+        """转储完成回调 callback(path, reason)（在后台线程中执行）"""
+        if not callable(callback):
+            raise ValueError("callback must be callable")
+        self._dump_cbs = self._dump_cbs + [callback]
+
+    def unregister_on_dump(self, callback: DumpCallback):
+        self._dump_cbs = [cb for cb in self._dump_cbs if cb is not callback]
+
+    # --- 触发与转储 ---
+    def trigger(self, reason: str = "manual") -> bool:
+        """请求一次转储（post_seconds 后由后台线程写出）；min_interval 内的重复触发返回 False"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_trigger < self.min_interval:
+                self.suppressed += 1
+                return False
+            self._last_trigger = now
+            self.triggers += 1
+        self._requests.put((now + self.post_seconds, reason))
+        return True
+
+    def snapshot(self) -> List[Tuple[int, str, bytes, int, Any, int]]:
+        """环中当前的帧，按写入顺序：[(ts_ns, direction, data, 原始长度, peer, source)]"""
+        seq_before = array('Q', self._seq)
+        data = bytes(self._buf)
+        ts = array('q', self._ts)
+        lengths = array('I', self._len)
+        dirs = bytes(self._dir)
+        srcs = array('H', self._src)
+        peers = list(self._peer)
+        seq_after = self._seq
+        size = self.slot_size
+        valid = [i for i in range(self.slots) if seq_before[i] and seq_before[i] == seq_after[i]]
+        valid.sort(key=seq_before.__getitem__)
+        out = []
+        for i in valid:
+            off = i * size
+            cap = min(lengths[i], size)
+            out.append((ts[i], _DIRECTIONS[dirs[i]], data[off:off + cap], lengths[i], peers[i], srcs[i]))
+        return out
+
+    def dump(self, path: Optional[str] = None, reason: str = "manual") -> str:
+        """立即把环中的帧（受 pre_seconds 限制）写成 pcap / pcapng，返回文件路径"""
+        frames = self.snapshot()
+        if self.pre_seconds is not None and frames:
+            cutoff = time.time_ns() - int(self.pre_seconds * 1e9)
+            frames = [f for f in frames if f[0] >= cutoff]
+        if path is None:
+            path = self._dump_path(reason)
+        sources = self._sources
+        records = []
+        for ts_ns, direction, data, orig_len, peer, src in frames:
+            frame = sources[src].to_frame(direction, data, peer) if src < len(sources) else data
+            # UDP 源补上的头部计入原始长度
+            records.append((ts_ns, direction, frame, orig_len + len(frame) - len(data)))
+        write_capture(path, records, fmt=self.fmt)
+        self.dumps.append(path)
+        for cb in self._dump_cbs:
+            try:
+                cb(path, reason)
+            except Exception:
+                pass
+        return path
+
+    def _dump_path(self, reason: str) -> str:
+        self._dump_index += 1
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        tag = _REASON_RE.sub('_', reason)[:48]
+        ext = '.pcapng' if self.fmt == "pcapng" else '.pcap'
+        return os.path.join(self.dump_dir, f"{self.prefix}_{stamp}_{self._dump_index:03d}_{tag}{ext}")
+
+    # --- 后台线程：超时检查与延时转储 ---
+    def start(self):
+        if self._thread is not None:
+            return
+        os.makedirs(self.dump_dir, exist_ok=True)
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name="FlightRecorder", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        for t, _ in list(self._attached):
+            self.detach(t)
+        t = self._thread
+        if t is None:
+            return
+        self._running = False
+        self._requests.put((0.0, ''))
+        t.join(timeout=timeout)
+        self._thread = None
+
+    def _loop(self):
+        waiting: List[Tuple[float, str]] = []
+        while self._running:
+            now = time.monotonic()
+            timeouts = self._timeouts
+            delay = 0.5
+            for msg_id, (limit, name) in timeouts.items():
+                last = self._last_rx.get(msg_id)
+                if last is None:
+                    continue
+                if now - last > limit and self._timed_out.get(msg_id) != last:
+                    self._timed_out[msg_id] = last
+                    self.trigger(f"timeout_{name}")
+                delay = min(delay, limit / 4)
+            if waiting:
+                delay = min(delay, max(0.0, waiting[0][0] - now))
+            try:
+                due, reason = self._requests.get(timeout=delay)
+                if reason:
+                    waiting.append((due, reason))
+                    waiting.sort()
+            except queue.Empty:
+                pass
+            now = time.monotonic()
+            while waiting and (waiting[0][0] <= now or not self._running):
+                # 停止时尚未到期的转储立即写出
+                _, reason = waiting.pop(0)
+                try:
+                    self.dump(reason=reason)
+                except Exception:
+                    pass
+
+    def stats(self) -> Dict[str, Any]:
+        written = self._seq
+        return {
+            'frames': sum(1 for s in written if s),
+            'capacity': self.slots,
+            'bytes': len(self._buf),
+            'truncated': self.truncated,
+            'triggers': self.triggers,
+            'suppressed': self.suppressed,
+            'dumps': list(self.dumps),
+        }
@@ -0,0 +1,356 @@
+# -*- coding: utf-8 -*-
+# @Time: 2025/12/14 20:15
+# @Author: JackyYin
+# @Email: jackhuan@icloud.com
+# @File: frame_codec.py
+
+"""
+帧定义的"编译"版本：把帧类（如 UDFrame_Z_204）中的信号定义预先转换成
+字节偏移 / 移位 / 掩码操作，并生成专用的解码函数，避免每帧 dir() + getattr + 逐位循环。
+
+位序约定与 bitops.get_bits 完全一致：
+- Intel：startbit 为最低位的绝对位索引（字节内 bit0 = LSB）
+- Motorola：startbit 为 MSB 的绝对位索引，向更小的位索引延展 length 位（字节内 0 对应 MSB）
+
+用法：
+    cf = compile_frame(UDFrame_Z_204)
+    parsed = cf.decode(payload)          # {sig_name: 物理值}，与 eth_comm2 的解析结果一致
+    raw = cf.decode_raw(payload)         # {sig_name: 原始值}
+    parsed, raw = cf.decode_pair(payload)        # 只取一次原始值，物理值由其换算
+    dec = cf.make_decoder(['CrsCtrlOvrdnReq'])   # 只解码部分信号
+    cf.ops['CrsCtrlOvrdnReq'].write(buf, 1)       # 直接改写原始 payload 中的信号位
+    cf.e2e_groups['CrsCtrlOvrdn'].apply(buf)      # 按 payload 当前内容重算 E2E（Profile 11）
+"""
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import e2e
+
+try:
+    import numpy as np
+except ImportError:  # 没有 NumPy 时 SignalOp.raw_column 不可用（向量化路径由调用方回退）
+    np = None
+
+# 位反转表：_REV[n][x] 为 n 位整数 x 的位反转结果（Motorola 逐字节片段使用）
+_REV = [None] + [
+    tuple(int(format(x, f'0{n}b')[::-1], 2) for x in range(1 << n)) for n in range(1, 9)
+]
+_REV_NP = None if np is None else [None] + [np.asarray(_REV[n], dtype=np.uint8) for n in range(1, 9)]
+
+
+class SignalOp:
+    """单个信号的编译结果。chunks 为逐字节片段 (byte_index, src_shift, width, dst_shift, reverse)。"""
+    __slots__ = ('name', 'startbit', 'length', 'byteorder', 'factor', 'offset', 'init',
+                 'sig_cls', 'first_byte', 'last_byte', 'mask', 'chunks', 'intel')
+
+    def __init__(self, sig_cls, name: str, startbit: int, length: int, byteorder: str):
+        self.sig_cls = sig_cls
+        self.name = name
+        self.startbit = startbit
+        self.length = length
+        self.byteorder = byteorder
+        self.factor = getattr(sig_cls, 'sig_value_factor', 1.0)
+        self.offset = getattr(sig_cls, 'sig_value_offset', 0.0)
+        self.init = getattr(sig_cls, 'sig_value_init', 0)
+        self.mask = (1 << length) - 1
+
+        order = byteorder.lower()
+        chunks: List[Tuple[int, int, int, int, bool]] = []
+        if order == "intel":
+            self.intel = True
+            lo, hi = startbit, startbit + length - 1
+            for b in range(lo // 8, hi // 8 + 1):
+                k0 = max(lo, 8 * b) - 8 * b
+                k1 = min(hi, 8 * b + 7) - 8 * b
+                chunks.append((b, k0, k1 - k0 + 1, 8 * b + k0 - lo, False))
+        elif order in ("motorola", "bigendian"):
+            self.intel = False
+            lo, hi = startbit - length + 1, startbit
+            if lo < 0:
+                raise ValueError(f"signal '{name}': startbit/length 超出缓冲区范围（计算出的绝对位为负）")
+            for b in range(lo // 8, hi // 8 + 1):
+                k0 = max(lo, 8 * b) - 8 * b
+                k1 = min(hi, 8 * b + 7) - 8 * b
+                # 字节内 k 越大越靠近 LSB；取出后需要位反转才能得到值的自然位序
+                chunks.append((b, 7 - k1, k1 - k0 + 1, 8 * b + k0 - lo, True))
+        else:
+            raise ValueError(f"signal '{name}': 未知的 byteorder {byteorder!r}，支持 'Intel' 或 'Motorola'。")
+        self.chunks = tuple(chunks)
+        self.first_byte = chunks[0][0]
+        self.last_byte = chunks[-1][0]
+
+    def raw_column(self, m):
+        """
+        (行, 字节) 的 uint8 矩阵 m 中本信号的原始值列（uint64），按 chunks 逐字节片段向量化提取；
+        bulk_decode 的向量化解码与 predicate 的批量判断共用。需要 NumPy。
+        """
+        if np is None:
+            raise RuntimeError("向量化解码需要 NumPy")
+        val = np.zeros(m.shape[0], dtype=np.uint64)
+        for b, src_shift, width, dst_shift, rev in self.chunks:
+            bits = (m[:, b] >> np.uint8(src_shift)) & np.uint8((1 << width) - 1)
+            if rev:
+                bits = _REV_NP[width][bits]
+            val |= bits.astype(np.uint64) << np.uint64(dst_shift)
+        return val
+
+    # --- 代码生成 ---
+    def raw_expr(self, var: str = 'p') -> str:
+        """返回从 var（bytes-like）中读取原始值的 Python 表达式。"""
+        if self.intel:
+            b0, b1 = self.first_byte, self.last_byte
+            shift = self.startbit - 8 * b0
+            if b0 == b1:
+                src = f"{var}[{b0}]"
+            else:
+                src = f"_fb({var}[{b0}:{b1 + 1}], 'little')"
+            if shift:
+                src = f"({src} >> {shift})"
+            if self.length == 8 * (b1 - b0 + 1):
+                return src
+            return f"({src} & {self.mask:#x})"
+        parts = []
+        for b, src_shift, width, dst_shift, _ in self.chunks:
+            e = f"{var}[{b}]"
+            if src_shift:
+                e = f"({e} >> {src_shift})"
+            if width < 8:
+                e = f"({e} & {(1 << width) - 1:#x})"
+            if width > 1:
+                e = f"_R{width}[{e}]"
+            if dst_shift:
+                e = f"({e} << {dst_shift})"
+            parts.append(e)
+        return parts[0] if len(parts) == 1 else "(" + " | ".join(parts) + ")"
+
+    @property
+    def physical_is_raw(self) -> bool:
+        """factor=1、offset=0（均为 int）时物理值就是原始值（非负整数）"""
+        f, o = self.factor, self.offset
+        return type(f) is int and f == 1 and type(o) is int and o == 0
+
+    def phys_expr(self, raw: str) -> str:
+        """与 eth_comm2 一致：physical = raw * factor + offset（保持原有的数值类型）"""
+        if self.physical_is_raw:
+            return raw
+        return f"({raw} * {self.factor!r} + {self.offset!r})"
+
+    # --- 直接计算（非热路径） ---
+    def read(self, buf) -> int:
+        val = 0
+        for b, src_shift, width, dst_shift, rev in self.chunks:
+            bits = (buf[b] >> src_shift) & ((1 << width) - 1)
+            if rev:
+                bits = _REV[width][bits]
+            val |= bits << dst_shift
+        return val
+
+    def to_physical(self, raw: int):
+        return raw * self.factor + self.offset
+
+    def to_raw(self, physical) -> int:
+        """物理值 → 原始值，校验规则与 eth_comm2.set_signal 一致"""
+        if self.factor == 0:
+            raise ValueError("sig_value_factor cannot be zero")
+        raw = (float(physical) - self.offset) / self.factor
+        if abs(raw - round(raw)) >= 1e-6:
+            raise ValueError(f"Computed raw_value ({raw}) is not an integer")
+        raw = int(round(raw))
+        if not (0 <= raw <= self.mask):
+            raise ValueError(f"Raw value {raw} out of range [0, {self.mask}]")
+        return raw
+
+    def write(self, buf, raw: int) -> None:
+        """把原始值写入 buf（bytearray / 可写 memoryview）的信号位，其它位保持不变"""
+        for b, src_shift, width, dst_shift, rev in self.chunks:
+            wmask = (1 << width) - 1
+            bits = (raw >> dst_shift) & wmask
+            if rev:
+                bits = _REV[width][bits]
+            buf[b] = (buf[b] & ~(wmask << src_shift) & 0xFF) | (bits << src_shift)
+
+
+class E2EGroup:
+    """
+    信号组的 E2E Profile 11 计算（与 eth_comm2._apply_e2e_for_groups 相同的规则），
+    但直接读取 payload 中的原始值，用于网关改写 / 回放等已有完整 payload 的场景。
+    """
+    __slots__ = ('name', 'dataid', 'members', 'counter', 'checksum', 'dataid_op', 'others')
+
+    def __init__(self, name: str, dataid: int, members: Iterable[str], ops: Dict[str, SignalOp]):
+        self.name = name
+        self.dataid = dataid
+        self.members = tuple(members)
+        self.counter: Optional[SignalOp] = None
+        self.checksum: Optional[SignalOp] = None
+        self.dataid_op: Optional[SignalOp] = None
+        others = []
+        for m in self.members:
+            if m.endswith('_UB'):
+                continue  # Update Bit 不参与保护数据
+            op = ops.get(m)
+            if 'Cntr' in m or 'Counter' in m:
+                self.counter = op
+            elif 'Chk' in m or 'Check' in m:
+                self.checksum = op
+            elif 'DataID' in m:
+                self.dataid_op = op
+            elif op is not None:
+                others.append(op)
+        if self.counter is None or self.checksum is None:
+            raise ValueError(f"signal group '{name}' 缺少 Counter / Checksum 信号")
+        self.others = tuple(others)
+
+    def compute_crc(self, buf) -> int:
+        cnt = self.counter.read(buf)
+        protected = [(((self.dataid >> 8) & 0x0F) << 4) | (cnt & 0x0F)]
+        for op in self.others:
+            protected.extend(op.read(buf).to_bytes((op.length + 7) // 8, 'little'))
+        return e2e.profile11_crc8(self.dataid, protected)
+
+    def apply(self, buf, counter: Optional[int] = None) -> int:
+        """（可选写入 counter 后）写 DataID 半字节与 CRC，返回 CRC"""
+        if counter is not None:
+            self.counter.write(buf, counter & self.counter.mask)
+        if self.dataid_op is not None:
+            self.dataid_op.write(buf, (self.dataid >> 8) & 0x0F)
+        crc = self.compute_crc(buf)
+        self.checksum.write(buf, crc)
+        return crc
+
+    def check(self, buf) -> bool:
+        """payload 中的 CRC 是否与内容一致"""
+        return self.checksum.read(buf) == self.compute_crc(buf)
+
+
+def _collect_signals(frame_cls) -> List[SignalOp]:
+    """与 eth_comm2.start_receiving 相同的信号收集规则（dir() 顺序、属性名回退）。"""
+    ops = []
+    for attr in dir(frame_cls):
+        if attr.startswith('__'):
+            continue
+        sig_cls = getattr(frame_cls, attr)
+        if not hasattr(sig_cls, 'sig_name'):
+            continue
+        name = getattr(sig_cls, 'sig_name')
+        startbit = getattr(sig_cls, 'sig_start_bit', getattr(sig_cls, 'startbit', None))
+        length = getattr(sig_cls, 'sig_length', getattr(sig_cls, 'length', None))
+        byteorder = getattr(sig_cls, 'sig_byteorder', "Intel")
+        if startbit is None or length is None or length <= 0:
+            continue
+        ops.append(SignalOp(sig_cls, name, int(startbit), int(length), byteorder))
+    return ops
+
+
+class CompiledFrame:
+    def __init__(self, frame_cls):
+        self.frame_cls = frame_cls
+        self.name = getattr(frame_cls, 'msg_name', frame_cls.__name__)
+        self.msg_id = getattr(frame_cls, 'msg_id', None)
+        self.msg_length = frame_cls.msg_length
+        self.signals: List[SignalOp] = _collect_signals(frame_cls)
+        self.ops: Dict[str, SignalOp] = {op.name: op for op in self.signals}
+        for op in self.signals:
+            if op.last_byte >= self.msg_length:
+                raise ValueError(f"signal '{op.name}' 超出报文长度 {self.msg_length}")
+        # 字节 → 信号索引：byte_index[i] 为占用第 i 字节的信号名（变化检测使用）
+        index: List[List[str]] = [[] for _ in range(self.msg_length)]
+        for op in self.signals:
+            for b in range(op.first_byte, op.last_byte + 1):
+                index[b].append(op.name)
+        self.byte_index: Tuple[Tuple[str, ...], ...] = tuple(tuple(names) for names in index)
+        # E2E：支持的信号组（目前为 PROFILE_11），以及信号 → 所属组
+        self.e2e_groups: Dict[str, E2EGroup] = {}
+        dataids = getattr(frame_cls, 'sig_group_dataid_dict', {})
+        profiles = getattr(frame_cls, 'e2e_profile_dict', {})
+        for gname, members in getattr(frame_cls, 'sig_group_dict', {}).items():
+            dataid = dataids.get(gname)
+            if dataid is None or profiles.get(gname) != 'PROFILE_11':
+                continue
+            try:
+                self.e2e_groups[gname] = E2EGroup(gname, dataid, members, self.ops)
+            except ValueError:
+                continue
+        self.groups_of: Dict[str, Tuple[str, ...]] = {}
+        for gname, group in self.e2e_groups.items():
+            for m in group.members:
+                self.groups_of[m] = self.groups_of.get(m, ()) + (gname,)
+        self._decoders: Dict[Tuple[Tuple[str, ...], bool], Callable] = {}
+        self.decode = self.make_decoder(None, physical=True)
+        self.decode_raw = self.make_decoder(None, physical=False)
+        self.decode_pair = self.make_pair_decoder(None)
+
+    def make_decoder(self, names: Optional[Iterable[str]] = None,
+                     physical: bool = True) -> Callable[[Any], Dict[str, Any]]:
+        """
+        生成只解码 names 中信号的函数 f(payload) -> dict（names=None 表示全部信号）。
+        payload 长度必须 >= msg_length（调用方负责截断/校验）。
+        """
+        if names is None:
+            ops = self.signals
+        else:
+            wanted = set(names)
+            unknown = wanted - set(self.ops)
+            if unknown:
+                raise KeyError(f"Signal(s) {sorted(unknown)} not found in frame definition")
+            ops = [op for op in self.signals if op.name in wanted]
+        key = (tuple(op.name for op in ops), physical)
+        fn = self._decoders.get(key)
+        if fn is not None:
+            return fn
+        items = []
+        for op in ops:
+            expr = op.raw_expr('p')
+            if physical:
+                expr = op.phys_expr(expr)
+            items.append(f"        {op.name!r}: {expr},")
+        src = "def _decode(p):\n    return {\n" + "\n".join(items) + "\n    }\n"
+        ns = {'_fb': int.from_bytes}
+        for n in range(2, 9):
+            ns[f'_R{n}'] = _REV[n]
+        exec(compile(src, f"<frame_codec {self.name}>", "exec"), ns)
+        fn = ns['_decode']
+        self._decoders[key] = fn
+        return fn
+
+    def make_pair_decoder(self, names: Optional[Iterable[str]] = None
+                          ) -> Callable[[Any], Tuple[Dict[str, Any], Dict[str, int]]]:
+        """
+        生成 f(payload) -> (物理值 dict, 原始值 dict)：每个信号只从 payload 取一次原始值，
+        物理值由原始值换算（与 decode 的结果一致），供同时需要两者的消费者（如共享内存信号表）使用。
+        """
+        if names is None:
+            ops = self.signals
+        else:
+            wanted = set(names)
+            unknown = wanted - set(self.ops)
+            if unknown:
+                raise KeyError(f"Signal(s) {sorted(unknown)} not found in frame definition")
+            ops = [op for op in self.signals if op.name in wanted]
+        key = (tuple(op.name for op in ops), 'pair')
+        fn = self._decoders.get(key)
+        if fn is not None:
+            return fn
+        lines = [f"    r{i} = {op.raw_expr('p')}" for i, op in enumerate(ops)]
+        phys = [f"        {op.name!r}: {op.phys_expr(f'r{i}')}," for i, op in enumerate(ops)]
+        raw = [f"        {op.name!r}: r{i}," for i, op in enumerate(ops)]
+        src = ("def _decode_pair(p):\n" + "".join(line + "\n" for line in lines)
+               + "    return {\n" + "\n".join(phys) + "\n    }, {\n" + "\n".join(raw) + "\n    }\n")
+        ns = {'_fb': int.from_bytes}
+        for n in range(2, 9):
+            ns[f'_R{n}'] = _REV[n]
+        exec(compile(src, f"<frame_codec {self.name} pair>", "exec"), ns)
+        fn = ns['_decode_pair']
+        self._decoders[key] = fn
+        return fn
+
+
+_compiled_cache: Dict[Any, CompiledFrame] = {}
+
+
+def compile_frame(frame_cls) -> CompiledFrame:
+    """编译帧类（带缓存，同一帧类只编译一次）。"""
+    cf = _compiled_cache.get(frame_cls)
+    if cf is None:
+        cf = CompiledFrame(frame_cls)
+        _compiled_cache[frame_cls] = cf
+    return cf
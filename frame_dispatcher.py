@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+# @Time: 2025/12/14 22:40
+# @Author: JackyYin
+# @Email: jackhuan@icloud.com
+# @File: frame_dispatcher.py
+
+"""
+单 socket 多帧分发器：一个 transport + 一个接收线程服务整个 ECU 的帧集合。
+
+EthECUCommunicator 每个实例只对应一个帧类，framer.strip_header 返回的 msg_id 被丢弃，
+因此每种帧都要单独的 socket 和线程。FrameDispatcher 持有 {msg_id: 编译后的帧解码器}，
+每个数据报用 framer.iter_pdus 遍历其中的全部 4+4 PDU（一个数据报可能装多帧），
+按 msg_id 做一次 dict 查找（O(1)）路由到对应帧，未注册的 msg_id 只计数、不解码。
+
+用法：
+    disp = FrameDispatcher(transport, Framer(mode="custom_4_4"))
+    disp.register(UDFrame_Z_204, on_z204)        # on_z204(parsed, raw_payload)
+    disp.register_on_change(UDFrame_Z_204, on_chg)  # on_chg(changed_signals, raw_payload)
+    disp.set_filter(UDFrame_Z_204, 'LVPwrSplyErrStsSts != 0')   # 解码前按原始字节过滤（见 predicate.py）
+    disp.start()
+    ...
+    disp.stats()   # {'routed': ..., 'unknown': ..., 'unknown_ids': {msg_id: count}, ...}
+"""
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from framer import Framer, PDUTruncatedError
+from frame_codec import compile_frame, CompiledFrame
+from change_detect import ChangeDetector
+from dup_filter import DuplicateFilter
+from predicate import compile_predicate, RawPredicate
+
+ReceiveCallback = Callable[[Dict[str, Any], bytes], None]
+
+
+class _Route:
+    __slots__ = ('compiled', 'msg_length', 'decode', 'callbacks', 'change_cbs', 'detector', 'where', 'count')
+
+    def __init__(self, compiled: CompiledFrame):
+        self.compiled = compiled
+        self.msg_length = compiled.msg_length
+        self.decode = compiled.decode
+        self.callbacks: List[ReceiveCallback] = []
+        # 变化回调共用一个按 msg_id 的检测器（保存该帧上一次的 payload）
+        self.change_cbs: List[ReceiveCallback] = []
+        self.detector: Optional[ChangeDetector] = None
+        self.where: Optional[RawPredicate] = None
+        self.count = 0
+
+
+class FrameDispatcher:
+    def __init__(self, transport, framer: Framer, duplicate_mode: str = "off"):
+        """
+        transport: 必须实现 start_receiving(callback)（UDPTransport / AFPacketTransport）
+        framer: 必须带 msg_id 的 framer（如 custom_4_4），"none" 模式无法按 ID 路由
+        duplicate_mode: "off" / "drop" / "notify"，与该 msg_id 上一帧 payload 相同的 PDU 不解码
+        """
+        if framer is None or framer.mode == "none":
+            raise ValueError("FrameDispatcher 需要能解析 msg_id 的 framer（例如 custom_4_4）")
+        self.transport = transport
+        self.framer = framer
+        self._routes: Dict[int, _Route] = {}
+        self._unknown_cbs: List[Callable[[int, bytes], None]] = []
+        self._lock = threading.Lock()
+        self._dup_filter: Optional[DuplicateFilter] = None
+        if duplicate_mode != "off":
+            self._dup_filter = DuplicateFilter(duplicate_mode)
+
+        # 统计（仅由接收线程更新）
+        self._unknown_ids: Dict[int, int] = {}
+        self._unknown = 0
+        self._routed = 0
+        self._header_errors = 0
+        self._short_frames = 0
+        self._truncated = 0
+        self._filtered = 0
+
+    # --- 注册 ---
+    def register(self, frame_cls, callback: Optional[ReceiveCallback] = None) -> CompiledFrame:
+        """注册帧类（以 frame_cls.msg_id 为路由键），可同时注册一个回调。"""
+        compiled = compile_frame(frame_cls)
+        if compiled.msg_id is None:
+            raise ValueError(f"frame class {frame_cls.__name__} 没有 msg_id，无法路由")
+        with self._lock:
+            route = self._routes.get(compiled.msg_id)
+            if route is None:
+                route = _Route(compiled)
+            elif route.compiled is not compiled:
+                raise ValueError(f"msg_id 0x{compiled.msg_id:X} 已注册为 {route.compiled.name}")
+            # 写时复制：接收线程读到的总是完整的 dict
+            routes = dict(self._routes)
+            routes[compiled.msg_id] = route
+            self._routes = routes
+        if callback is not None:
+            self.register_on_receive(compiled.msg_id, callback)
+        return compiled
+
+    def unregister(self, frame_or_msg_id):
+        msg_id = self._msg_id_of(frame_or_msg_id)
+        with self._lock:
+            routes = dict(self._routes)
+            routes.pop(msg_id, None)
+            self._routes = routes
+
+    def register_on_receive(self, frame_or_msg_id, callback: ReceiveCallback):
+        if not callable(callback):
+            raise ValueError("callback must be callable")
+        msg_id = self._msg_id_of(frame_or_msg_id)
+        route = self._routes.get(msg_id)
+        if route is None:
+            raise KeyError(f"msg_id 0x{msg_id:X} 尚未 register()")
+        with self._lock:
+            route.callbacks = route.callbacks + [callback]
+
+    def unregister_on_receive(self, frame_or_msg_id, callback: ReceiveCallback):
+        route = self._routes.get(self._msg_id_of(frame_or_msg_id))
+        if route is None:
+            return
+        with self._lock:
+            route.callbacks = [cb for cb in route.callbacks if cb is not callback]
+
+    def register_on_change(self, frame_or_msg_id, callback: ReceiveCallback):
+        """变化回调 callback(changed, raw_payload)：只包含相对该 msg_id 上一帧变化的信号"""
+        if not callable(callback):
+            raise ValueError("callback must be callable")
+        msg_id = self._msg_id_of(frame_or_msg_id)
+        route = self._routes.get(msg_id)
+        if route is None:
+            raise KeyError(f"msg_id 0x{msg_id:X} 尚未 register()")
+        with self._lock:
+            if route.detector is None:
+                route.detector = ChangeDetector(route.compiled)
+            route.change_cbs = route.change_cbs + [callback]
+
+    def unregister_on_change(self, frame_or_msg_id, callback: ReceiveCallback):
+        route = self._routes.get(self._msg_id_of(frame_or_msg_id))
+        if route is None:
+            return
+        with self._lock:
+            route.change_cbs = [cb for cb in route.change_cbs if cb is not callback]
+
+    def set_filter(self, frame_or_msg_id, expr: Optional[str]) -> Optional[RawPredicate]:
+        """
+        该帧只有满足 expr（如 'CrsCtrlOvrdnReq == 1'，见 predicate.py）的 PDU 才解码并回调，
+        判断直接在原始 payload 上进行；expr=None 取消过滤。被过滤的 PDU 也不参与变化检测。
+        """
+        msg_id = self._msg_id_of(frame_or_msg_id)
+        route = self._routes.get(msg_id)
+        if route is None:
+            raise KeyError(f"msg_id 0x{msg_id:X} 尚未 register()")
+        where = None if expr is None else compile_predicate(expr, route.compiled.frame_cls)
+        route.where = where
+        return where
+
+    def register_on_unknown(self, callback: Callable[[int, bytes], None]):
+        """未注册 msg_id 的数据回调 callback(msg_id, payload)（可用于抓取未知帧）。"""
+        self._unknown_cbs.append(callback)
+
+    def register_on_repeat(self, callback: Callable[[int, int], None]):
+        """重复 PDU 通知 callback(msg_id, repeat_count)（需 duplicate_mode="notify"）"""
+        if self._dup_filter is None:
+            raise RuntimeError("duplicate filter is off; pass duplicate_mode='notify'")
+        self._dup_filter.register_on_repeat(callback)
+
+    @staticmethod
+    def _msg_id_of(frame_or_msg_id) -> int:
+        if isinstance(frame_or_msg_id, int):
+            return frame_or_msg_id
+        return getattr(frame_or_msg_id, 'msg_id')
+
+    # --- 生命周期 ---
+    def start(self):
+        self.transport.start_receiving(self._on_datagram)
+
+    def stop(self):
+        if hasattr(self.transport, 'stop'):
+            self.transport.stop()
+
+    # --- 接收路径 ---
+    def _on_datagram(self, raw: bytes):
+        try:
+            for msg_id, payload in self.framer.iter_pdus(raw):
+                self._route(msg_id, payload)
+        except PDUTruncatedError:
+            # 完整的 PDU 已经路由，只丢弃末尾不完整的部分
+            self._truncated += 1
+        except Exception:
+            self._header_errors += 1
+
+    def _route(self, msg_id: int, payload):
+        route = self._routes.get(msg_id)
+        if route is None:
+            self._unknown += 1
+            self._unknown_ids[msg_id] = self._unknown_ids.get(msg_id, 0) + 1
+            for cb in self._unknown_cbs:
+                try:
+                    cb(msg_id, bytes(payload))
+                except Exception:
+                    pass
+            return
+        if len(payload) < route.msg_length:
+            self._short_frames += 1
+            return
+        payload = payload[:route.msg_length]
+        dup = self._dup_filter
+        if dup is not None and dup.check(msg_id, payload):
+            return
+        where = route.where
+        if where is not None and not where(payload):
+            self._filtered += 1
+            return
+        payload = bytes(payload)
+        route.count += 1
+        self._routed += 1
+        callbacks = route.callbacks
+        if callbacks:
+            parsed = route.decode(payload)
+            for cb in callbacks:
+                try:
+                    cb(parsed, payload)
+                except Exception:
+                    pass
+        change_cbs = route.change_cbs
+        if change_cbs:
+            changed = route.detector.update(payload)
+            if changed is None:
+                return
+            for cb in change_cbs:
+                try:
+                    cb(changed, payload)
+                except Exception:
+                    pass
+
+    # --- 统计 ---
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'routed': self._routed,
+            'per_msg_id': {mid: r.count for mid, r in self._routes.items()},
+            'unknown': self._unknown,
+            'unknown_ids': dict(self._unknown_ids),
+            'header_errors': self._header_errors,
+            'short_frames': self._short_frames,
+            'truncated': self._truncated,
+            'filtered': self._filtered,
+            'duplicates': 0 if self._dup_filter is None else self._dup_filter.duplicates,
+        }
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+# @Time: 2025/12/16 22:30
+# @Author: JackyYin
+# @Email: jackhuan@icloud.com
+# @File: frame_registry.py
+
+"""
+帧类按需加载注册表。
+
+完整的整车矩阵可能包含上千个帧类（每个帧类又嵌套几十个信号类），全部在 import 时定义
+会让启动时间和常驻内存都很大。FrameRegistry：
+- 索引：用 ast 解析帧定义源文件（只解析、不执行），记录顶层 class 的名字、
+  msg_id 以及所在文件与行范围（含装饰器）；
+- 加载：第一次 get(name) / get_by_msg_id(msg_id) 时只编译执行该 class 对应的源码片段，结果缓存。
+  片段在该文件的命名空间中执行：命名空间先执行一次文件的顶层 import / 函数定义 / 赋值，
+  因此帧类可以使用同文件定义的装饰器、常量与导入的名字。
+
+约定：帧类不能引用同文件的其它帧类（它们按需加载，未必已定义）；依赖帧类的顶层赋值
+（如 ALL_FRAMES = [...]）在准备命名空间时跳过。
+"""
+import ast
+import glob
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# 准备命名空间时执行的顶层语句（class 与其它语句如 if __name__ == '__main__' 不执行）
+_PRELUDE_TYPES = (ast.Import, ast.ImportFrom, ast.FunctionDef, ast.AsyncFunctionDef,
+                  ast.Assign, ast.AnnAssign)
+
+
+class FrameSource:
+    """帧类的源码位置：path 中第 start..end 行（1 起始，含 end）。"""
+    __slots__ = ('name', 'msg_id', 'path', 'start', 'end')
+
+    def __init__(self, name: str, msg_id: Optional[int], path: str, start: int, end: int):
+        self.name = name
+        self.msg_id = msg_id
+        self.path = path
+        self.start = start
+        self.end = end
+
+    def __repr__(self):
+        mid = 'None' if self.msg_id is None else f'0x{self.msg_id:X}'
+        return f"FrameSource({self.name}, msg_id={mid}, {self.path}:{self.start}-{self.end})"
+
+
+class FrameRegistry:
+    def __init__(self, module_name: str = 'frames'):
+        self.module_name = module_name
+        self._sources: Dict[str, FrameSource] = {}
+        self._by_msg_id: Dict[int, str] = {}
+        self._loaded: Dict[str, type] = {}
+        self._preludes: Dict[str, List[Tuple[int, int]]] = {}  # path -> 顶层非 class 语句的行范围
+        self._namespaces: Dict[str, Dict[str, Any]] = {}  # path -> 已准备好的命名空间
+        self._lock = threading.RLock()
+
+    # --- 索引 ---
+    def index_file(self, path: str) -> List[str]:
+        """解析一个源文件，登记其中的顶层 class，返回登记的类名列表。"""
+        path = os.path.abspath(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            tree = ast.parse(f.read(), filename=path)
+
+        names = []
+        with self._lock:
+            prelude = []
+            for node in tree.body:
+                if isinstance(node, _PRELUDE_TYPES):
+                    start = min([d.lineno for d in getattr(node, 'decorator_list', ())] + [node.lineno])
+                    prelude.append((start, node.end_lineno))
+                if not isinstance(node, ast.ClassDef):
+                    continue
+                # 行范围从第一个装饰器开始，到 class 体最后一行结束
+                start = min([d.lineno for d in node.decorator_list] + [node.lineno])
+                msg_id = _class_msg_id(node)
+                self._sources[node.name] = FrameSource(node.name, msg_id, path, start, node.end_lineno)
+                if msg_id is not None:
+                    self._by_msg_id[msg_id] = node.name
+                names.append(node.name)
+            self._preludes[path] = prelude
+            self._namespaces.pop(path, None)
+        return names
+
+    def index_dir(self, directory: str, pattern: str = '*.py') -> List[str]:
+        """扫描目录下所有匹配 pattern 的源文件（不递归）。"""
+        names = []
+        for path in sorted(glob.glob(os.path.join(directory, pattern))):
+            if os.path.basename(path) == '__init__.py':
+                continue
+            names.extend(self.index_file(path))
+        return names
+
+    def register_class(self, frame_cls) -> None:
+        """登记一个已定义的帧类（例如模块中直接定义的帧），使其也能按 msg_id 查找。"""
+        with self._lock:
+            self._loaded[frame_cls.__name__] = frame_cls
+            msg_id = getattr(frame_cls, 'msg_id', None)
+            if msg_id is not None:
+                self._by_msg_id.setdefault(msg_id, frame_cls.__name__)
+
+    # --- 查询 ---
+    def names(self) -> List[str]:
+        return sorted(set(self._sources) | set(self._loaded))
+
+    def msg_ids(self) -> List[int]:
+        return sorted(self._by_msg_id)
+
+    def source_of(self, name: str) -> Optional[FrameSource]:
+        return self._sources.get(name)
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._loaded
+
+    def __contains__(self, name) -> bool:
+        return name in self._sources or name in self._loaded
+
+    def __len__(self) -> int:
+        return len(set(self._sources) | set(self._loaded))
+
+    # --- 加载 ---
+    def get(self, name: str) -> type:
+        """按类名返回帧类，首次访问时才编译加载。找不到时抛 KeyError。"""
+        cls = self._loaded.get(name)
+        if cls is not None:
+            return cls
+        with self._lock:
+            cls = self._loaded.get(name)
+            if cls is not None:
+                return cls
+            src = self._sources.get(name)
+            if src is None:
+                raise KeyError(f"Frame class '{name}' not found in registry")
+            cls = self._load(src)
+            self._loaded[name] = cls
+            return cls
+
+    def get_by_msg_id(self, msg_id: int) -> type:
+        name = self._by_msg_id.get(msg_id)
+        if name is None:
+            raise KeyError(f"No frame class registered for msg_id 0x{msg_id:X}")
+        return self.get(name)
+
+    def _namespace(self, path: str, lines: List[str]) -> Dict[str, Any]:
+        """该文件的命名空间：首次使用时逐条执行顶层 import / 函数定义 / 赋值"""
+        ns = self._namespaces.get(path)
+        if ns is not None:
+            return ns
+        ns = {'__name__': self.module_name, '__file__': path}
+        for start, end in self._preludes.get(path, ()):
+            try:
+                exec(_compile_lines(lines, start, end, path), ns)
+            except NameError:
+                # 引用了帧类（或文件中更靠后的名字）的语句：跳过
+                pass
+        self._namespaces[path] = ns
+        return ns
+
+    def _load(self, src: FrameSource) -> type:
+        with open(src.path, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+        ns = self._namespace(src.path, lines)
+        exec(_compile_lines(lines, src.start, src.end, src.path), ns)
+        cls = ns.get(src.name)
+        if cls is None:
+            raise KeyError(f"Frame class '{src.name}' not defined by {src.path}:{src.start}-{src.end}")
+        return cls
+
+
+def _compile_lines(lines: List[str], start: int, end: int, path: str):
+    """编译 lines 中第 start..end 行（1 起始）；行号补齐，保证异常回溯中的行号与源文件一致"""
+    code = '\n' * (start - 1) + ''.join(lines[start - 1:end])
+    return compile(code, path, 'exec')
+
+
+def _class_msg_id(node: ast.ClassDef) -> Optional[int]:
+    """class 体中直接赋值的 msg_id（须为字面量整数），否则 None"""
+    for stmt in node.body:
+        if isinstance(stmt, ast.Assign):
+            targets, value = stmt.targets, stmt.value
+        elif isinstance(stmt, ast.AnnAssign) and stmt.value is not None:
+            targets, value = [stmt.target], stmt.value
+        else:
+            continue
+        if any(isinstance(t, ast.Name) and t.id == 'msg_id' for t in targets):
+            try:
+                msg_id = ast.literal_eval(value)
+            except ValueError:
+                return None
+            return msg_id if isinstance(msg_id, int) else None
+    return None
+
+
+def default_search_dirs(base_dir: str, env_var: str = 'ETH_FRAME_PATH') -> Iterable[str]:
+    """
+    默认的帧定义目录：base_dir/frames，以及环境变量 env_var 中（os.pathsep 分隔）列出的目录。
+    """
+    dirs = [os.path.join(base_dir, 'frames')]
+    extra = os.environ.get(env_var)
+    if extra:
+        dirs.extend(d for d in extra.split(os.pathsep) if d)
+    return [d for d in dirs if os.path.isdir(d)]
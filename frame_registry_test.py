@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# @Time: 2026/01/02 11:05
+# @Author: JackyYin
+# @Email: jackhuan@icloud.com
+# @File: frame_registry_test.py
+
+"""
+frame_registry 的测试：类的行范围包含装饰器与顶格的多行字符串，按需加载与 msg_id 查找，
+装饰器 / 常量 / import 等同文件的顶层名字在加载时可用。
+
+运行：python -m pytest frame_registry_test.py  或  python frame_registry_test.py
+"""
+import os
+import tempfile
+
+from frame_registry import FrameRegistry
+
+_SOURCE = '''\
+# 帧定义
+def tag(cls):
+    cls.tagged = True
+    return cls
+
+
+@tag
+class Frame_A:
+    msg_id = 0x101
+    msg_length = 8
+    note = """
+顶格的多行字符串
+"""
+
+    class SigA:
+        sig_name = 'SigA'
+        sig_value_factor = FACTOR
+
+
+import math
+FACTOR = 0.5
+
+
+class Frame_B:
+    msg_id: int = 0x202
+    msg_length = 4
+    pi = round(math.pi, 2)
+
+
+ALL_FRAMES = [Frame_A, Frame_B]
+'''
+
+
+def test_class_extents_and_lazy_load():
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'frames_a.py')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(_SOURCE)
+        reg = FrameRegistry(module_name='frames_test')
+        assert reg.index_file(path) == ['Frame_A', 'Frame_B']
+        assert reg.msg_ids() == [0x101, 0x202]
+
+        src = reg.source_of('Frame_A')
+        assert (src.start, src.end) == (7, 17)
+        assert not reg.is_loaded('Frame_A')
+
+        b = reg.get_by_msg_id(0x202)
+        assert b.__name__ == 'Frame_B' and b.msg_length == 4 and b.pi == 3.14
+        assert not reg.is_loaded('Frame_A')
+
+        # 装饰器与常量定义在同一文件中
+        a = reg.get('Frame_A')
+        assert a.tagged is True
+        assert a.SigA.sig_value_factor == 0.5
+        assert a.__module__ == 'frames_test'
+
+
+if __name__ == '__main__':
+    test_class_extents_and_lazy_load()
+    print('ok')
@@ -10,8 +10,24 @@
 - "none"：无封装，add_header 返回原 payload，strip_header 返回 (None, frame)
 - "custom_4_4"：自定义格式：4 字节 ID + 4 字节 length + payload
     - ID 和 length 的字节序可配置（'little' 或 'big'）
+    - 一个 UDP 数据报中可连续存放多个 4+4 PDU（容器），用 iter_pdus 逐个遍历
 """
-from typing import Optional, Tuple
+import struct
+from typing import Iterator, Optional, Tuple
+
+
+class PDUTruncatedError(ValueError):
+    """数据报末尾的 PDU 不完整（header 不足 8 字节或声明长度超出剩余数据）。"""
+    def __init__(self, offset: int, declared: Optional[int], available: int):
+        self.offset = offset
+        self.declared = declared
+        self.available = available
+        if declared is None:
+            msg = f"truncated PDU header at offset {offset}: only {available} bytes left"
+        else:
+            msg = f"truncated PDU at offset {offset}: declared length {declared} > available {available}"
+        super().__init__(msg)
+
 
 class Framer:
     def __init__(self, mode: str = "none", id_endian: str = "big", len_endian: str = "big"):
@@ -27,6 +43,8 @@ class Framer:
             raise ValueError("len_endian must be 'little' or 'big'")
         self.id_endian = id_endian
         self.len_endian = len_endian
+        self._id_struct = struct.Struct('>I' if id_endian == 'big' else '<I')
+        self._len_struct = struct.Struct('>I' if len_endian == 'big' else '<I')
 
     def add_header(self, payload: bytes, msg_id: Optional[int] = None) -> bytes:
         """
@@ -44,6 +62,51 @@ class Framer:
             return id_bytes + length_bytes + payload
         raise NotImplementedError(f"Unsupported framer mode: {self.mode}")
 
+    def pack_into(self, buf: bytearray, offset: int, payload, msg_id: Optional[int] = None) -> int:
+        """
+        把 header + payload 直接写入 buf[offset:]（struct.pack_into，不产生中间 bytes），返回写入后的偏移。
+        用于把多个 PDU 依次写进同一个可复用的发送缓冲区。
+        """
+        n = len(payload)
+        if self.mode == "none":
+            buf[offset:offset + n] = payload
+            return offset + n
+        if self.mode == "custom_4_4":
+            if msg_id is None:
+                raise ValueError("msg_id must be provided for custom_4_4 framer")
+            self._id_struct.pack_into(buf, offset, int(msg_id))
+            self._len_struct.pack_into(buf, offset + 4, n)
+            buf[offset + 8:offset + 8 + n] = payload
+            return offset + 8 + n
+        raise NotImplementedError(f"Unsupported framer mode: {self.mode}")
+
+    def make_header_buffer(self) -> bytearray:
+        """为调用方预分配一个 header 缓冲区（配合 header_into 重复使用）"""
+        return bytearray(self.header_size())
+
+    def header_into(self, buf: bytearray, msg_id: Optional[int], payload_length: int, offset: int = 0) -> None:
+        """
+        只把 header 写入 buf[offset:offset+8]（不拷贝 payload），
+        用于 header 与 payload 作为两段 iovec 分别交给 sendmsg 的发送路径。
+        """
+        if self.mode == "none":
+            return
+        if self.mode == "custom_4_4":
+            if msg_id is None:
+                raise ValueError("msg_id must be provided for custom_4_4 framer")
+            self._id_struct.pack_into(buf, offset, int(msg_id))
+            self._len_struct.pack_into(buf, offset + 4, payload_length)
+            return
+        raise NotImplementedError(f"Unsupported framer mode: {self.mode}")
+
+    def header_size(self) -> int:
+        """header 字节数（none 为 0，custom_4_4 为 8）"""
+        if self.mode == "none":
+            return 0
+        if self.mode == "custom_4_4":
+            return 8
+        raise NotImplementedError(f"Unsupported framer mode: {self.mode}")
+
     def strip_header(self, frame: bytes) -> Tuple[Optional[int], bytes]:
         """
         从 frame 中剥离 header 并返回 (msg_id_or_None, payload_bytes)。
@@ -64,4 +127,41 @@ class Framer:
                 raise ValueError(f"Declared payload length {payload_length} > actual {len(payload)}")
             payload = payload[:payload_length]
             return msg_id, payload
-        raise NotImplementedError(f"Unsupported framer mode: {self.mode}")
\ No newline at end of file
+        raise NotImplementedError(f"Unsupported framer mode: {self.mode}")
+
+    def iter_pdus(self, datagram) -> Iterator[Tuple[Optional[int], memoryview]]:
+        """
+        遍历数据报中连续存放的全部 PDU，逐个产出 (msg_id, payload_memoryview)，不复制数据。
+        - mode == "none"：整个数据报作为一个 PDU，产出 (None, memoryview(datagram))。
+        - mode == "custom_4_4"：按 4+4 header 依次解析；末尾全 0 的字节视为填充（如 AF_PACKET
+          补齐到最小帧长）直接结束；末尾 PDU 不完整时，在产出前面所有完整 PDU 之后抛出 PDUTruncatedError。
+        注意：产出的 memoryview 引用原数据报，需要长期保存时请自行 bytes(...) 复制。
+        """
+        mv = memoryview(datagram)
+        if mv.format != 'B' or mv.ndim != 1:
+            mv = mv.cast('B')
+        if self.mode == "none":
+            yield None, mv
+            return
+        if self.mode != "custom_4_4":
+            raise NotImplementedError(f"Unsupported framer mode: {self.mode}")
+        unpack_id = self._id_struct.unpack_from
+        unpack_len = self._len_struct.unpack_from
+        total = len(mv)
+        off = 0
+        while off < total:
+            remaining = total - off
+            if remaining < 8:
+                if not any(mv[off:]):
+                    return
+                raise PDUTruncatedError(off, None, remaining)
+            msg_id = unpack_id(mv, off)[0]
+            length = unpack_len(mv, off + 4)[0]
+            if msg_id == 0 and length == 0 and not any(mv[off:]):
+                return
+            start = off + 8
+            end = start + length
+            if end > total:
+                raise PDUTruncatedError(off, length, total - start)
+            yield msg_id, mv[start:end]
+            off = end
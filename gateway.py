@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+# @Time: 2025/12/19 21:20
+# @Author: JackyYin
+# @Email: jackhuan@icloud.com
+# @File: gateway.py
+
+"""
+网关：把输入 transport 收到的帧转发到输出 transport，可按 msg_id 改写部分信号（台架桥接）。
+
+- 不解码整帧：改写直接在原始 payload 上按编译好的字节/移位/掩码写入（SignalOp.write）；
+- 只对被改写信号所属的 E2E 组重写 DataID 半字节并重算 CRC（E2EGroup.apply），
+  Counter 沿用输入帧的值；若改写的正是该组的 Checksum（故障注入），则不重算该组；
+- 数据报内没有需要改写的 PDU 时原样转发（不复制）；需要改写时整个数据报只复制一次到 bytearray，
+  所有 PDU 原地改写后一次 send 发出，容器数据报中的多个 PDU 保持在同一个数据报里。
+
+用法：
+    gw = FrameGateway(UDPTransport(...), AFPacketTransport(...), Framer(mode="custom_4_4"))
+    gw.set_override(UDFrame_Z_204, 'CrsCtrlOvrdnReq', 1)
+    gw.start()
+"""
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from framer import Framer, PDUTruncatedError
+from frame_codec import compile_frame, CompiledFrame, E2EGroup, SignalOp
+
+
+class _Rewrite:
+    """单个 msg_id 的改写计划：[(SignalOp, raw)] + 需要重算的 E2E 组"""
+    __slots__ = ('compiled', 'msg_length', 'overrides', 'writes', 'groups')
+
+    def __init__(self, compiled: CompiledFrame, overrides: Dict[str, int]):
+        self.compiled = compiled
+        self.msg_length = compiled.msg_length
+        self.overrides = overrides
+        self.writes: Tuple[Tuple[SignalOp, int], ...] = tuple(
+            (compiled.ops[name], raw) for name, raw in overrides.items()
+        )
+        touched = []
+        for name in overrides:
+            for gname in compiled.groups_of.get(name, ()):
+                if gname not in touched:
+                    touched.append(gname)
+        groups = []
+        for gname in touched:
+            group = compiled.e2e_groups[gname]
+            if group.checksum.name in overrides:
+                continue  # 显式改写 CRC：保持用户给定的值
+            groups.append(group)
+        self.groups: Tuple[E2EGroup, ...] = tuple(groups)
+
+    def apply(self, buf) -> None:
+        for op, raw in self.writes:
+            op.write(buf, raw)
+        for group in self.groups:
+            group.apply(buf)
+
+
+class FrameGateway:
+    def __init__(self, input_transport, output_transport, framer: Framer,
+                 forward_unknown: bool = True):
+        """
+        input_transport: 实现 start_receiving(callback)
+        output_transport: 实现 send(bytes-like)
+        framer: 带 msg_id 的 framer（如 custom_4_4），用于定位数据报中的各个 PDU
+        forward_unknown: False 时只转发至少包含一个已配置改写规则 msg_id 的数据报
+        """
+        if framer is None or framer.mode == "none":
+            raise ValueError("FrameGateway 需要能解析 msg_id 的 framer（例如 custom_4_4）")
+        self.input = input_transport
+        self.output = output_transport
+        self.framer = framer
+        self.forward_unknown = forward_unknown
+        self._hdr = framer.header_size()
+        self._rules: Dict[int, _Rewrite] = {}
+        self._lock = threading.Lock()
+
+        # 统计（仅由接收线程更新）
+        self.datagrams = 0
+        self.forwarded = 0
+        self.passthrough = 0
+        self.rewritten_pdus = 0
+        self.e2e_recomputed = 0
+        self.dropped = 0
+        self.errors = 0
+
+    # --- 改写规则 ---
+    def set_override(self, frame_cls, signal_name: str, value, raw: bool = False):
+        """
+        转发 frame_cls 时把 signal_name 固定为 value（默认物理值，raw=True 表示原始值）。
+        """
+        compiled = compile_frame(frame_cls)
+        if compiled.msg_id is None:
+            raise ValueError(f"frame class {frame_cls.__name__} 没有 msg_id，无法匹配")
+        op = compiled.ops.get(signal_name)
+        if op is None:
+            raise KeyError(f"Signal '{signal_name}' not found in frame definition")
+        if raw:
+            raw_value = int(value)
+            if not (0 <= raw_value <= op.mask):
+                raise ValueError(f"Raw value {raw_value} out of range [0, {op.mask}]")
+        else:
+            raw_value = op.to_raw(value)
+        with self._lock:
+            rule = self._rules.get(compiled.msg_id)
+            overrides = dict(rule.overrides) if rule is not None else {}
+            overrides[signal_name] = raw_value
+            self._replace_rule(compiled.msg_id, _Rewrite(compiled, overrides))
+
+    def clear_override(self, frame_or_msg_id, signal_name: Optional[str] = None):
+        """清除某个信号（signal_name=None 时为该帧全部）的改写规则"""
+        msg_id = frame_or_msg_id if isinstance(frame_or_msg_id, int) else frame_or_msg_id.msg_id
+        with self._lock:
+            rule = self._rules.get(msg_id)
+            if rule is None:
+                return
+            overrides = {} if signal_name is None else {
+                k: v for k, v in rule.overrides.items() if k != signal_name}
+            self._replace_rule(msg_id, _Rewrite(rule.compiled, overrides) if overrides else None)
+
+    def overrides(self) -> Dict[int, Dict[str, int]]:
+        return {mid: dict(rule.overrides) for mid, rule in self._rules.items()}
+
+    def _replace_rule(self, msg_id: int, rule: Optional[_Rewrite]):
+        # 写时复制：接收线程读到的总是完整的 dict
+        rules = dict(self._rules)
+        if rule is None:
+            rules.pop(msg_id, None)
+        else:
+            rules[msg_id] = rule
+        self._rules = rules
+
+    # --- 生命周期 ---
+    def start(self):
+        self.input.start_receiving(self._on_datagram)
+
+    def stop(self):
+        if hasattr(self.input, 'stop'):
+            self.input.stop()
+
+    # --- 转发路径 ---
+    def _on_datagram(self, raw):
+        self.datagrams += 1
+        rules = self._rules
+        if not rules:
+            if self.forward_unknown:
+                self._send(raw)
+                self.passthrough += 1
+            else:
+                self.dropped += 1
+            return
+
+        # 先只定位需要改写的 PDU（payload 起始偏移），不复制
+        hits = []
+        hdr = self._hdr
+        off = 0
+        try:
+            for msg_id, payload in self.framer.iter_pdus(raw):
+                rule = rules.get(msg_id)
+                if rule is not None and len(payload) >= rule.msg_length:
+                    hits.append((off + hdr, rule))
+                off += hdr + len(payload)
+        except PDUTruncatedError:
+            pass  # 不完整的尾部原样转发，只改写前面完整的 PDU
+        except Exception:
+            self.errors += 1
+            return
+
+        if not hits:
+            if self.forward_unknown:
+                self._send(raw)
+                self.passthrough += 1
+            else:
+                self.dropped += 1
+            return
+
+        buf = bytearray(raw)
+        view = memoryview(buf)
+        for start, rule in hits:
+            rule.apply(view[start:start + rule.msg_length])
+            self.e2e_recomputed += len(rule.groups)
+        self.rewritten_pdus += len(hits)
+        self._send(view)
+
+    def _send(self, data):
+        try:
+            self.output.send(data)
+            self.forwarded += 1
+        except Exception:
+            self.errors += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'datagrams': self.datagrams,
+            'forwarded': self.forwarded,
+            'passthrough': self.passthrough,
+            'rewritten_pdus': self.rewritten_pdus,
+            'e2e_recomputed': self.e2e_recomputed,
+            'dropped': self.dropped,
+            'errors': self.errors,
+        }
@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+# @Time: 2025/12/22 20:45
+# @Author: JackyYin
+# @Email: jackhuan@icloud.com
+# @File: pcap_recorder.py
+
+"""
+收发帧记录器：把 transport 上每一帧（TX 与 RX）写成 tcpdump / Wireshark 可读的 pcap 或 pcapng。
+
+- I/O 线程只做一次 deque.append（transport.tap 回调），不做格式化、不写文件、不唤醒写线程；
+- 后台写线程每 flush_interval 秒取走全部待写记录，在内存中拼成一个大块，一次 write 写入
+  （文件本身也按 block_size 缓冲）；
+- 时间戳：RX 使用内核时间戳（SO_TIMESTAMPNS，由 transport.enable_kernel_timestamps() 打开），
+  TX 使用发送前的 time.time_ns()；pcap 使用纳秒精度格式，pcapng 在接口块中声明 if_tsresol=9；
+- UDP transport 只有应用层数据，写入时补上虚拟的 以太/IPv4/UDP 头（端口取 transport 的地址），
+  AF_PACKET transport 直接写完整以太帧；
+- 按大小（max_bytes）或时长（max_seconds）轮转文件：name.pcap → name_0000.pcap, name_0001.pcap ...
+- transport 只有一个 tap 属性，install_tap / remove_tap 把多个记录者串联起来
+  （例如同时挂 PcapRecorder 与 flight_recorder.FlightRecorder）；write_capture() 一次写出一批记录。
+
+用法：
+    rec = PcapRecorder('bench.pcapng', fmt='pcapng', max_bytes=512 << 20)
+    rec.attach(transport)      # 可多次调用，记录多个 transport
+    rec.start()
+    ...
+    rec.stop()
+"""
+import collections
+import os
+import socket
+import struct
+import threading
+import time
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+LINKTYPE_ETHERNET = 1
+
+_PCAP_MAGIC_NS = 0xA1B23C4D
+_PCAP_GLOBAL = struct.Struct('<IHHiIII')
+_PCAP_RECORD = struct.Struct('<IIII')
+
+_PCAPNG_SHB = struct.Struct('<IIIHHqI')
+_PCAPNG_IDB = struct.Struct('<IIHHIHHB3xHHI')
+_PCAPNG_EPB_HEAD = struct.Struct('<IIIIIII')
+_PCAPNG_EPB_TAIL = struct.Struct('<HHIHHI')
+_EPB_FLAGS = {'rx': 1, 'tx': 2}   # epb_flags 低 2 位：1 = inbound, 2 = outbound
+
+_ETH_IPV4 = struct.Struct('!6s6sH')
+_IPV4 = struct.Struct('!BBHHHBBH4s4s')
+_UDP = struct.Struct('!HHHH')
+_MAC_LOCAL = b'\x02\x00\x00\x00\x00\x01'
+_MAC_REMOTE = b'\x02\x00\x00\x00\x00\x02'
+
+FORMATS = ("pcap", "pcapng")
+
+
+def _ipv4_checksum(header: bytes) -> int:
+    total = sum(struct.unpack('!10H', header))
+    while total >> 16:
+        total = (total & 0xFFFF) + (total >> 16)
+    return ~total & 0xFFFF
+
+
+def _addr(addr) -> Tuple[bytes, int]:
+    host, port = addr[0], addr[1]
+    try:
+        ip = socket.inet_aton(host)
+    except OSError:
+        ip = socket.inet_aton('0.0.0.0')
+    return ip, int(port)
+
+
+def wrap_udp(data: bytes, src, dst, src_mac: bytes = _MAC_LOCAL, dst_mac: bytes = _MAC_REMOTE) -> bytes:
+    """给 UDP 载荷补上虚拟的 以太 + IPv4 + UDP 头（UDP 校验和置 0，表示未计算）"""
+    src_ip, src_port = _addr(src)
+    dst_ip, dst_port = _addr(dst)
+    udp_len = 8 + len(data)
+    ip = _IPV4.pack(0x45, 0, 20 + udp_len, 0, 0x4000, 64, socket.IPPROTO_UDP, 0, src_ip, dst_ip)
+    ip = ip[:10] + struct.pack('!H', _ipv4_checksum(ip)) + ip[12:]
+    return b''.join((_ETH_IPV4.pack(dst_mac, src_mac, 0x0800), ip,
+                     _UDP.pack(src_port, dst_port, udp_len, 0), data))
+
+
+class TapSource:
+    """一个被记录的 transport：决定如何把 tap 收到的数据变成以太帧"""
+    __slots__ = ('udp', 'local', 'remote')
+
+    def __init__(self, transport):
+        # ProcessRxTransport 等包装对象：按被包装的 transport 判断类型与地址
+        transport = getattr(transport, 'transport', transport)
+        self.udp = not hasattr(transport, 'dst_mac_bytes')
+        self.local = getattr(transport, 'local_addr', None)
+        self.remote = getattr(transport, 'remote_addr', None)
+
+    def to_frame(self, direction: str, data: bytes, peer) -> bytes:
+        if not self.udp:
+            return data
+        local = self.local or ('0.0.0.0', 0)
+        if direction == 'tx':
+            return wrap_udp(data, local, self.remote or ('0.0.0.0', 0), _MAC_LOCAL, _MAC_REMOTE)
+        return wrap_udp(data, peer or self.remote or ('0.0.0.0', 0), local, _MAC_REMOTE, _MAC_LOCAL)
+
+
+class _TapLink:
+    """串联在 transport.tap 上的一环：先调用自己的 fn，再调用之前已挂上的 tap"""
+    __slots__ = ('fn', 'prev', 'active')
+
+    def __init__(self, fn: Callable, prev: Optional[Callable]):
+        self.fn = fn
+        self.prev = prev
+        self.active = True
+
+    def __call__(self, direction: str, ts_ns: int, data: bytes, peer=None):
+        if self.active:
+            self.fn(direction, ts_ns, data, peer)
+        prev = self.prev
+        if prev is not None:
+            prev(direction, ts_ns, data, peer)
+
+
+def install_tap(transport, fn: Callable) -> _TapLink:
+    """把 fn(direction, ts_ns, data, peer) 挂到 transport.tap 上，与已有的 tap 串联"""
+    link = _TapLink(fn, getattr(transport, 'tap', None))
+    transport.tap = link
+    return link
+
+
+def remove_tap(transport, link: _TapLink) -> None:
+    """摘下 install_tap 挂上的一环；其后又有别的 tap 挂上时只把这一环置为直通"""
+    link.active = False
+    if getattr(transport, 'tap', None) is link:
+        transport.tap = link.prev
+
+
+def file_header(fmt: str, snaplen: int = 65535) -> bytes:
+    """pcap 全局头（纳秒时间戳）或 pcapng 的 SHB + IDB"""
+    if fmt == "pcap":
+        return _PCAP_GLOBAL.pack(_PCAP_MAGIC_NS, 2, 4, 0, 0, snaplen, LINKTYPE_ETHERNET)
+    shb = _PCAPNG_SHB.pack(0x0A0D0D0A, 28, 0x1A2B3C4D, 1, 0, -1, 28)
+    # IDB：if_tsresol = 9（纳秒），随后 opt_endofopt
+    idb = _PCAPNG_IDB.pack(1, 32, LINKTYPE_ETHERNET, 0, snaplen, 9, 1, 9, 0, 0, 32)
+    return shb + idb
+
+
+def encode_record(fmt: str, ts_ns: int, direction: str, frame, snaplen: int = 65535,
+                  orig_len: Optional[int] = None) -> bytes:
+    """一条 pcap 记录 / pcapng EPB；orig_len 为截断前的原始长度（默认 len(frame)）"""
+    caplen = min(len(frame), snaplen)
+    if orig_len is None:
+        orig_len = len(frame)
+    if fmt == "pcap":
+        sec, nsec = divmod(ts_ns, 1_000_000_000)
+        return _PCAP_RECORD.pack(sec, nsec, caplen, orig_len) + bytes(frame[:caplen])
+    pad = (-caplen) & 3
+    total = _PCAPNG_EPB_HEAD.size + caplen + pad + _PCAPNG_EPB_TAIL.size
+    return b''.join((
+        _PCAPNG_EPB_HEAD.pack(6, total, 0, ts_ns >> 32, ts_ns & 0xFFFFFFFF, caplen, orig_len),
+        frame[:caplen], b'\x00' * pad,
+        _PCAPNG_EPB_TAIL.pack(2, 4, _EPB_FLAGS.get(direction, 0), 0, 0, total),
+    ))
+
+
+def write_capture(path: str, records: Iterable[Tuple[int, str, Any, int]], fmt: str = "pcap",
+                  snaplen: int = 65535) -> int:
+    """把 [(ts_ns, direction, 以太帧, 原始长度)] 一次写成一个文件，返回记录条数"""
+    if fmt not in FORMATS:
+        raise ValueError(f"fmt must be one of {FORMATS}")
+    chunk = bytearray(file_header(fmt, snaplen))
+    n = 0
+    for ts_ns, direction, frame, orig_len in records:
+        chunk += encode_record(fmt, ts_ns, direction, frame, snaplen, orig_len)
+        n += 1
+    with open(path, 'wb') as f:
+        f.write(chunk)
+    return n
+
+
+class PcapRecorder:
+    def __init__(self, path: str, fmt: str = "pcap", max_bytes: Optional[int] = None,
+                 max_seconds: Optional[float] = None, flush_interval: float = 0.5,
+                 block_size: int = 1 << 20, snaplen: int = 65535, max_pending: int = 1 << 20):
+        """
+        path: 输出文件；启用轮转时实际文件名为 <stem>_0000<ext>、<stem>_0001<ext> ...
+        fmt: "pcap"（纳秒时间戳）或 "pcapng"
+        max_bytes / max_seconds: 单个文件的大小 / 时长上限（None 表示不限制）
+        flush_interval: 写线程取走待写记录的周期（秒）
+        block_size: 文件写缓冲大小
+        max_pending: 待写记录上限，超过后新记录丢弃并计数（写盘跟不上时保护内存）
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"fmt must be one of {FORMATS}")
+        self.path = path
+        self.fmt = fmt
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.flush_interval = flush_interval
+        self.block_size = block_size
+        self.snaplen = snaplen
+        self.max_pending = max_pending
+        self._rotate = max_bytes is not None or max_seconds is not None
+        self._pending: Deque[Tuple[int, str, bytes, Any, TapSource]] = collections.deque()
+        self._attached: List[Tuple[Any, _TapLink]] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._file = None
+        self._file_bytes = 0
+        self._file_opened = 0.0
+        self._index = 0
+        self.files: List[str] = []
+
+        # 统计
+        self.records = 0
+        self.bytes_written = 0
+        self.dropped = 0
+
+    # --- 挂接 transport ---
+    def attach(self, transport) -> None:
+        """挂到 transport 上记录其全部收发（transport 需支持 tap 属性）"""
+        if any(t is transport for t, _ in self._attached):
+            return
+        source = TapSource(transport)
+        pending = self._pending
+        max_pending = self.max_pending
+
+        def tap(direction: str, ts_ns: int, data: bytes, peer=None):
+            if len(pending) >= max_pending:
+                self.dropped += 1
+                return
+            pending.append((ts_ns, direction, data, peer, source))
+
+        link = install_tap(transport, tap)
+        if hasattr(transport, 'enable_kernel_timestamps'):
+            try:
+                transport.enable_kernel_timestamps()
+            except OSError:
+                pass
+        self._attached.append((transport, link))
+
+    def detach(self, transport) -> None:
+        for t, link in self._attached:
+            if t is transport:
+                remove_tap(transport, link)
+        self._attached = [(t, link) for t, link in self._attached if t is not transport]
+
+    # --- 生命周期 ---
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._open_next()
+        self._thread = threading.Thread(target=self._loop, name="PcapRecorder-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        for t, _ in list(self._attached):
+            self.detach(t)
+        t = self._thread
+        if t is None:
+            return
+        self._stop.set()
+        t.join(timeout=timeout)
+        self._thread = None
+        self._drain()
+        self._close_file()
+
+    def _loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self._drain()
+            if self._rotate and self.max_seconds is not None and self._file_bytes > self._header_size() \
+                    and time.monotonic() - self._file_opened >= self.max_seconds:
+                self._open_next()
+
+    # --- 写文件 ---
+    def _drain(self):
+        pending = self._pending
+        if not pending or self._file is None:
+            return
+        chunk = bytearray()
+        popleft = pending.popleft
+        try:
+            while True:
+                ts_ns, direction, data, peer, source = popleft()
+                rec = self._encode(ts_ns, direction, source.to_frame(direction, data, peer))
+                if self._rotate and self._needs_rotation(len(chunk), len(rec)):
+                    self._write(chunk)
+                    chunk = bytearray()
+                    self._open_next()
+                chunk += rec
+                self.records += 1
+        except IndexError:
+            pass
+        self._write(chunk)
+        self._file.flush()
+
+    def _needs_rotation(self, buffered: int, extra: int) -> bool:
+        current = self._file_bytes + buffered
+        if current <= self._header_size():
+            return False  # 空文件至少写入一条记录
+        if self.max_bytes is not None and current + extra > self.max_bytes:
+            return True
+        if self.max_seconds is not None and time.monotonic() - self._file_opened >= self.max_seconds:
+            return True
+        return False
+
+    def _write(self, chunk):
+        if chunk:
+            self._file.write(chunk)
+            self._file_bytes += len(chunk)
+            self.bytes_written += len(chunk)
+
+    def _encode(self, ts_ns: int, direction: str, frame: bytes) -> bytes:
+        return encode_record(self.fmt, ts_ns, direction, frame, self.snaplen)
+
+    def _header(self) -> bytes:
+        return file_header(self.fmt, self.snaplen)
+
+    def _header_size(self) -> int:
+        return _PCAP_GLOBAL.size if self.fmt == "pcap" else 60
+
+    def _file_name(self) -> str:
+        if not self._rotate:
+            return self.path
+        stem, ext = os.path.splitext(self.path)
+        return f"{stem}_{self._index:04d}{ext}"
+
+    def _open_next(self):
+        self._close_file()
+        name = self._file_name()
+        self._index += 1
+        self._file = open(name, 'wb', buffering=self.block_size)
+        header = self._header()
+        self._file.write(header)
+        self._file_bytes = len(header)
+        self._file_opened = time.monotonic()
+        self.files.append(name)
+
+    def _close_file(self):
+        f = self._file
+        if f is not None:
+            self._file = None
+            try:
+                f.close()
+            except Exception:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'records': self.records,
+            'bytes': self.bytes_written,
+            'pending': len(self._pending),
+            'dropped': self.dropped,
+            'files': list(self.files),
+        }
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# @Time: 2026/01/02 16:50
+# @Author: JackyYin
+# @Email: jackhuan@icloud.com
+# @File: pcap_recorder_test.py
+
+"""
+pcap_recorder 的测试：记录的收发帧经 CaptureReader 读回（pcap / pcapng）、按大小轮转、
+install_tap / remove_tap 串联。
+
+运行：python -m pytest pcap_recorder_test.py  或  python pcap_recorder_test.py
+"""
+import os
+import tempfile
+
+from capture_reader import CaptureReader
+from framer import Framer
+from pcap_recorder import PcapRecorder, install_tap, remove_tap
+
+_T0_NS = 1_700_000_000_123_456_789
+
+
+class _FakeUDP:
+    """只有 tap 与地址属性的 UDP transport 替身"""
+    def __init__(self):
+        self.local_addr = ('127.0.0.1', 50000)
+        self.remote_addr = ('127.0.0.1', 50001)
+        self.tap = None
+
+
+def _record(path: str, fmt: str, n: int, **kwargs) -> PcapRecorder:
+    framer = Framer(mode='custom_4_4')
+    transport = _FakeUDP()
+    rec = PcapRecorder(path, fmt=fmt, flush_interval=0.01, **kwargs)
+    rec.attach(transport)
+    rec.start()
+    for i in range(n):
+        data = framer.add_header(bytes([i & 0xFF]) * 8, msg_id=0x94 + (i & 1))
+        if i & 1:
+            transport.tap('rx', _T0_NS + i * 1000, data, transport.remote_addr)
+        else:
+            transport.tap('tx', _T0_NS + i * 1000, data)
+    rec.stop()
+    assert transport.tap is None  # stop() 摘下自己挂的 tap
+    return rec
+
+
+def _check_roundtrip(fmt: str):
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'rec.' + fmt)
+        rec = _record(path, fmt, 100)
+        assert rec.records == 100 and rec.dropped == 0
+        with CaptureReader(path) as reader:
+            items = [(ts, msg_id, bytes(p)) for ts, msg_id, p in reader]
+        assert len(items) == 100
+        for i, (ts, msg_id, payload) in enumerate(items):
+            assert abs(ts - (_T0_NS + i * 1000) / 1e9) < 1e-6
+            assert msg_id == 0x94 + (i & 1)
+            assert payload == bytes([i & 0xFF]) * 8
+
+
+def test_roundtrip_pcap():
+    _check_roundtrip('pcap')
+
+
+def test_roundtrip_pcapng():
+    _check_roundtrip('pcapng')
+
+
+def test_rotation_by_size():
+    with tempfile.TemporaryDirectory() as d:
+        rec = _record(os.path.join(d, 'rot.pcap'), 'pcap', 200, max_bytes=4096)
+        assert len(rec.files) > 1
+        total = 0
+        for path in rec.files:
+            assert os.path.getsize(path) <= 4096
+            with CaptureReader(path) as reader:
+                total += sum(1 for _ in reader)
+        assert total == 200
+
+
+def test_install_remove_tap_chain():
+    transport = _FakeUDP()
+    seen = []
+    a = install_tap(transport, lambda *args: seen.append('a'))
+    b = install_tap(transport, lambda *args: seen.append('b'))
+    transport.tap('tx', 0, b'x')
+    assert seen == ['b', 'a']
+    # 摘下中间一环：只置为直通，后挂上的仍然有效
+    remove_tap(transport, a)
+    transport.tap('tx', 0, b'x')
+    assert seen == ['b', 'a', 'b']
+    remove_tap(transport, b)
+    assert transport.tap is a
+
+
+if __name__ == '__main__':
+    test_roundtrip_pcap()
+    test_roundtrip_pcapng()
+    test_rotation_by_size()
+    test_install_remove_tap_chain()
+    print('ok')
@@ -0,0 +1,564 @@
+# -*- coding: utf-8 -*-
+# @Time: 2025/12/29 21:10
+# @Author: JackyYin
+# @Email: jackhuan@icloud.com
+# @File: pipeline.py
+
+"""
+流式处理管线：数据源 → 去 header → E2E 校验 → 解码 → 过滤 → 输出，各级都是可组合的生成器。
+
+eth_comm2.start_receiving / FrameDispatcher 把这些步骤写死在一个回调闭包里，离线分析又要再写一遍。
+这里每一级都是 f(batches) -> batches：输入、输出都是批（list）的迭代器，
+批内的元素按所在位置有固定的形状：
+- 数据源：(ts, datagram)                  CaptureSource（抓包文件）/ TransportSource（实时 transport）
+- StripHeader：(ts, msg_id, payload)     一个数据报可拆出多个 PDU，payload 为 memoryview
+- E2ECheck：同上，丢弃（或只计数）CRC 不一致的 PDU
+- RawFilter(expr)：同上，解码前按原始字节过滤（见 predicate.py）
+- Decode：(ts, msg_id, payload, values)   payload 截断到 msg_length 并复制为 bytes，values 为解码 dict
+- Filter(pred) / Sink(fn)：形状不变
+以批为单位传递，每级每批只有一次生成器切换与一次方法调用；实时与离线使用同一组 stage。
+Stage 子类只需实现 process(batch) -> batch；任何 f(batches) -> batches 的生成器函数也可以直接作为一级。
+
+Pipeline.stats() 给出每级的批数、元素数与耗时（各级独占时间：该级 next() 的总耗时减去上游的耗时）。
+
+用法：
+    pipe = Pipeline(CaptureSource('day1.pcapng'),
+                    StripHeader(Framer(mode='custom_4_4')),
+                    E2ECheck([UDFrame_Z_204]),
+                    RawFilter('LVPwrSplyErrStsSts != 0', [UDFrame_Z_204]),
+                    Decode([UDFrame_Z_204]),
+                    Filter(lambda item: item[0] >= t0),
+                    Sink(print, per_item=True))
+    pipe.run()
+    pipe.stats()   # {'stages': [{'name': 'CaptureSource', 'batches': ..., 'out': ..., 'seconds': ...}, ...], ...}
+
+    # 实时：同一组 stage，数据源换成 transport（另一线程中 source.stop() 结束）
+    source = TransportSource(UDPTransport(('0.0.0.0', 12000), ('127.0.0.1', 12001)))
+    pipe = Pipeline(source, StripHeader(framer), Decode([UDFrame_Z_204]), Sink(on_batch))
+    threading.Thread(target=pipe.run, daemon=True).start()
+"""
+import abc
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from framer import Framer, PDUTruncatedError
+from frame_codec import compile_frame, CompiledFrame
+from capture_reader import CaptureReader
+from predicate import compile_predicate, RawPredicate, np
+
+Batch = List[tuple]
+StageFn = Callable[[Iterator[Batch]], Iterator[Batch]]
+
+
+# ---------- 数据源 ----------
+class CaptureSource:
+    def __init__(self, capture, batch_size: int = 256, **reader_kwargs):
+        """
+        capture: 抓包文件路径（由本对象打开 / 关闭 CaptureReader）或已打开的 CaptureReader
+        batch_size: 每批数据报数
+        reader_kwargs: 传给 CaptureReader（ethertype / udp_ports / fmt / period 等）
+        注意：产出的 datagram 是指向映射内存的 memoryview，遍历结束后由本对象打开的 reader 即关闭
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be >= 1")
+        self.capture = capture
+        self.batch_size = batch_size
+        self.reader_kwargs = reader_kwargs
+        self.name = 'CaptureSource'
+
+    def __iter__(self) -> Iterator[Batch]:
+        if isinstance(self.capture, CaptureReader):
+            yield from self._batches(self.capture)
+            return
+        with CaptureReader(self.capture, **self.reader_kwargs) as reader:
+            yield from self._batches(reader)
+
+    def _batches(self, reader: CaptureReader) -> Iterator[Batch]:
+        size = self.batch_size
+        batch: Batch = []
+        append = batch.append
+        for item in reader.iter_datagrams():
+            append(item)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+                append = batch.append
+        if batch:
+            yield batch
+
+
+class TransportSource:
+    def __init__(self, transport, batch_size: int = 256, max_delay: float = 0.01,
+                 max_queue: int = 65536):
+        """
+        transport: UDPTransport / AFPacketTransport / ProcessRxTransport（有 start_receiving_batch 时优先使用）
+        batch_size: 每批最多的数据报数
+        max_delay: 凑批的最长等待（秒）：有数据但不足一批时最多等这么久就交给下游
+        max_queue: 接收线程与管线之间排队的数据报上限，超出时丢弃新数据报并计数
+        接收线程只做入队；管线在调用 run() / 迭代的线程中执行，stop() 后迭代结束。
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be >= 1")
+        self.transport = transport
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.max_queue = max_queue
+        self.name = 'TransportSource'
+        self._queue: deque = deque()
+        self._event = threading.Event()
+        self._running = False
+        self._started = False
+
+        # 统计
+        self.received = 0
+        self.dropped = 0
+
+    # --- 接收线程 ---
+    def _on_datagram(self, data: bytes):
+        q = self._queue
+        if len(q) >= self.max_queue:
+            self.dropped += 1
+            return
+        # 与抓包 / ProcessRxTransport 批量接收一致：使用 transport 给出的接收时间戳
+        q.append((getattr(self.transport, 'rx_ts', 0.0) or time.time(), data))
+        self.received += 1
+        self._event.set()
+
+    def _on_batch(self, batch: List[tuple]):
+        q = self._queue
+        room = self.max_queue - len(q)
+        if room < len(batch):
+            self.dropped += len(batch) - max(room, 0)
+            batch = batch[:max(room, 0)]
+        q.extend(batch)
+        self.received += len(batch)
+        self._event.set()
+
+    # --- 生命周期 ---
+    def start(self):
+        if self._started:
+            return
+        self._started = True
+        self._running = True
+        if hasattr(self.transport, 'start_receiving_batch'):
+            self.transport.start_receiving_batch(self._on_batch)
+        else:
+            self.transport.start_receiving(self._on_datagram)
+
+    def stop(self):
+        """停止接收并结束迭代（可在其它线程调用）"""
+        self._running = False
+        self._event.set()
+        if self._started and hasattr(self.transport, 'stop'):
+            self.transport.stop()
+
+    def __iter__(self) -> Iterator[Batch]:
+        self.start()
+        q = self._queue
+        event = self._event
+        size = self.batch_size
+        while self._running or q:
+            if not q:
+                event.wait(0.2)
+                event.clear()
+                continue
+            if len(q) < size and self._running:
+                # 不足一批时再等一会儿，攒够或超时再交给下游
+                deadline = time.monotonic() + self.max_delay
+                while len(q) < size and self._running:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    event.wait(remaining)
+                    event.clear()
+            popleft = q.popleft
+            yield [popleft() for _ in range(min(size, len(q)))]
+
+    def stats(self) -> Dict[str, int]:
+        return {'received': self.received, 'dropped': self.dropped, 'queued': len(self._queue)}
+
+
+# ---------- 处理级 ----------
+class Stage(abc.ABC):
+    """以批为单位的处理级：子类实现 process(batch) -> batch（返回空批时不向下游传递）"""
+    def __init__(self):
+        self.name = type(self).__name__
+
+    @abc.abstractmethod
+    def process(self, batch: Batch) -> Batch:
+        ...
+
+    def __call__(self, batches: Iterator[Batch]) -> Iterator[Batch]:
+        process = self.process
+        for batch in batches:
+            out = process(batch)
+            if out:
+                yield out
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+def _frame_table(frames: Iterable) -> Dict[Optional[int], CompiledFrame]:
+    """{msg_id: CompiledFrame}；只有一个帧类时同时登记到 None（framer 为 "none" 模式时没有 msg_id）"""
+    table: Dict[Optional[int], CompiledFrame] = {}
+    for f in frames:
+        if isinstance(f, (int, str)):
+            from __init__ import get_frame_class
+            f = get_frame_class(f)
+        cf = compile_frame(f)
+        table[cf.msg_id] = cf
+    if not table:
+        raise ValueError("at least one frame class is required")
+    if len(table) == 1:
+        table[None] = next(iter(table.values()))
+    return table
+
+
+class StripHeader(Stage):
+    def __init__(self, framer: Optional[Framer] = None, msg_ids: Optional[Iterable[int]] = None):
+        """
+        (ts, datagram) → (ts, msg_id, payload)
+        framer: 默认 custom_4_4；msg_ids: 只保留这些 msg_id（None 表示全部）
+        """
+        super().__init__()
+        self.framer = framer if framer is not None else Framer(mode="custom_4_4")
+        self.msg_ids = None if msg_ids is None else frozenset(msg_ids)
+        self.truncated = 0
+        self.header_errors = 0
+
+    def process(self, batch: Batch) -> Batch:
+        iter_pdus = self.framer.iter_pdus
+        wanted = self.msg_ids
+        out: Batch = []
+        append = out.append
+        for ts, datagram in batch:
+            try:
+                for msg_id, payload in iter_pdus(datagram):
+                    if wanted is None or msg_id in wanted:
+                        append((ts, msg_id, payload))
+            except PDUTruncatedError:
+                self.truncated += 1
+            except Exception:
+                self.header_errors += 1
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        return {'truncated': self.truncated, 'header_errors': self.header_errors}
+
+
+class E2ECheck(Stage):
+    def __init__(self, frames: Iterable, drop: bool = True):
+        """
+        (ts, msg_id, payload) 按帧类的 E2E 信号组校验 CRC（见 frame_codec.E2EGroup.check）
+        drop: True 丢弃校验失败的 PDU；False 只计数、原样传递
+        未登记的 msg_id、没有 E2E 组的帧类与短帧原样传递（交给 Decode 处理）
+        """
+        super().__init__()
+        self.drop = drop
+        self._groups: Dict[Optional[int], tuple] = {}
+        self._lengths: Dict[Optional[int], int] = {}
+        for msg_id, cf in _frame_table(frames).items():
+            if cf.e2e_groups:
+                self._groups[msg_id] = tuple(cf.e2e_groups.values())
+                self._lengths[msg_id] = cf.msg_length
+        self.checked = 0
+        self.failed = 0
+        self.failed_groups: Dict[str, int] = {}
+
+    def process(self, batch: Batch) -> Batch:
+        table = self._groups
+        lengths = self._lengths
+        drop = self.drop
+        out: Batch = []
+        append = out.append
+        for item in batch:
+            groups = table.get(item[1])
+            if groups is None or len(item[2]) < lengths[item[1]]:
+                append(item)
+                continue
+            self.checked += 1
+            ok = True
+            for group in groups:
+                if not group.check(item[2]):
+                    ok = False
+                    self.failed_groups[group.name] = self.failed_groups.get(group.name, 0) + 1
+            if not ok:
+                self.failed += 1
+                if drop:
+                    continue
+            append(item)
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        return {'checked': self.checked, 'failed': self.failed, 'failed_groups': dict(self.failed_groups)}
+
+
+class RawFilter(Stage):
+    def __init__(self, expr: str, frames: Iterable, vectorize: bool = True, vector_min: int = 64):
+        """
+        (ts, msg_id, payload) 只保留满足 expr（如 'CrsCtrlOvrdnReq == 1'）的 PDU，判断不解码。
+        expr 按每个帧类的布局分别编译，没有所引用信号的帧类及未登记的 msg_id 全部丢弃。
+        vectorize: 安装了 NumPy 且一批中某个 msg_id 至少 vector_min 个 PDU 时按批向量化判断
+        """
+        super().__init__()
+        self.expr = expr
+        self.vectorize = vectorize and np is not None
+        self.vector_min = vector_min
+        self._preds: Dict[Optional[int], RawPredicate] = {}
+        compiled: Dict[int, RawPredicate] = {}
+        error = None
+        for msg_id, cf in _frame_table(frames).items():
+            pred = compiled.get(id(cf))
+            if pred is None:
+                try:
+                    pred = compiled[id(cf)] = compile_predicate(expr, cf.frame_cls)
+                except KeyError as e:
+                    error = e
+                    continue
+            self._preds[msg_id] = pred
+        if not self._preds:
+            raise error
+        self.passed = 0
+        self.filtered = 0
+
+    def process(self, batch: Batch) -> Batch:
+        preds = self._preds
+        if not self.vectorize or len(batch) < self.vector_min:
+            out = []
+            append = out.append
+            for item in batch:
+                pred = preds.get(item[1])
+                if pred is not None and pred(item[2]):
+                    append(item)
+        else:
+            # 按 msg_id 分组，每组一次向量化判断，再按原顺序输出
+            groups: Dict[Optional[int], List[int]] = {}
+            for i, item in enumerate(batch):
+                groups.setdefault(item[1], []).append(i)
+            keep: List[int] = []
+            for msg_id, idx in groups.items():
+                pred = preds.get(msg_id)
+                if pred is None:
+                    continue
+                if len(idx) < self.vector_min:
+                    keep.extend(i for i in idx if pred(batch[i][2]))
+                    continue
+                hits = pred.select([batch[i][2] for i in idx])
+                keep.extend(idx[j] for j in hits)
+            if len(groups) > 1:
+                keep.sort()
+            out = [batch[i] for i in keep]
+        self.passed += len(out)
+        self.filtered += len(batch) - len(out)
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        return {'passed': self.passed, 'filtered': self.filtered}
+
+
+class Decode(Stage):
+    def __init__(self, frames: Iterable, signals: Optional[Iterable[str]] = None, physical: bool = True):
+        """
+        (ts, msg_id, payload) → (ts, msg_id, payload_bytes, values)
+        frames: 帧类（或类名 / msg_id）；未登记的 msg_id 与短帧丢弃并计数
+        signals: 只解码这些信号（各帧类取自己拥有的部分）；None 表示全部
+        physical: False 时输出原始值
+        """
+        super().__init__()
+        table = _frame_table(frames)
+        wanted = None if signals is None else list(signals)
+        if wanted is not None:
+            known = set()
+            for cf in table.values():
+                known.update(cf.ops)
+            unknown = set(wanted) - known
+            if unknown:
+                raise KeyError(f"Signal(s) {sorted(unknown)} not found in frame definition")
+        self._routes: Dict[Optional[int], tuple] = {}
+        for msg_id, cf in table.items():
+            names = None if wanted is None else [n for n in wanted if n in cf.ops]
+            self._routes[msg_id] = (cf.msg_length, cf.make_decoder(names, physical))
+        self.decoded = 0
+        self.unknown = 0
+        self.short_frames = 0
+
+    def process(self, batch: Batch) -> Batch:
+        routes = self._routes
+        out: Batch = []
+        append = out.append
+        for item in batch:
+            route = routes.get(item[1])
+            if route is None:
+                self.unknown += 1
+                continue
+            length, decode = route
+            payload = item[2]
+            if len(payload) < length:
+                self.short_frames += 1
+                continue
+            payload = bytes(payload[:length])
+            append((item[0], item[1], payload, decode(payload)))
+        self.decoded += len(out)
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        return {'decoded': self.decoded, 'unknown': self.unknown, 'short_frames': self.short_frames}
+
+
+class Filter(Stage):
+    def __init__(self, predicate: Callable[[tuple], bool]):
+        """只保留 predicate(item) 为真的元素（item 形状取决于所在位置，见模块说明）"""
+        super().__init__()
+        self.predicate = predicate
+
+    def process(self, batch: Batch) -> Batch:
+        pred = self.predicate
+        return [item for item in batch if pred(item)]
+
+
+class Sink(Stage):
+    def __init__(self, fn: Callable, per_item: bool = False):
+        """
+        调用 fn(batch)（per_item=True 时逐个 fn(item)），批原样传给下游。
+        fn 抛出的异常被吞掉并计数，不影响管线。
+        """
+        super().__init__()
+        self.fn = fn
+        self.per_item = per_item
+        self.errors = 0
+
+    def process(self, batch: Batch) -> Batch:
+        fn = self.fn
+        if self.per_item:
+            for item in batch:
+                try:
+                    fn(item)
+                except Exception:
+                    self.errors += 1
+        else:
+            try:
+                fn(batch)
+            except Exception:
+                self.errors += 1
+        return batch
+
+    def stats(self) -> Dict[str, Any]:
+        return {'errors': self.errors}
+
+
+# ---------- 管线 ----------
+class _Timer:
+    """包住某一级的输出迭代器，累计 next() 的耗时（含上游）与产出的批数 / 元素数"""
+    __slots__ = ('name', 'stage', 'seconds', 'batches', 'items')
+
+    def __init__(self, name: str, stage):
+        self.name = name
+        self.stage = stage
+        self.seconds = 0.0
+        self.batches = 0
+        self.items = 0
+
+    def wrap(self, it: Iterator[Batch]) -> Iterator[Batch]:
+        clock = time.perf_counter
+        nxt = iter(it).__next__
+        while True:
+            t0 = clock()
+            try:
+                batch = nxt()
+            except StopIteration:
+                self.seconds += clock() - t0
+                return
+            self.seconds += clock() - t0
+            self.batches += 1
+            self.items += len(batch)
+            yield batch
+
+
+class Pipeline:
+    def __init__(self, source: Iterable[Batch], *stages: StageFn):
+        """
+        source: 产出批的可迭代对象（CaptureSource / TransportSource 或任意批的迭代器）
+        stages: Stage 实例或任意 f(batches) -> batches 的生成器函数，按顺序串联
+        """
+        self.source = source
+        self.stages = list(stages)
+        self._timers: List[_Timer] = []
+        self._elapsed = 0.0
+
+    @staticmethod
+    def _name_of(obj) -> str:
+        name = getattr(obj, 'name', None)
+        if isinstance(name, str):
+            return name
+        return getattr(obj, '__name__', type(obj).__name__)
+
+    def __iter__(self) -> Iterator[Batch]:
+        """按批产出最后一级的输出（每次迭代重新串联各级并清零计时）"""
+        timer = _Timer(self._name_of(self.source), self.source)
+        timers = [timer]
+        it = timer.wrap(self.source)
+        for stage in self.stages:
+            timer = _Timer(self._name_of(stage), stage)
+            timers.append(timer)
+            it = timer.wrap(stage(it))
+        self._timers = timers
+        self._elapsed = 0.0
+        t0 = time.perf_counter()
+        try:
+            yield from it
+        finally:
+            self._elapsed = time.perf_counter() - t0
+
+    def items(self) -> Iterator[tuple]:
+        """逐个产出最后一级输出的元素"""
+        for batch in self:
+            yield from batch
+
+    def run(self, limit: Optional[int] = None) -> int:
+        """运行到数据源结束（或最后一级累计输出 limit 个元素），返回输出的元素数"""
+        total = 0
+        it = iter(self)
+        try:
+            for batch in it:
+                total += len(batch)
+                if limit is not None and total >= limit:
+                    break
+        finally:
+            it.close()
+        return total
+
+    def stop(self):
+        """停止实时数据源（TransportSource）；其它数据源忽略"""
+        stop = getattr(self.source, 'stop', None)
+        if stop is not None:
+            stop()
+
+    def stats(self) -> Dict[str, Any]:
+        """各级的批数 / 输入输出元素数 / 独占耗时（秒）/ 每元素微秒，以及该级自己的计数"""
+        stages = []
+        upstream_seconds = 0.0
+        upstream_items = None
+        for timer in self._timers:
+            own = max(0.0, timer.seconds - upstream_seconds)
+            n = upstream_items if upstream_items is not None else timer.items
+            entry = {
+                'name': timer.name,
+                'batches': timer.batches,
+                'in': upstream_items,
+                'out': timer.items,
+                'seconds': own,
+                'us_per_item': own * 1e6 / n if n else 0.0,
+            }
+            extra = getattr(timer.stage, 'stats', None)
+            if callable(extra):
+                try:
+                    entry.update(extra())
+                except Exception:
+                    pass
+            stages.append(entry)
+            upstream_seconds = timer.seconds
+            upstream_items = timer.items
+        return {'stages': stages, 'elapsed': self._elapsed}
@@ -0,0 +1,379 @@
+# -*- coding: utf-8 -*-
+# @Time: 2025/12/30 21:00
+# @Author: JackyYin
+# @Email: jackhuan@icloud.com
+# @File: predicate.py
+
+"""
+原始字节上的帧过滤条件：按信号名写的小表达式，编译成对 payload 的 字节偏移 / 掩码 / 比较，不解码。
+
+只关心 CrsCtrlOvrdnReq == 1 或 LVPwrSplyErrStsSts != 0 的帧时，先解码整帧再判断太浪费。
+compile_predicate(expr, frame_cls) 按帧布局（frame_codec.SignalOp 的逐字节片段）编译：
+- 信号 == / != 常量：常量在编译时换算成各字节的 (掩码, 期望值)（Motorola 片段预先位反转），
+  运行时只有 (p[b] & M) == V，整字节连续的部分合并为一次切片比较 p[a:b] == b'..'；
+- 信号 < / <= / > / >= 常量、信号 in (常量, ...)：取出该信号的原始值再比较；
+- 常量是物理值，编译时按 factor / offset 换算到原始值域（无法取到的值直接折叠成 True / False）；
+- 支持 and / or / not、括号、链式比较（0 < Sig <= 3），单独写信号名表示 Sig != 0。
+payload 短于所引用信号的最后一个字节时结果为 False。
+
+批量模式 mask(payloads) 一次判断一批 payload：安装了 NumPy 时把整批拼成 (行, 字节) 矩阵，
+按列做同样的掩码 / 比较（向量化），否则逐个调用编译出的函数。
+
+用法：
+    pred = compile_predicate('CrsCtrlOvrdnReq == 1 or LVPwrSplyErrStsSts != 0', UDFrame_Z_204)
+    if pred(payload):                       # 单帧
+        parsed = cf.decode(payload)
+    keep = pred.mask(payloads)              # 一批：NumPy bool 数组或 list[bool]
+
+    # 实时：disp.set_filter(UDFrame_Z_204, 'LVPwrSplyErrStsSts != 0')；pipeline.RawFilter(expr, frames)
+    # 抓包：bulk_decode(paths, where='CrsCtrlOvrdnReq == 1') / python bulk_decode.py --where ...
+"""
+import ast
+import math
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from frame_codec import compile_frame, SignalOp, _REV
+
+try:
+    import numpy as np
+except ImportError:  # 没有 NumPy 时 mask() 逐个判断
+    np = None
+
+_CMP_OPS = {ast.Eq: '==', ast.NotEq: '!=', ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>', ast.GtE: '>='}
+# 比较方向反转：常量写在左边（3 < Sig → Sig > 3），或 factor < 0（物理值与原始值大小关系相反）
+_MIRROR = {'==': '==', '!=': '!=', '<': '>', '<=': '>=', '>': '<', '>=': '<='}
+_NEGATE = {'==': '!=', '!=': '==', '<': '>=', '<=': '>', '>': '<=', '>=': '<'}
+
+# 中间表示：
+#   ('const', bool)
+#   ('cmp', SignalOp, op, raw)      op 为 _CMP_OPS 中的比较符，raw 为原始值域内的整数
+#   ('in', SignalOp, frozenset)     原始值属于该集合
+#   ('not', node) / ('and', [node, ...]) / ('or', [node, ...])
+Node = tuple
+
+
+class _Compiler:
+    def __init__(self, frame_cls, expr: str):
+        self.cf = compile_frame(frame_cls)
+        self.expr = expr
+        self.signals: List[str] = []
+
+    def error(self, node, msg: str):
+        col = getattr(node, 'col_offset', None)
+        where = f" (col {col})" if col is not None else ""
+        return ValueError(f"predicate {self.expr!r}: {msg}{where}")
+
+    # --- 解析 ---
+    def parse(self) -> Node:
+        try:
+            tree = ast.parse(self.expr.strip(), mode='eval')
+        except SyntaxError as e:
+            raise ValueError(f"predicate {self.expr!r}: {e.msg}") from None
+        return self.node(tree.body)
+
+    def signal(self, node) -> SignalOp:
+        op = self.cf.ops.get(node.id)
+        if op is None:
+            raise KeyError(f"Signal '{node.id}' not found in frame definition")
+        if node.id not in self.signals:
+            self.signals.append(node.id)
+        return op
+
+    def constant(self, node):
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return node.value
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            v = self.constant(node.operand)
+            return -v if isinstance(node.op, ast.USub) else v
+        raise self.error(node, "只能与数值常量比较")
+
+    def node(self, node) -> Node:
+        if isinstance(node, ast.BoolOp):
+            kind = 'and' if isinstance(node.op, ast.And) else 'or'
+            return (kind, [self.node(v) for v in node.values])
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            return ('not', self.node(node.operand))
+        if isinstance(node, ast.Name):
+            return self.compare(self.signal(node), '!=', 0)
+        if isinstance(node, ast.Constant) and isinstance(node.value, (bool, int)):
+            return ('const', bool(node.value))
+        if isinstance(node, ast.Compare):
+            parts = []
+            left = node.left
+            for op, right in zip(node.ops, node.comparators):
+                parts.append(self.comparison(left, op, right))
+                left = right
+            return parts[0] if len(parts) == 1 else ('and', parts)
+        raise self.error(node, f"不支持的表达式 {type(node).__name__}")
+
+    def comparison(self, left, op, right) -> Node:
+        if isinstance(op, (ast.In, ast.NotIn)):
+            if not isinstance(left, ast.Name):
+                raise self.error(left, "in 的左边必须是信号名")
+            if not isinstance(right, (ast.Tuple, ast.List, ast.Set)):
+                raise self.error(right, "in 的右边必须是常量元组 / 列表 / 集合")
+            node = self.membership(self.signal(left), [self.constant(e) for e in right.elts])
+            return ('not', node) if isinstance(op, ast.NotIn) else node
+        sym = _CMP_OPS.get(type(op))
+        if sym is None:
+            raise self.error(left, f"不支持的比较 {type(op).__name__}")
+        if isinstance(left, ast.Name) and not isinstance(right, ast.Name):
+            return self.compare(self.signal(left), sym, self.constant(right))
+        if isinstance(right, ast.Name) and not isinstance(left, ast.Name):
+            return self.compare(self.signal(right), _MIRROR[sym], self.constant(left))
+        raise self.error(left, "比较的一边必须是信号名、另一边是常量")
+
+    # --- 物理值常量 → 原始值域 ---
+    @staticmethod
+    def compare(sig: SignalOp, sym: str, value) -> Node:
+        factor, offset = sig.factor, sig.offset
+        if factor == 0:
+            phys = offset
+            return ('const', {'==': phys == value, '!=': phys != value, '<': phys < value,
+                              '<=': phys <= value, '>': phys > value, '>=': phys >= value}[sym])
+        if sig.physical_is_raw:
+            t = value
+        else:
+            t = (value - offset) / factor
+            if factor < 0:
+                sym = _MIRROR[sym]
+        near = round(t)
+        integral = abs(t - near) < 1e-6
+        if integral:
+            t = int(near)
+        hi = sig.mask
+        if sym in ('==', '!='):
+            if not integral or not 0 <= t <= hi:
+                return ('const', sym == '!=')
+            return ('cmp', sig, sym, t)
+        # 统一成 raw < k 或 raw >= k（k 为整数）
+        if sym in ('<', '>='):
+            k = t if integral else math.ceil(t)
+        else:
+            k = t + 1 if integral else math.floor(t) + 1
+            sym = '<' if sym == '<=' else '>='
+        if k <= 0:
+            return ('const', sym == '>=')
+        if k > hi:
+            return ('const', sym == '<')
+        return ('cmp', sig, sym, k)
+
+    @staticmethod
+    def membership(sig: SignalOp, values: Sequence) -> Node:
+        raws = set()
+        for v in values:
+            node = _Compiler.compare(sig, '==', v)
+            if node[0] == 'cmp':
+                raws.add(node[3])
+        if not raws:
+            return ('const', False)
+        if len(raws) == 1:
+            return ('cmp', sig, '==', raws.pop())
+        return ('in', sig, frozenset(raws))
+
+
+def _fold(node: Node) -> Node:
+    """常量折叠：and / or / not 中已确定的分支"""
+    kind = node[0]
+    if kind == 'not':
+        inner = _fold(node[1])
+        if inner[0] == 'const':
+            return ('const', not inner[1])
+        if inner[0] == 'cmp' and inner[2] in ('==', '!='):
+            return ('cmp', inner[1], _NEGATE[inner[2]], inner[3])
+        return ('not', inner)
+    if kind in ('and', 'or'):
+        absorbing = kind == 'or'     # or 中出现 True / and 中出现 False 时整体确定
+        items = []
+        for child in node[1]:
+            child = _fold(child)
+            if child[0] == 'const':
+                if child[1] == absorbing:
+                    return child
+                continue
+            items.append(child)
+        if not items:
+            return ('const', not absorbing)
+        return items[0] if len(items) == 1 else (kind, items)
+    return node
+
+
+def _byte_checks(sig: SignalOp, raw: int) -> List[Tuple[int, int, int]]:
+    """raw == 常量 展开成按字节排序的 [(byte, mask, value)]"""
+    merged: Dict[int, List[int]] = {}
+    for b, src_shift, width, dst_shift, rev in sig.chunks:
+        wmask = (1 << width) - 1
+        bits = (raw >> dst_shift) & wmask
+        if rev:
+            bits = _REV[width][bits]
+        entry = merged.setdefault(b, [0, 0])
+        entry[0] |= wmask << src_shift
+        entry[1] |= bits << src_shift
+    return [(b, m, v) for b, (m, v) in sorted(merged.items())]
+
+
+class _CodeGen:
+    """把中间表示生成为 Python 源码：scalar 针对单个 payload p，vector 针对 uint8 矩阵 m"""
+    def __init__(self):
+        self.consts: List[Any] = []
+        self.raw_cols: Dict[str, int] = {}
+        self.raw_ops: List[SignalOp] = []
+
+    def const(self, value) -> str:
+        self.consts.append(value)
+        return f"_K[{len(self.consts) - 1}]"
+
+    def scalar(self, node: Node) -> str:
+        kind = node[0]
+        if kind == 'const':
+            return repr(node[1])
+        if kind == 'not':
+            return f"(not {self.scalar(node[1])})"
+        if kind in ('and', 'or'):
+            return "(" + f" {kind} ".join(self.scalar(c) for c in node[1]) + ")"
+        sig = node[1]
+        if kind == 'in':
+            return f"({sig.raw_expr('p')} in {self.const(node[2])})"
+        _, sig, sym, raw = node
+        if sym not in ('==', '!='):
+            return f"({sig.raw_expr('p')} {sym} {raw})"
+        terms = []
+        checks = _byte_checks(sig, raw)
+        i = 0
+        while i < len(checks):
+            # 连续的整字节合并为一次切片比较
+            j = i
+            while j + 1 < len(checks) and checks[j + 1][0] == checks[j][0] + 1 and checks[j + 1][1] == 0xFF:
+                j += 1
+            b, m, v = checks[i]
+            if j > i and m == 0xFF:
+                value = bytes(c[2] for c in checks[i:j + 1])
+                terms.append(f"p[{b}:{checks[j][0] + 1}] == {value!r}")
+                i = j + 1
+                continue
+            terms.append(f"p[{b}] == {v:#x}" if m == 0xFF else f"(p[{b}] & {m:#x}) == {v:#x}")
+            i += 1
+        expr = " and ".join(terms)
+        if sym == '==':
+            return f"({expr})"
+        return f"(not ({expr}))"
+
+    def raw_col(self, sig: SignalOp) -> str:
+        i = self.raw_cols.get(sig.name)
+        if i is None:
+            i = self.raw_cols[sig.name] = len(self.raw_ops)
+            self.raw_ops.append(sig)
+        return f"_r{i}"
+
+    def vector(self, node: Node) -> str:
+        kind = node[0]
+        if kind == 'const':
+            return f"_np.full(m.shape[0], {node[1]!r})"
+        if kind == 'not':
+            return f"(~{self.vector(node[1])})"
+        if kind in ('and', 'or'):
+            sep = ' & ' if kind == 'and' else ' | '
+            return "(" + sep.join(self.vector(c) for c in node[1]) + ")"
+        if kind == 'in':
+            values = self.const(np.array(sorted(node[2]), dtype=np.uint64))
+            return f"_np.isin({self.raw_col(node[1])}, {values})"
+        _, sig, sym, raw = node
+        if sym not in ('==', '!='):
+            return f"({self.raw_col(sig)} {sym} {raw})"
+        terms = [f"(m[:, {b}] == {v:#x})" if m == 0xFF else f"((m[:, {b}] & {m:#x}) == {v:#x})"
+                 for b, m, v in _byte_checks(sig, raw)]
+        expr = terms[0] if len(terms) == 1 else "(" + " & ".join(terms) + ")"
+        return expr if sym == '==' else f"(~{expr})"
+
+
+class RawPredicate:
+    def __init__(self, frame_cls, expr: str):
+        compiler = _Compiler(frame_cls, expr)
+        tree = _fold(compiler.parse())
+        self.expr = expr
+        self.frame_cls = frame_cls
+        self.signals: Tuple[str, ...] = tuple(compiler.signals)
+        ops = compiler.cf.ops
+        # 判断需要的最短 payload（所引用信号的最后一个字节 + 1）
+        self.min_length = max((ops[n].last_byte + 1 for n in self.signals), default=0)
+        self.constant: Optional[bool] = tree[1] if tree[0] == 'const' else None
+
+        gen = _CodeGen()
+        body = gen.scalar(tree)
+        if self.min_length:
+            body = f"len(p) >= {self.min_length} and {body}"
+        self.source = f"def _pred(p):\n    return {body}\n"
+        ns: Dict[str, Any] = {'_fb': int.from_bytes, '_K': gen.consts}
+        for n in range(2, 9):
+            ns[f'_R{n}'] = _REV[n]
+        exec(compile(self.source, f"<predicate {expr}>", "exec"), ns)
+        self._fn: Callable[[Any], bool] = ns['_pred']
+
+        self._vfn: Optional[Callable] = None
+        if np is not None:
+            vgen = _CodeGen()
+            vbody = vgen.vector(tree)
+            lines = [f"    _r{i} = _S[{i}].raw_column(m)" for i in range(len(vgen.raw_ops))]
+            self.vector_source = "def _vpred(m):\n" + "".join(line + "\n" for line in lines) + f"    return {vbody}\n"
+            vns = {'_np': np, '_K': vgen.consts, '_S': vgen.raw_ops}
+            exec(compile(self.vector_source, f"<predicate {expr} (vector)>", "exec"), vns)
+            self._vfn = vns['_vpred']
+
+    def __call__(self, payload) -> bool:
+        return self._fn(payload)
+
+    def __repr__(self) -> str:
+        return f"RawPredicate({self.expr!r})"
+
+    def mask_matrix(self, m):
+        """m: (行, 字节) 的 uint8 矩阵，列数 >= min_length；返回 bool 数组（需要 NumPy）"""
+        if self._vfn is None:
+            raise RuntimeError("向量化判断需要 NumPy")
+        return self._vfn(m)
+
+    def mask(self, payloads: Sequence):
+        """
+        一批 payload 的判断结果：有 NumPy 时为 bool 数组（向量化），否则为 list[bool]。
+        短于 min_length 的 payload 为 False。
+        """
+        if self._vfn is None:
+            fn = self._fn
+            return [fn(p) for p in payloads]
+        n = len(payloads)
+        width = self.min_length
+        if not width:
+            return np.full(n, bool(self.constant))
+        short = None
+        pad = bytes(width)
+        rows = []
+        for i, p in enumerate(payloads):
+            if len(p) >= width:
+                rows.append(p[:width])
+            else:
+                rows.append(pad)
+                if short is None:
+                    short = []
+                short.append(i)
+        m = np.frombuffer(b''.join(rows), dtype=np.uint8).reshape(n, width)
+        result = self._vfn(m)
+        if short is not None:
+            result[short] = False
+        return result
+
+    def select(self, payloads: Sequence) -> List[int]:
+        """一批 payload 中满足条件的下标"""
+        keep = self.mask(payloads)
+        if np is not None and isinstance(keep, np.ndarray):
+            return np.flatnonzero(keep).tolist()
+        return [i for i, k in enumerate(keep) if k]
+
+
+def compile_predicate(expr: str, frame_cls) -> RawPredicate:
+    """
+    按 frame_cls 的布局编译 expr；frame_cls 也可以是类名或 msg_id（见 __init__.get_frame_class）。
+    引用了帧中不存在的信号时抛出 KeyError，语法不支持时抛出 ValueError。
+    """
+    if isinstance(frame_cls, (int, str)):
+        from __init__ import get_frame_class
+        frame_cls = get_frame_class(frame_cls)
+    return RawPredicate(frame_cls, expr)
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+# @Time: 2026/01/02 16:10
+# @Author: JackyYin
+# @Email: jackhuan@icloud.com
+# @File: predicate_test.py
+
+"""
+predicate 的测试：原始字节上的判断与"先解码再求值"一致（Intel / Motorola、带 factor 的信号），
+短 payload 为 False，批量 mask / select 与逐帧判断一致（向量化路径需要安装 NumPy），错误表达式的异常类型。
+
+运行：python -m pytest predicate_test.py  或  python predicate_test.py
+"""
+import random
+
+import pytest
+
+import predicate
+from __init__ import UDFrame_Z_204
+from frame_codec import compile_frame
+from predicate import compile_predicate
+
+_EXPRS = [
+    'CrsCtrlOvrdnReq == 1',
+    'LVPwrSplyErrStsSts != 0',
+    'LVPwrSplyErrStsSts == 0x1234',
+    'PrpsnADResvSigGrp == 0xA55A or FltElecDcDc',
+    '0 < CrsCtrlOvrdnCntr4 <= 3',
+    'CrsCtrlOvrdnCntr4 in (1, 5, 15)',
+    'VehLVSysUZCLVehLVSysUMai > 12.05 and not MsgReqForRtrctrRvsbDrvr',
+    'VehLVSysUZCLVehLVSysUBkp <= 0.35',
+    'VehLVSysUZCLVehLVSysUBkp >= 25.55 or PrpsnVDResvSigGrp < 0x100',
+    '(CrsCtrlOvrdnReq or FltElecDcDc) and LVPwrSplyErrStsSts > 40000',
+]
+
+
+def _payloads(n: int, seed: int = 7):
+    rnd = random.Random(seed)
+    length = UDFrame_Z_204.msg_length
+    out = []
+    for i in range(n):
+        p = bytearray(rnd.getrandbits(8) for _ in range(length))
+        if i % 4 == 0:
+            # 让 == 条件有机会成立：LVPwrSplyErrStsSts 在字节 2~3（Intel），PrpsnADResvSigGrp 在字节 9~10（Motorola）
+            p[2:4] = rnd.choice([b'\x34\x12', b'\x12\x34', b'\x00\x00'])
+            p[9:11] = rnd.choice([b'\xa5\x5a', b'\x5a\xa5'])
+        out.append(bytes(p))
+    return out
+
+
+def test_matches_decode_then_eval():
+    cf = compile_frame(UDFrame_Z_204)
+    payloads = _payloads(3000)
+    for expr in _EXPRS:
+        pred = compile_predicate(expr, UDFrame_Z_204)
+        code = compile(expr, '<expr>', 'eval')
+        hits = 0
+        for p in payloads:
+            expected = bool(eval(code, {}, cf.decode(p)))
+            assert pred(p) == expected, (expr, p.hex())
+            hits += expected
+        assert pred.select(payloads) == [i for i, p in enumerate(payloads) if pred(p)]
+        assert 0 < hits < len(payloads), expr  # 两种结果都覆盖到
+
+
+@pytest.mark.skipif(predicate.np is None, reason="需要 NumPy")
+def test_mask_numpy_matches_scalar():
+    payloads = _payloads(3000, seed=11)
+    for expr in _EXPRS:
+        pred = compile_predicate(expr, UDFrame_Z_204)
+        mask = pred.mask(payloads)
+        assert isinstance(mask, predicate.np.ndarray)
+        assert mask.tolist() == [pred(p) for p in payloads], expr
+
+
+def test_short_payload_and_constant_folding():
+    pred = compile_predicate('LVPwrSplyErrStsSts != 0', UDFrame_Z_204)
+    assert pred.min_length > 0
+    assert not pred(b'\xff' * (pred.min_length - 1))
+    assert list(pred.mask([b'\xff' * (pred.min_length - 1), b'\xff' * 23])) == [False, True]
+    # 8 位信号 * 0.1 取不到 30.0
+    assert compile_predicate('VehLVSysUZCLVehLVSysUMai == 30', UDFrame_Z_204).constant is False
+
+
+def test_errors():
+    for expr, exc in (('NoSuchSignal == 1', KeyError), ('CrsCtrlOvrdnReq ==', ValueError),
+                      ('CrsCtrlOvrdnReq == "a"', ValueError)):
+        try:
+            compile_predicate(expr, UDFrame_Z_204)
+        except exc:
+            pass
+        else:
+            raise AssertionError(expr)
+
+
+if __name__ == '__main__':
+    test_matches_decode_then_eval()
+    if predicate.np is not None:
+        test_mask_numpy_matches_scalar()
+    test_short_payload_and_constant_folding()
+    test_errors()
+    print('ok')
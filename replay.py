@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+# @Time: 2025/12/24 20:50
+# @Author: JackyYin
+# @Email: jackhuan@icloud.com
+# @File: replay.py
+
+"""
+抓包回放：把记录的台架流量按原始时序重新注入 ECU / 回归台架。
+
+- 数据源：CaptureReader 支持的 pcap / pcapng / frames.txt，或任意 (ts, datagram) 可迭代对象；
+- 节拍：按绝对截止时间 t0 + (ts - ts0) / speed 发送（不累计 sleep 误差），speed=None 表示尽快发送；
+  距截止时间较远时 Event.wait，最后 spin 秒内忙等以减小唤醒抖动；
+- 批量：截止时间落在 batch_window 内的数据报一次连续发出；尽快发送时每 fast_batch 个数据报
+  （aggregate=True 时累计到 mtu 字节即可）为一批；aggregate=True 时把一批的 PDU
+  重新装进尽量少的数据报（PDUAggregator）；
+- stop() 在等待截止时间期间生效时，未发出的一批直接丢弃；
+- E2E：regenerate_e2e=True 时，对已注册帧类的 PDU 按回放顺序重新生成 Counter（从 0 递增）
+  并重算 DataID 半字节与 CRC，避免回放帧因 Counter 跳变被 ECU 判为失效。
+
+用法：
+    rp = Replayer(UDPTransport(...), '/data/bench.pcapng', speed=1.0,
+                  frames=[UDFrame_Z_204], regenerate_e2e=True)
+    rp.run()               # 阻塞，或 rp.start() / rp.stop() 在后台线程回放
+"""
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from framer import Framer, PDUTruncatedError
+from frame_codec import compile_frame, CompiledFrame
+from capture_reader import CaptureReader
+from tx_aggregator import PDUAggregator
+
+ReplaySource = Union[str, Iterable[Tuple[float, Any]]]
+
+
+class Replayer:
+    def __init__(self, transport, source: ReplaySource, framer: Optional[Framer] = None,
+                 speed: Optional[float] = 1.0, loops: int = 1, batch_window: float = 0.0005,
+                 spin: float = 0.0005, aggregate: bool = False, mtu: int = 1472,
+                 fast_batch: int = 64, frames: Iterable[Any] = (), regenerate_e2e: bool = False,
+                 reader_kwargs: Optional[Dict[str, Any]] = None):
+        """
+        transport: 实现 send(bytes-like)（UDPTransport / AFPacketTransport）
+        source: 抓包文件路径，或 (ts 秒, datagram) 的可迭代对象（datagram 含应用层 header）
+        framer: 数据报的 Framer（默认 custom_4_4）；E2E 重算与聚合需要按 msg_id 拆分
+        speed: 回放倍速（2.0 为两倍速），None 或 0 表示不按时间尽快发送
+        loops: 回放次数（0 表示无限循环，需 stop() 结束）
+        batch_window: 截止时间在该窗口内的数据报合并为一批连续发送
+        spin: 截止时间前最后 spin 秒忙等
+        fast_batch: 尽快发送（speed=None）时每批最多的数据报数
+        frames: 需要 E2E 重算的帧类（按 msg_id 匹配）
+        reader_kwargs: 传给 CaptureReader 的其它参数（如 udp_ports / ethertype / period）
+        """
+        self.transport = transport
+        self.source = source
+        self.framer = framer if framer is not None else Framer(mode="custom_4_4")
+        self.speed = speed if speed else None
+        self.loops = loops
+        self.batch_window = batch_window
+        self.spin = spin
+        self.mtu = mtu
+        self.fast_batch = max(1, fast_batch)
+        self.reader_kwargs = dict(reader_kwargs or {})
+        self.regenerate_e2e = regenerate_e2e
+        self._compiled: Dict[int, CompiledFrame] = {}
+        for frame_cls in frames:
+            cf = compile_frame(frame_cls)
+            if cf.msg_id is not None:
+                self._compiled[cf.msg_id] = cf
+        if regenerate_e2e and self.framer.mode == "none":
+            raise ValueError("E2E 重算需要能解析 msg_id 的 framer（例如 custom_4_4）")
+        self._aggregator = PDUAggregator(transport, self.framer, mtu=mtu) if aggregate else None
+        self._counters: Dict[Tuple[int, str], int] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # 统计
+        self.datagrams = 0
+        self.batches = 0
+        self.errors = 0
+        self.max_late = 0.0
+        self.e2e_rewritten = 0
+
+    # --- 生命周期 ---
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="Replayer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        self._stop.set()
+        t = self._thread
+        if t is not None and t is not threading.current_thread():
+            t.join(timeout=timeout)
+        self._thread = None
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待后台回放结束，返回是否已结束"""
+        t = self._thread
+        if t is None:
+            return True
+        t.join(timeout=timeout)
+        return not t.is_alive()
+
+    # --- 回放 ---
+    def _iter_source(self):
+        if isinstance(self.source, str):
+            with CaptureReader(self.source, framer=self.framer, **self.reader_kwargs) as reader:
+                yield from reader.iter_datagrams()
+        else:
+            yield from self.source
+
+    def run(self):
+        """阻塞回放，直到数据源结束（按 loops 次数）或 stop()"""
+        loop = 0
+        while not self._stop.is_set() and (self.loops == 0 or loop < self.loops):
+            self._run_once()
+            loop += 1
+
+    def _run_once(self):
+        speed = self.speed
+        window = self.batch_window
+        stop = self._stop
+        t0 = None
+        ts0 = 0.0
+        batch: List[Any] = []
+        batch_deadline = 0.0
+        # 尽快发送：按条数（聚合时按字节数）成批
+        fast_limit = self.fast_batch
+        fast_bytes = self.mtu if self._aggregator is not None else None
+        batch_bytes = 0
+        for ts, datagram in self._iter_source():
+            if stop.is_set():
+                return
+            if speed is None:
+                # mmap 中的 memoryview 在读取下一条之后仍有效（文件关闭前），无需复制
+                batch.append(datagram)
+                batch_bytes += len(datagram)
+                if len(batch) >= fast_limit or (fast_bytes is not None and batch_bytes >= fast_bytes):
+                    self._send_batch(batch)
+                    batch = []
+                    batch_bytes = 0
+                continue
+            if t0 is None:
+                t0, ts0 = time.monotonic(), ts
+            deadline = t0 + (ts - ts0) / speed
+            if batch and deadline > batch_deadline + window:
+                if not self._wait_until(batch_deadline):
+                    return
+                self._send_batch(batch)
+                batch = []
+            if not batch:
+                batch_deadline = deadline
+            batch.append(datagram)
+        if batch and not stop.is_set():
+            if speed is not None and not self._wait_until(batch_deadline):
+                return
+            self._send_batch(batch)
+
+    def _wait_until(self, deadline: float) -> bool:
+        """等到 deadline；等待期间 stop() 时返回 False（调用方不再发送）"""
+        delay = deadline - time.monotonic() - self.spin
+        if delay > 0 and self._stop.wait(delay):
+            return False
+        while time.monotonic() < deadline:
+            pass
+        late = time.monotonic() - deadline
+        if late > self.max_late:
+            self.max_late = late
+        return True
+
+    def _send_batch(self, batch: List[Any]):
+        self.batches += 1
+        agg = self._aggregator
+        for datagram in batch:
+            if self.regenerate_e2e and self._compiled:
+                datagram = self._rewrite_e2e(datagram)
+            try:
+                if agg is None:
+                    self.transport.send(datagram)
+                else:
+                    for msg_id, payload in self.framer.iter_pdus(datagram):
+                        agg.add(msg_id, payload)
+                self.datagrams += 1
+            except Exception:
+                self.errors += 1
+        if agg is not None:
+            try:
+                agg.flush()
+            except Exception:
+                self.errors += 1
+
+    def _rewrite_e2e(self, datagram):
+        """按回放顺序重新生成已注册帧的 E2E Counter / CRC（只在有匹配 PDU 时复制数据报）"""
+        hdr = self.framer.header_size()
+        hits = []
+        off = 0
+        try:
+            for msg_id, payload in self.framer.iter_pdus(datagram):
+                cf = self._compiled.get(msg_id)
+                if cf is not None and cf.e2e_groups and len(payload) >= cf.msg_length:
+                    hits.append((off + hdr, msg_id, cf))
+                off += hdr + len(payload)
+        except PDUTruncatedError:
+            pass
+        if not hits:
+            return datagram
+        buf = bytearray(datagram)
+        view = memoryview(buf)
+        for start, msg_id, cf in hits:
+            pdu = view[start:start + cf.msg_length]
+            for gname, group in cf.e2e_groups.items():
+                key = (msg_id, gname)
+                cnt = self._counters.get(key, 0)
+                group.apply(pdu, counter=cnt)
+                self._counters[key] = (cnt + 1) & group.counter.mask
+            self.e2e_rewritten += 1
+        return buf
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'datagrams': self.datagrams,
+            'batches': self.batches,
+            'errors': self.errors,
+            'max_late': self.max_late,
+            'e2e_rewritten': self.e2e_rewritten,
+        }
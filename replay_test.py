@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# @Time: 2026/01/03 10:40
+# @Author: JackyYin
+# @Email: jackhuan@icloud.com
+# @File: replay_test.py
+
+"""
+replay 的测试：尽快发送时成批聚合、等待截止时间期间 stop() 不再发送。
+
+运行：python -m pytest replay_test.py  或  python replay_test.py
+"""
+import time
+
+from framer import Framer
+from replay import Replayer
+
+
+class _FakeTransport:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, data):
+        self.sent.append(bytes(data))
+
+
+def _datagrams(n: int, framer: Framer):
+    return [(i * 0.01, framer.add_header(bytes([i]) * 8, msg_id=0x94)) for i in range(n)]
+
+
+def test_fast_mode_aggregates():
+    framer = Framer(mode='custom_4_4')
+    source = _datagrams(7, framer)
+    transport = _FakeTransport()
+    rp = Replayer(transport, source, framer=framer, speed=None, aggregate=True)
+    rp.run()
+    # 7 个 16 字节的数据报装进同一个数据报
+    assert len(transport.sent) == 1
+    pdus = [(m, bytes(p)) for m, p in framer.iter_pdus(transport.sent[0])]
+    assert pdus == [(0x94, bytes([i]) * 8) for i in range(7)]
+    assert rp.datagrams == 7
+
+    # 不聚合时仍逐个数据报发送，但按 fast_batch 成批
+    transport = _FakeTransport()
+    rp = Replayer(transport, source, framer=framer, speed=None, fast_batch=3)
+    rp.run()
+    assert transport.sent == [bytes(d) for _, d in source]
+    assert rp.batches == 3
+
+
+def test_stop_during_wait_does_not_send():
+    framer = Framer(mode='custom_4_4')
+    source = [(0.0, framer.add_header(b'\x01' * 8, msg_id=0x94)),
+              (5.0, framer.add_header(b'\x02' * 8, msg_id=0x94))]
+    transport = _FakeTransport()
+    rp = Replayer(transport, source, framer=framer, speed=1.0)
+    rp.start()
+    time.sleep(0.2)
+    rp.stop()
+    assert rp.wait(1.0)
+    assert transport.sent == [bytes(source[0][1])]
+
+
+if __name__ == '__main__':
+    test_fast_mode_aggregates()
+    test_stop_during_wait_does_not_send()
+    print('ok')
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# @Time: 2025/12/13 10:20
+# @Author: JackyYin
+# @Email: jackhuan@icloud.com
+# @File: rt_sched.py
+
+"""
+线程级实时调度 / CPU 绑定辅助函数（Linux）。
+
+apply_thread_policy(cpus, fifo_priority) 必须在目标线程内部调用（作用于调用线程）：
+- cpus：要绑定的 CPU 编号集合，None 表示不修改
+- fifo_priority：SCHED_FIFO 优先级（1~99），None 表示不修改调度策略
+
+权限不足（无 CAP_SYS_NICE）或平台不支持时不会抛异常，而是保持原策略，
+并在返回的报告中记录原因，方便服务对外报告"实际生效"的策略。
+"""
+import os
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+
+def _policy_name(policy: int) -> str:
+    for name in ('SCHED_OTHER', 'SCHED_FIFO', 'SCHED_RR', 'SCHED_BATCH', 'SCHED_IDLE'):
+        if getattr(os, name, None) == policy:
+            return name
+    return str(policy)
+
+
+def apply_thread_policy(cpus: Optional[Iterable[int]] = None,
+                        fifo_priority: Optional[int] = None) -> Dict[str, Any]:
+    """
+    对调用线程应用 CPU 绑定与 SCHED_FIFO 优先级，返回实际生效的策略报告：
+    {
+        'thread': 线程名, 'tid': 内核线程号,
+        'cpus': 生效的 CPU 列表（None 表示未知）,
+        'policy': 'SCHED_FIFO' / 'SCHED_OTHER' / ..., 'priority': int,
+        'errors': [失败原因, ...]
+    }
+    """
+    tid = threading.get_native_id()
+    report: Dict[str, Any] = {
+        'thread': threading.current_thread().name,
+        'tid': tid,
+        'cpus': None,
+        'policy': None,
+        'priority': None,
+        'errors': [],
+    }
+
+    if cpus is not None:
+        wanted = sorted(set(int(c) for c in cpus))
+        if not hasattr(os, 'sched_setaffinity'):
+            report['errors'].append("cpu affinity: 当前平台不支持 sched_setaffinity")
+        else:
+            try:
+                os.sched_setaffinity(tid, wanted)
+            except (OSError, ValueError) as e:
+                report['errors'].append(f"cpu affinity {wanted}: {e}")
+
+    if fifo_priority is not None:
+        if not hasattr(os, 'sched_setscheduler') or not hasattr(os, 'SCHED_FIFO'):
+            report['errors'].append("SCHED_FIFO: 当前平台不支持 sched_setscheduler")
+        else:
+            lo = os.sched_get_priority_min(os.SCHED_FIFO)
+            hi = os.sched_get_priority_max(os.SCHED_FIFO)
+            prio = min(max(int(fifo_priority), lo), hi)
+            try:
+                os.sched_setscheduler(tid, os.SCHED_FIFO, os.sched_param(prio))
+            except (OSError, ValueError) as e:
+                # 常见为 EPERM：未授予 CAP_SYS_NICE / RLIMIT_RTPRIO，保持普通调度
+                report['errors'].append(f"SCHED_FIFO priority {prio}: {e}")
+
+    # 读取实际生效值（而不是请求值）
+    if hasattr(os, 'sched_getaffinity'):
+        try:
+            report['cpus'] = sorted(os.sched_getaffinity(tid))
+        except OSError:
+            pass
+    if hasattr(os, 'sched_getscheduler'):
+        try:
+            report['policy'] = _policy_name(os.sched_getscheduler(tid))
+            report['priority'] = os.sched_getparam(tid).sched_priority
+        except OSError:
+            pass
+    return report
+
+
+def make_thread_init(cpus: Optional[Iterable[int]] = None,
+                     fifo_priority: Optional[int] = None,
+                     on_applied=None):
+    """
+    构造一个无参的线程初始化函数（供 transport.thread_init 使用）。
+    on_applied(report) 在策略应用后被调用，可用于回传报告。
+    若 cpus 与 fifo_priority 都为 None，返回 None（不做任何处理）。
+    """
+    if cpus is None and fifo_priority is None:
+        return None
+    cpus = None if cpus is None else list(cpus)
+
+    def _init():
+        report = apply_thread_policy(cpus, fifo_priority)
+        if on_applied is not None:
+            on_applied(report)
+        return report
+    return _init
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# @Time: 2026/01/03 11:30
+# @Author: JackyYin
+# @Email: jackhuan@icloud.com
+# @File: rx_process_test.py
+
+"""
+rx_process 的测试（UDP 回环）：子进程不改共享 socket 的阻塞标志、截断计数、内核时间戳。
+
+运行：python -m pytest rx_process_test.py  或  python rx_process_test.py
+"""
+import socket
+import threading
+import time
+
+from rx_process import ProcessRxTransport
+from transport_udp import UDPTransport
+
+_SLOT = 64
+
+
+def _free_port() -> int:
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def test_truncation_timestamps_and_blocking_flag():
+    port = _free_port()
+    inner = UDPTransport(local_addr=('127.0.0.1', port), remote_addr=('127.0.0.1', port))
+    rx = ProcessRxTransport(inner, slots=16, slot_size=_SLOT)
+    rx.enable_kernel_timestamps()
+    got = []
+    done = threading.Event()
+
+    def on_batch(batch):
+        got.extend(batch)
+        if len(got) >= 2:
+            done.set()
+
+    rx.start_receiving_batch(on_batch)
+    try:
+        sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        t_send = time.time()
+        sender.sendto(b'a' * _SLOT, ('127.0.0.1', port))        # 恰好填满槽位
+        sender.sendto(b'b' * (_SLOT + 10), ('127.0.0.1', port))  # 超出槽位
+        sender.close()
+        assert done.wait(5.0)
+        # 子进程的 poll 超时不影响父进程对同一 socket 的阻塞发送
+        assert inner.sock.getblocking() and inner.sock.gettimeout() is None
+        inner.send(b'x' * 8)
+    finally:
+        stats = rx.stats()
+        rx.stop()
+        inner.stop()
+    assert [d for _, d in got[:2]] == [b'a' * _SLOT, b'b' * _SLOT]
+    assert stats['truncated'] == 1
+    for ts, _ in got[:2]:
+        assert abs(ts - t_send) < 2.0
+
+
+if __name__ == '__main__':
+    test_truncation_timestamps_and_blocking_flag()
+    print('ok')
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+# @Time: 2025/12/31 20:30
+# @Author: JackyYin
+# @Email: jackhuan@icloud.com
+# @File: shm_table_test.py
+
+"""
+shm_table 的测试：发布 / 读取往返、seqlock 一致快照、多个独立读进程先后 attach。
+
+运行：python -m pytest shm_table_test.py  或  python shm_table_test.py
+"""
+import os
+import subprocess
+import sys
+import threading
+
+from __init__ import UDFrame_Z_204
+from shm_table import SharedSignalTable
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+# 独立的读进程（不是 fork 出来的子进程，有自己的 resource_tracker）
+_READER = """
+import sys
+sys.path.insert(0, {here!r})
+from shm_table import SharedSignalTable
+t = SharedSignalTable.attach({name!r})
+raw, phys, ts = t.read('LVPwrSplyErrStsSts')
+print(raw, ts)
+t.close()
+"""
+
+
+def test_publish_read_roundtrip():
+    table = SharedSignalTable.create(UDFrame_Z_204)
+    try:
+        reader = SharedSignalTable.attach(table.name)
+        assert reader.frames() == 0
+        table.publish({'LVPwrSplyErrStsSts': 0x1234, 'CrsCtrlOvrdnReq': 1}, ts=12.5)
+        assert reader.read('LVPwrSplyErrStsSts') == (0x1234, 0x1234, 12.5)
+        snap = reader.snapshot()
+        assert snap['CrsCtrlOvrdnReq'][:2] == (1, 1)
+        assert snap['CrsCtrlOvrdnCntr4'][:2] == (0, 0)
+        assert reader.frames() == 1
+        reader.close()
+    finally:
+        table.close()
+        table.unlink()
+
+
+def test_snapshot_is_consistent_while_writing():
+    table = SharedSignalTable.create(UDFrame_Z_204)
+    reader = SharedSignalTable.attach(table.name)
+    stop = threading.Event()
+
+    def _writer():
+        i = 0
+        while not stop.is_set():
+            i = (i + 1) & 0xF
+            table.publish({'CrsCtrlOvrdnCntr4': i, 'LVPwrSplyErrStsSts': i, 'FltElecDcDc': i & 1}, ts=float(i))
+
+    th = threading.Thread(target=_writer)
+    th.start()
+    try:
+        for _ in range(2000):
+            snap = reader.snapshot()
+            cntr = snap['CrsCtrlOvrdnCntr4'][0]
+            # 同一帧内的三个信号与时间戳必须一致
+            assert snap['LVPwrSplyErrStsSts'][0] == cntr
+            assert snap['FltElecDcDc'][0] == cntr & 1
+            assert snap['CrsCtrlOvrdnCntr4'][2] == float(cntr)
+    finally:
+        stop.set()
+        th.join()
+        reader.close()
+        table.close()
+        table.unlink()
+
+
+def test_independent_readers_do_not_unlink():
+    table = SharedSignalTable.create(UDFrame_Z_204)
+    try:
+        table.publish({'LVPwrSplyErrStsSts': 7}, ts=3.0)
+        # 两个独立进程先后 attach：第一个退出后共享内存必须仍然存在
+        for _ in range(2):
+            proc = subprocess.run([sys.executable, '-c', _READER.format(here=_HERE, name=table.name)],
+                                  capture_output=True, text=True, timeout=60)
+            assert proc.returncode == 0, proc.stderr
+            assert proc.stdout.split() == ['7', '3.0']
+            assert 'leaked shared_memory' not in proc.stderr
+        assert table.read('LVPwrSplyErrStsSts')[0] == 7
+    finally:
+        table.close()
+        table.unlink()
+
+
+if __name__ == '__main__':
+    test_publish_read_roundtrip()
+    test_snapshot_is_consistent_while_writing()
+    test_independent_readers_do_not_unlink()
+    print('ok')
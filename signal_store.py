@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# @Time: 2025/12/12 21:10
+# @Author: JackyYin
+# @Email: jackhuan@icloud.com
+# @File: signal_store.py
+
+"""
+双缓冲信号值存储（发送侧）。
+
+背景：
+- set_signal 在用户线程写入信号值，send() 在发送线程（或周期发送线程）打包，
+  若二者共享同一个 dict，多信号更新过程中可能被 send() 读到"一半新一半旧"的状态；
+  若到处加锁，写入方又会阻塞周期发送。
+
+做法：
+- front：当前已发布的快照（dict），发布后不再修改，读者直接拿引用即可，无需加锁。
+- back：写事务期间的工作副本，由 begin_update() 从 front 复制得到。
+- commit() 把 back 作为新的 front 发布（一次引用赋值，在 CPython 中是原子的）。
+- 写者之间用一把锁串行化（只影响写者，不影响读快照的发送线程）。
+
+用法：
+    store.begin_update()
+    store.set('CrsCtrlOvrdnReq', 1)
+    store.set('CrsCtrlOvrdn_UB', 1)
+    store.commit()              # 两个信号同时对发送线程可见
+
+    with store.update():        # 等价写法，异常时自动 abort
+        store.set(...)
+
+    values = store.snapshot()   # 发送线程：拿到一致的快照
+"""
+import threading
+from typing import Dict, Optional
+
+
+class DoubleBufferedSignalStore:
+    def __init__(self, initial: Optional[Dict[str, int]] = None):
+        self._front: Dict[str, int] = dict(initial or {})
+        self._back: Optional[Dict[str, int]] = None
+        self._writer_lock = threading.RLock()
+        self._writer: Optional[int] = None
+        self._depth = 0
+        self.version = 0
+
+    # --- 读接口（不加锁）---
+    def snapshot(self) -> Dict[str, int]:
+        """返回当前已发布的快照。调用方不得修改返回的 dict。"""
+        return self._front
+
+    def get(self, sig_name: str, default=None):
+        return self._front.get(sig_name, default)
+
+    # --- 写事务 ---
+    def begin_update(self):
+        """开始写事务。同一线程可嵌套调用，最外层 commit() 时才发布。"""
+        self._writer_lock.acquire()
+        if self._depth == 0:
+            self._back = dict(self._front)
+            self._writer = threading.get_ident()
+        self._depth += 1
+
+    def commit(self):
+        """发布写事务中的修改。必须由调用 begin_update() 的线程调用。"""
+        if not self.in_update():
+            raise RuntimeError("commit() 之前没有对应的 begin_update()")
+        self._depth -= 1
+        if self._depth == 0:
+            self._front = self._back
+            self._back = None
+            self._writer = None
+            self.version += 1
+        self._writer_lock.release()
+
+    def abort(self):
+        """放弃当前写事务（包括嵌套的外层事务）中的全部修改。"""
+        if not self.in_update():
+            raise RuntimeError("abort() 之前没有对应的 begin_update()")
+        depth = self._depth
+        self._depth = 0
+        self._back = None
+        self._writer = None
+        for _ in range(depth):
+            self._writer_lock.release()
+
+    def in_update(self) -> bool:
+        """当前线程是否处于写事务中。"""
+        return self._writer == threading.get_ident() and self._depth > 0
+
+    def update(self):
+        """with 语句形式的写事务。"""
+        return _UpdateContext(self)
+
+    def set(self, sig_name: str, raw_value: int):
+        """
+        写入一个原始值。
+        - 处于写事务中：写入 back，commit 时统一发布。
+        - 否则：作为单信号事务立即发布。
+        """
+        if self.in_update():
+            self._back[sig_name] = raw_value
+            return
+        self.begin_update()
+        try:
+            self._back[sig_name] = raw_value
+        except Exception:
+            self.abort()
+            raise
+        self.commit()
+
+
+class _UpdateContext:
+    def __init__(self, store: DoubleBufferedSignalStore):
+        self._store = store
+
+    def __enter__(self):
+        self._store.begin_update()
+        return self._store
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self._store.commit()
+        else:
+            self._store.abort()
+        return False
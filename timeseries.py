@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+# @Time: 2025/12/25 21:40
+# @Author: JackyYin
+# @Email: jackhuan@icloud.com
+# @File: timeseries.py
+
+"""
+内存中的信号时间序列（列式、只追加）。
+
+在台架上保留几个小时的解码历史时，用 list 保存每帧的 parsed dict（如 main_thread.py 的
+sent_signals_history）每个样本要几百字节。TimeSeriesStore：
+- 每个帧类一个 store，时间戳一列 + 每个信号一列，按块（默认 4096 行）预分配 array：
+  整数信号按位宽选 B / H / I / Q，带 factor / offset 的物理值用 d，23 字节的 UDFrame_Z_204
+  一行约 50 字节；
+- append(parsed, ts) 在接收线程中按下标写入当前块，不加锁；块写满后换新块，
+  块列表写时复制，读者拿到的总是完整的快照；
+- 保留策略：max_bytes（总内存上限，超出时整块丢弃最旧的数据）与 max_age（秒）；
+- range(name, t0, t1) 按块起始时间与块内时间戳二分查找；
+  downsample(name, t0, t1, buckets) 按时间分桶给出 min / max / mean / count（绘图用），
+  安装了 NumPy 时向量化计算。
+
+时间戳需单调不减（默认 time.time()；EthService 传入 transport 给出的帧接收时间戳），
+倒退的时间戳按上一条记录的时间处理；clear() 之后重新开始。
+
+用法：
+    store = svc.enable_timeseries(max_bytes=256 << 20)     # 或 TimeSeriesStore(UDFrame_Z_204)，自行 append
+    ts, values = store.range('CrsCtrlOvrdnReq', t0, t1)
+    ds = store.downsample('LVPwrSplyErrStsSts', t0, t1, buckets=800)
+    # ds = {'t': 桶起始时间, 'min': ..., 'max': ..., 'mean': ..., 'count': ...}（空桶不输出）
+"""
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from frame_codec import compile_frame, SignalOp
+
+try:
+    import numpy as np
+except ImportError:  # 没有 NumPy 时 downsample 逐点计算
+    np = None
+
+# 整数列的候选类型码（按位宽从小到大）
+_INT_CODES = 'BHIQ'
+
+
+def _typecode(op: SignalOp) -> str:
+    """能无损保存该信号物理值的最小 array 类型"""
+    if not op.physical_is_raw:
+        return 'd'
+    for code in _INT_CODES:
+        if array(code).itemsize * 8 >= op.length:
+            return code
+    return 'Q'
+
+
+class _Chunk:
+    """预分配的一块：ts 与各信号列长度均为 capacity，前 rows 行有效"""
+    __slots__ = ('ts', 'cols', 'rows', 'capacity', 'nbytes')
+
+    def __init__(self, codes: Dict[str, str], capacity: int):
+        self.ts = array('d', bytes(8 * capacity))
+        self.cols: Dict[str, array] = {}
+        nbytes = 8 * capacity
+        for name, code in codes.items():
+            col = array(code, bytes(array(code).itemsize * capacity))
+            self.cols[name] = col
+            nbytes += col.itemsize * capacity
+        self.rows = 0
+        self.capacity = capacity
+        self.nbytes = nbytes
+
+    @property
+    def t_first(self) -> float:
+        return self.ts[0]
+
+    @property
+    def t_last(self) -> float:
+        return self.ts[self.rows - 1]
+
+
+class TimeSeriesStore:
+    def __init__(self, frame_cls, signals: Optional[Iterable[str]] = None, chunk_rows: int = 4096,
+                 max_bytes: Optional[int] = 64 << 20, max_age: Optional[float] = None):
+        """
+        frame_cls: 帧类（决定各列的类型）
+        signals: 只保存这些信号（None 表示全部）
+        chunk_rows: 每块行数
+        max_bytes: 内存上限（字节，按块计算，至少保留两块）；None 表示不限
+        max_age: 只保留最近 max_age 秒的数据（按整块丢弃）；None 表示不限
+        """
+        if chunk_rows < 1:
+            raise ValueError("chunk_rows must be >= 1")
+        compiled = compile_frame(frame_cls)
+        if signals is None:
+            ops = compiled.signals
+        else:
+            wanted = list(signals)
+            unknown = set(wanted) - set(compiled.ops)
+            if unknown:
+                raise KeyError(f"Signal(s) {sorted(unknown)} not found in frame definition")
+            ops = [compiled.ops[n] for n in wanted]
+        self.frame_cls = frame_cls
+        self.chunk_rows = chunk_rows
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._codes: Dict[str, str] = {op.name: _typecode(op) for op in ops}
+        self._names: Tuple[str, ...] = tuple(self._codes)
+        # (块列表, 各块起始时间)：封块 / 淘汰时整体替换
+        self._chunks: Tuple[List[_Chunk], List[float]] = ([], [])
+        self._active: Optional[_Chunk] = None
+        self._last_ts = float('-inf')
+
+        # 统计
+        self.appended = 0
+        self.evicted_rows = 0
+
+    # --- 写入（接收线程） ---
+    def append(self, parsed: Dict[str, Any], ts: Optional[float] = None):
+        """追加一行；parsed 中缺少的信号记 0"""
+        if ts is None:
+            ts = time.time()
+        if ts < self._last_ts:
+            ts = self._last_ts
+        self._last_ts = ts
+        chunk = self._active
+        if chunk is None or chunk.rows == chunk.capacity:
+            chunk = self._new_chunk(ts)
+        i = chunk.rows
+        chunk.ts[i] = ts
+        get = parsed.get
+        for name, col in chunk.cols.items():
+            col[i] = get(name, 0)
+        # 最后更新行数：读者只看到写完整的行
+        chunk.rows = i + 1
+        self.appended += 1
+
+    def _new_chunk(self, ts: float) -> _Chunk:
+        chunk = _Chunk(self._codes, self.chunk_rows)
+        chunks, starts = self._chunks
+        chunks = chunks + [chunk]
+        starts = starts + [ts]
+        # 淘汰：超出内存上限或整块早于 max_age 的最旧块（当前新块总是保留）
+        keep_from = 0
+        if self.max_bytes is not None:
+            limit = max(2, self.max_bytes // chunk.nbytes)
+            keep_from = max(0, len(chunks) - limit)
+        if self.max_age is not None:
+            cutoff = ts - self.max_age
+            while keep_from < len(chunks) - 1 and chunks[keep_from].rows and chunks[keep_from].t_last < cutoff:
+                keep_from += 1
+        if keep_from:
+            self.evicted_rows += sum(c.rows for c in chunks[:keep_from])
+            chunks = chunks[keep_from:]
+            starts = starts[keep_from:]
+        self._chunks = (chunks, starts)
+        self._active = chunk
+        return chunk
+
+    def clear(self):
+        self._chunks = ([], [])
+        self._active = None
+        self._last_ts = float('-inf')
+
+    # --- 查询 ---
+    def names(self) -> Tuple[str, ...]:
+        return self._names
+
+    def __len__(self) -> int:
+        return sum(c.rows for c in self._chunks[0])
+
+    def _last_chunk(self) -> Optional[_Chunk]:
+        # 刚换块时新块可能还没有写完第一行
+        for chunk in reversed(self._chunks[0]):
+            if chunk.rows:
+                return chunk
+        return None
+
+    def time_span(self) -> Optional[Tuple[float, float]]:
+        """(最早, 最新) 时间戳；没有数据时返回 None"""
+        chunk = self._last_chunk()
+        if chunk is None:
+            return None
+        return self._chunks[0][0].t_first, chunk.t_last
+
+    def latest(self, name: str) -> Optional[Tuple[float, Any]]:
+        """(ts, value)；没有数据时返回 None"""
+        self._check(name)
+        chunk = self._last_chunk()
+        if chunk is None:
+            return None
+        n = chunk.rows
+        return chunk.ts[n - 1], chunk.cols[name][n - 1]
+
+    def _check(self, name: str):
+        if name not in self._codes:
+            raise KeyError(f"Signal '{name}' is not stored")
+
+    def _slices(self, name: str, t0: Optional[float], t1: Optional[float]):
+        """产出落在 [t0, t1] 内的 (ts_array, value_array, lo, hi)，按时间顺序"""
+        chunks, starts = self._chunks
+        if not chunks:
+            return
+        first = 0 if t0 is None else max(0, bisect_right(starts, t0) - 1)
+        last = len(chunks) if t1 is None else bisect_right(starts, t1)
+        for chunk in chunks[first:last]:
+            n = chunk.rows
+            ts = chunk.ts
+            lo = 0 if t0 is None else bisect_left(ts, t0, 0, n)
+            hi = n if t1 is None else bisect_right(ts, t1, lo, n)
+            if lo < hi:
+                yield ts, chunk.cols[name], lo, hi
+
+    def range(self, name: str, t0: Optional[float] = None,
+              t1: Optional[float] = None) -> Tuple[array, array]:
+        """返回 [t0, t1]（闭区间，None 表示不限）内的 (时间戳列, 值列)，均为 array 副本"""
+        self._check(name)
+        out_ts = array('d')
+        out_val = array(self._codes[name])
+        for ts, col, lo, hi in self._slices(name, t0, t1):
+            out_ts.extend(ts[lo:hi])
+            out_val.extend(col[lo:hi])
+        return out_ts, out_val
+
+    def downsample(self, name: str, t0: Optional[float] = None, t1: Optional[float] = None,
+                   buckets: int = 1000, interval: Optional[float] = None) -> Dict[str, Any]:
+        """
+        把 [t0, t1] 内的数据按等宽时间桶聚合，返回 {'t', 'min', 'max', 'mean', 'count'} 各列
+        （空桶不输出）。桶宽为 interval 秒，未给出时为 (t1 - t0) / buckets，此时最多 buckets 个桶
+        （恰好落在 t1 上的点归入最后一个桶）。
+        """
+        ts, vals = self.range(name, t0, t1)
+        if not ts:
+            return {'t': array('d'), 'min': array('d'), 'max': array('d'),
+                    'mean': array('d'), 'count': array('Q')}
+        start = ts[0] if t0 is None else t0
+        last = None  # 桶号上限（仅按 buckets 划分时）
+        if interval is None:
+            if buckets < 1:
+                raise ValueError("buckets must be >= 1")
+            end = ts[-1] if t1 is None else t1
+            interval = (end - start) / buckets or 1.0
+            last = buckets - 1
+        elif interval <= 0:
+            raise ValueError("interval must be > 0")
+        if np is not None:
+            return self._downsample_np(ts, vals, start, interval, last)
+        out = {'t': array('d'), 'min': array('d'), 'max': array('d'),
+               'mean': array('d'), 'count': array('Q')}
+        cur = None
+        vmin = vmax = total = 0
+        count = 0
+        for t, v in zip(ts, vals):
+            b = int((t - start) // interval)
+            if last is not None and b > last:
+                b = last
+            if b != cur:
+                if count:
+                    self._emit(out, start + cur * interval, vmin, vmax, total, count)
+                cur, vmin, vmax, total, count = b, v, v, v, 1
+                continue
+            if v < vmin:
+                vmin = v
+            elif v > vmax:
+                vmax = v
+            total += v
+            count += 1
+        self._emit(out, start + cur * interval, vmin, vmax, total, count)
+        return out
+
+    @staticmethod
+    def _emit(out, t, vmin, vmax, total, count):
+        out['t'].append(t)
+        out['min'].append(vmin)
+        out['max'].append(vmax)
+        out['mean'].append(total / count)
+        out['count'].append(count)
+
+    @staticmethod
+    def _downsample_np(ts: array, vals: array, start: float, interval: float,
+                       last: Optional[int] = None) -> Dict[str, Any]:
+        t = np.frombuffer(ts, dtype=np.float64)
+        v = np.frombuffer(vals, dtype=np.dtype(vals.typecode)).astype(np.float64)
+        idx = ((t - start) // interval).astype(np.int64)
+        if last is not None:
+            np.minimum(idx, last, out=idx)
+        # 时间戳有序，桶号不减：每个桶的起点即桶号变化处
+        edges = np.flatnonzero(np.r_[True, idx[1:] != idx[:-1]])
+        counts = np.diff(np.r_[edges, len(v)])
+        return {
+            't': start + idx[edges] * interval,
+            'min': np.minimum.reduceat(v, edges),
+            'max': np.maximum.reduceat(v, edges),
+            'mean': np.add.reduceat(v, edges) / counts,
+            'count': counts.astype(np.uint64),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        chunks = self._chunks[0]
+        return {
+            'rows': sum(c.rows for c in chunks),
+            'chunks': len(chunks),
+            'bytes': sum(c.nbytes for c in chunks),
+            'appended': self.appended,
+            'evicted_rows': self.evicted_rows,
+            'signals': len(self._names),
+        }
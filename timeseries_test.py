@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# @Time: 2026/01/02 14:10
+# @Author: JackyYin
+# @Email: jackhuan@icloud.com
+# @File: timeseries_test.py
+
+"""
+timeseries 的测试：按给定时间戳区间查询、倒退时间戳的处理、clear() 后重新计时、
+downsample 的桶数（纯 Python 与 NumPy 两条路径，后者需要安装 NumPy）。
+
+运行：python -m pytest timeseries_test.py  或  python timeseries_test.py
+"""
+import pytest
+
+import timeseries
+from __init__ import UDFrame_Z_204
+from timeseries import TimeSeriesStore
+
+
+def test_range_uses_given_timestamps():
+    store = TimeSeriesStore(UDFrame_Z_204, signals=['LVPwrSplyErrStsSts'], chunk_rows=4)
+    for i in range(10):
+        store.append({'LVPwrSplyErrStsSts': i}, ts=100.0 + i)
+    ts, vals = store.range('LVPwrSplyErrStsSts', 102.0, 105.0)
+    assert list(ts) == [102.0, 103.0, 104.0, 105.0]
+    assert list(vals) == [2, 3, 4, 5]
+    # 倒退的时间戳按上一条记录的时间处理
+    store.append({'LVPwrSplyErrStsSts': 99}, ts=50.0)
+    assert store.latest('LVPwrSplyErrStsSts') == (109.0, 99)
+
+
+def test_clear_resets_last_timestamp():
+    store = TimeSeriesStore(UDFrame_Z_204, signals=['LVPwrSplyErrStsSts'])
+    store.append({'LVPwrSplyErrStsSts': 1}, ts=1000.0)
+    store.clear()
+    store.append({'LVPwrSplyErrStsSts': 2}, ts=10.0)
+    assert store.latest('LVPwrSplyErrStsSts') == (10.0, 2)
+    assert store.time_span() == (10.0, 10.0)
+
+
+def _sample_store() -> TimeSeriesStore:
+    store = TimeSeriesStore(UDFrame_Z_204, signals=['LVPwrSplyErrStsSts', 'VehLVSysUZCLVehLVSysUMai'],
+                            chunk_rows=16)
+    for i in range(100):
+        store.append({'LVPwrSplyErrStsSts': i * 7 % 50, 'VehLVSysUZCLVehLVSysUMai': i * 0.1}, ts=10.0 + i)
+    return store
+
+
+def _downsample_pure(store, *args, **kwargs):
+    np_saved = timeseries.np
+    timeseries.np = None
+    try:
+        return store.downsample(*args, **kwargs)
+    finally:
+        timeseries.np = np_saved
+
+
+def _as_lists(ds):
+    return {k: [float(x) for x in v] for k, v in ds.items()}
+
+
+def test_downsample_bucket_count():
+    store = _sample_store()
+    ds = _downsample_pure(store, 'LVPwrSplyErrStsSts', buckets=5)
+    # t == t1 的最后一个点归入最后一个桶，而不是多出一个桶
+    assert len(ds['t']) <= 5
+    assert list(ds['count']) == [20, 20, 20, 20, 20]
+    ds = _downsample_pure(store, 'LVPwrSplyErrStsSts', 30.0, 60.0, buckets=3)
+    assert len(ds['t']) <= 3 and sum(ds['count']) == 31
+    # 直接给出 interval 时不限桶数
+    ds = _downsample_pure(store, 'LVPwrSplyErrStsSts', interval=20.0)
+    assert list(ds['count']) == [20, 20, 20, 20, 20]
+
+
+@pytest.mark.skipif(timeseries.np is None, reason="需要 NumPy")
+def test_downsample_numpy_matches_pure():
+    store = _sample_store()
+    for name in ('LVPwrSplyErrStsSts', 'VehLVSysUZCLVehLVSysUMai'):
+        for args, kwargs in (((), {'buckets': 5}), ((), {'buckets': 7}), ((25.0, 80.0), {'buckets': 4}),
+                             ((), {'interval': 3.0})):
+            fast = store.downsample(name, *args, **kwargs)
+            if 'buckets' in kwargs:
+                assert len(fast['t']) <= kwargs['buckets']
+            pure = _as_lists(_downsample_pure(store, name, *args, **kwargs))
+            fast = _as_lists(fast)
+            for key in pure:
+                assert fast[key] == pytest.approx(pure[key]), (name, args, kwargs, key)
+
+
+if __name__ == '__main__':
+    test_range_uses_given_timestamps()
+    test_clear_resets_last_timestamp()
+    test_downsample_bucket_count()
+    if timeseries.np is not None:
+        test_downsample_numpy_matches_pure()
+    print('ok')
@@ -12,17 +12,27 @@ transport_afpacket.py
 接口：
 - AFPacketTransport(iface, dst_mac, ethertype=0x88B5, src_mac=None)
 - send(payload: bytes)
+- send_parts(parts)：以太头 / 应用层 header / payload / 填充分段交给 sendmsg，不做拼接
 - start_receiving(callback: Callable[[bytes], None], filter_ethertype: bool=True)
+- enable_kernel_timestamps()：接收时使用内核时间戳（SO_TIMESTAMPNS），供 tap 记录
 - stop()
 """
 import socket
 import threading
 import struct
 import fcntl
+import time
 from typing import Callable, Optional
 
 SIOCGIFHWADDR = 0x8927  # get hardware address
 ETH_P_ALL = 0x0003
+# socket 模块未导出该常量时使用 Linux 的取值
+SO_TIMESTAMPNS = getattr(socket, 'SO_TIMESTAMPNS', 35)
+_TIMESPEC = struct.Struct('@qq')
+
+# 以太网最小 payload 长度 (不含以太头)：46 bytes；填充使用常量切片，避免每帧新建 b'\x00' * n
+_MIN_PAYLOAD = 46
+_PADDING = memoryview(bytes(_MIN_PAYLOAD))
 
 def mac_str_to_bytes(mac: str) -> bytes:
     """"aa:bb:cc:dd:ee:ff" -> b'\xaa\xbb\xcc\xdd\xee\xff'"""
@@ -63,28 +73,61 @@ class AFPacketTransport:
         self.sock.bind((iface, 0))
         self._recv_thread = None
         self._running = False
+        # 可选：接收线程启动后首先调用（例如 CPU 绑定 / 实时调度，见 rt_sched.py）
+        self.thread_init: Optional[Callable[[], None]] = None
+        # 可选：收发记录回调 tap(direction, ts_ns, frame)，frame 为完整以太帧（见 pcap_recorder.py）
+        self.tap: Optional[Callable] = None
+        # 当前回调中这一帧的接收时间戳（秒，time.time() 基准；开启内核时间戳时为内核到达时间）
+        self.rx_ts = 0.0
+        self._kernel_ts = False
 
         # 以太网最小 payload 长度 (不含以太头)：46 bytes
-        self._min_payload = 46
+        self._min_payload = _MIN_PAYLOAD
+        # 以太头在实例生命周期内不变，预先构建：dst(6) + src(6) + ethertype(2 big-endian)
+        self._eth_header = self.dst_mac_bytes + self.src_mac_bytes + struct.pack('!H', self.ethertype)
 
     def _build_frame(self, payload: bytes) -> bytes:
         """构建完整以太网帧：dst(6) + src(6) + ethertype(2 big-endian) + payload(+padding)"""
-        if not isinstance(payload, (bytes, bytearray)):
-            raise TypeError("payload 必须是 bytes 或 bytearray")
+        if not isinstance(payload, (bytes, bytearray, memoryview)):
+            raise TypeError("payload 必须是 bytes、bytearray 或 memoryview")
         # padding 到最小负载
-        payload_bytes = bytes(payload)
-        if len(payload_bytes) < self._min_payload:
-            payload_bytes = payload_bytes + (b'\x00' * (self._min_payload - len(payload_bytes)))
-        eth_type_bytes = struct.pack('!H', self.ethertype)  # network(big-endian)
-        frame = self.dst_mac_bytes + self.src_mac_bytes + eth_type_bytes + payload_bytes
-        return frame
+        pad = self._min_payload - len(payload)
+        if pad > 0:
+            return b''.join((self._eth_header, payload, _PADDING[:pad]))
+        return b''.join((self._eth_header, payload))
+
+    def enable_kernel_timestamps(self):
+        """打开 SO_TIMESTAMPNS：接收时由内核给出每帧的到达时间（用于记录）"""
+        self.sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+        self._kernel_ts = True
 
     def send(self, payload: bytes):
         """发送原始 payload（不含以太头），函数会组装以太头并通过 AF_PACKET 发送完整帧。"""
         frame = self._build_frame(payload)
+        tap = self.tap
+        if tap is not None:
+            tap('tx', time.time_ns(), frame)
         # 在 AF_PACKET + SOCK_RAW 下，send() 发送整个帧
         self.sock.send(frame)
 
+    def send_parts(self, parts):
+        """
+        分段发送（scatter-gather）：以太头（常量前缀）+ parts（如 4+4 header 与 payload）+ 填充
+        作为独立 iovec 交给 sendmsg，由内核组成一个完整以太帧，用户态不做拼接。
+        """
+        iov = [self._eth_header]
+        total = 0
+        for part in parts:
+            iov.append(part)
+            total += len(part)
+        pad = self._min_payload - total
+        if pad > 0:
+            iov.append(_PADDING[:pad])
+        tap = self.tap
+        if tap is not None:
+            tap('tx', time.time_ns(), b''.join(iov))
+        self.sock.sendmsg(iov)
+
     def start_receiving(self, callback: Callable[[bytes], None], filter_ethertype: bool = True):
         """
         启动后台线程接收以太帧并调用 callback(payload_bytes).
@@ -96,10 +139,24 @@ class AFPacketTransport:
         self._running = True
 
         def _loop():
+            if self.thread_init is not None:
+                try:
+                    self.thread_init()
+                except Exception:
+                    pass
+            cmsg_space = socket.CMSG_SPACE(_TIMESPEC.size)
             while self._running:
+                ts_ns = 0
                 try:
                     # recv 返回完整以太帧
-                    data = self.sock.recv(65535)
+                    if self._kernel_ts:
+                        data, ancdata, _, _ = self.sock.recvmsg(65535, cmsg_space)
+                        for level, kind, cdata in ancdata:
+                            if level == socket.SOL_SOCKET and kind == SO_TIMESTAMPNS:
+                                sec, nsec = _TIMESPEC.unpack_from(cdata)
+                                ts_ns = sec * 1_000_000_000 + nsec
+                    else:
+                        data = self.sock.recv(65535)
                 except Exception:
                     break
                 # 至少应包含 14 字节以太头
@@ -109,13 +166,19 @@ class AFPacketTransport:
                 payload = data[14:]
                 if filter_ethertype and ethertype_be != self.ethertype:
                     continue
+                if not ts_ns:
+                    ts_ns = time.time_ns()
+                tap = self.tap
+                if tap is not None:
+                    tap('rx', ts_ns, data)
+                self.rx_ts = ts_ns / 1e9
                 try:
                     callback(payload)
                 except Exception:
                     # 不抛出到线程外，保护接收循环
                     pass
 
-        self._recv_thread = threading.Thread(target=_loop, daemon=True)
+        self._recv_thread = threading.Thread(target=_loop, name="AFPacketTransport-rx", daemon=True)
         self._recv_thread.start()
 
     def stop(self):
@@ -11,8 +11,14 @@ transport_udp.py
 注意：这是用于演示/测试的实现 — 在生产或真实车载以太环境中需替换为真实的以太网/原始套接字传输。
 """
 import socket
+import struct
 import threading
-from typing import Callable
+import time
+from typing import Callable, Optional
+
+# socket 模块未导出该常量时使用 Linux 的取值
+SO_TIMESTAMPNS = getattr(socket, 'SO_TIMESTAMPNS', 35)
+_TIMESPEC = struct.Struct('@qq')
 
 class UDPTransport:
     def __init__(self, local_addr=('0.0.0.0', 12000), remote_addr=('127.0.0.1', 12001)):
@@ -22,24 +28,69 @@ class UDPTransport:
         self.sock.bind(self.local_addr)
         self._recv_thread = None
         self._running = False
+        # 可选：接收线程启动后首先调用（例如 CPU 绑定 / 实时调度，见 rt_sched.py）
+        self.thread_init: Optional[Callable[[], None]] = None
+        # 可选：收发记录回调 tap(direction, ts_ns, data, peer)（见 pcap_recorder.py）
+        self.tap: Optional[Callable] = None
+        # 当前回调中这一帧的接收时间戳（秒，time.time() 基准；开启内核时间戳时为内核到达时间）
+        self.rx_ts = 0.0
+        self._kernel_ts = False
+
+    def enable_kernel_timestamps(self):
+        """打开 SO_TIMESTAMPNS：接收时由内核给出每个数据报的到达时间（用于记录）"""
+        self.sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+        self._kernel_ts = True
 
     def send(self, payload: bytes):
         """把原始 payload 作为 UDP 报文发送到 remote_addr。"""
+        tap = self.tap
+        if tap is not None:
+            tap('tx', time.time_ns(), bytes(payload))
         self.sock.sendto(payload, self.remote_addr)
 
+    def send_parts(self, parts):
+        """
+        分段发送（scatter-gather）：parts 中的各段（如 header 与 payload）作为独立 iovec
+        交给 sendmsg，由内核拼成一个数据报，用户态不做拼接。
+        """
+        tap = self.tap
+        if tap is not None:
+            tap('tx', time.time_ns(), b''.join(parts))
+        self.sock.sendmsg(parts, (), 0, self.remote_addr)
+
     def start_receiving(self, callback: Callable[[bytes], None]):
         """启动后台线程接收数据报并调用 callback(payload)。"""
         if self._recv_thread:
             return
         self._running = True
         def _loop():
+            if self.thread_init is not None:
+                try:
+                    self.thread_init()
+                except Exception:
+                    pass
+            cmsg_space = socket.CMSG_SPACE(_TIMESPEC.size)
             while self._running:
                 try:
-                    data, _ = self.sock.recvfrom(4096)
+                    ts_ns = 0
+                    if self._kernel_ts:
+                        data, ancdata, _, addr = self.sock.recvmsg(4096, cmsg_space)
+                        for level, kind, cdata in ancdata:
+                            if level == socket.SOL_SOCKET and kind == SO_TIMESTAMPNS:
+                                sec, nsec = _TIMESPEC.unpack_from(cdata)
+                                ts_ns = sec * 1_000_000_000 + nsec
+                    else:
+                        data, addr = self.sock.recvfrom(4096)
+                    if not ts_ns:
+                        ts_ns = time.time_ns()
+                    tap = self.tap
+                    if tap is not None:
+                        tap('rx', ts_ns, data, addr)
+                    self.rx_ts = ts_ns / 1e9
                     callback(data)
                 except Exception:
                     break
-        self._recv_thread = threading.Thread(target=_loop, daemon=True)
+        self._recv_thread = threading.Thread(target=_loop, name="UDPTransport-rx", daemon=True)
         self._recv_thread.start()
 
     def stop(self):
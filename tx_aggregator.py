@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+# @Time: 2025/12/15 21:05
+# @Author: JackyYin
+# @Email: jackhuan@icloud.com
+# @File: tx_aggregator.py
+
+"""
+发送侧 PDU 聚合：把同一发送时隙内到期的多帧打包进一个数据报（容器），与 Framer.iter_pdus 对应。
+
+- 预分配 mtu 大小的 bytearray，header 用 struct.pack_into 直接写入，不产生中间 bytes；
+- add() 放不下时先 flush 已有内容，再写入新 PDU；
+- flush() 一次 transport.send 发出整个缓冲区（每个时隙一次系统调用）。
+
+默认 mtu=1472：以太网 MTU 1500 - IPv4 头 20 - UDP 头 8。
+"""
+from typing import Dict
+
+from framer import Framer
+
+
+class PDUAggregator:
+    def __init__(self, transport, framer: Framer, mtu: int = 1472):
+        if framer is None or framer.mode == "none":
+            raise ValueError("PDU 聚合需要带长度的 framer（例如 custom_4_4），否则接收端无法拆分")
+        if mtu <= framer.header_size():
+            raise ValueError("mtu too small")
+        self.transport = transport
+        self.framer = framer
+        self.mtu = mtu
+        self._buf = bytearray(mtu)
+        self._view = memoryview(self._buf)
+        self._used = 0
+        self._pending = 0
+
+        # 统计
+        self.datagrams = 0
+        self.pdus = 0
+        self.bytes_sent = 0
+
+    def add(self, msg_id: int, payload):
+        """追加一个 PDU；当前缓冲区放不下时先自动 flush。"""
+        size = self.framer.header_size() + len(payload)
+        if size > self.mtu:
+            raise ValueError(f"PDU of {size} bytes (msg_id 0x{msg_id:X}) exceeds mtu {self.mtu}")
+        if self._used + size > self.mtu:
+            self.flush()
+        self._used = self.framer.pack_into(self._buf, self._used, payload, msg_id=msg_id)
+        self._pending += 1
+
+    def flush(self) -> int:
+        """发送缓冲区中已聚合的 PDU（若有），返回本次发送的字节数。"""
+        n = self._used
+        if n == 0:
+            return 0
+        try:
+            self.transport.send(self._view[:n])
+        finally:
+            self.datagrams += 1
+            self.pdus += self._pending
+            self.bytes_sent += n
+            self._used = 0
+            self._pending = 0
+        return n
+
+    def pending(self) -> int:
+        return self._pending
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'datagrams': self.datagrams,
+            'pdus': self.pdus,
+            'bytes': self.bytes_sent,
+            'pending': self._pending,
+        }